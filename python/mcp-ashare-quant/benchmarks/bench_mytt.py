@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+mytt 指标吞吐量基准
+
+对 mytt 中每个函数分别在 1千/10万/100万 根K线上计时，输出每秒处理的K线数。
+SMA、AVEDEV 等含 Python 循环的函数在大数据量下很慢，单次耗时超过 --budget 秒后
+跳过该函数更大的规模。
+
+用法:
+    python benchmarks/bench_mytt.py [--bars 1000 100000 1000000] [--only MA EMA]
+                                    [--json out.json] [--baseline base.json --tolerance 0.2]
+"""
+import argparse
+import sys
+import time
+import warnings
+
+import numpy as np
+
+from common import compare_with_baseline, save_results  # noqa: E402
+
+from mcp_ashare_quant import mytt  # noqa: E402
+
+
+def make_bars(n: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, n)))
+    open_ = close * (1 + rng.normal(0, 0.003, n))
+    high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.003, n)))
+    low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.003, n)))
+    vol = rng.integers(1_000, 100_000, n).astype(float)
+    return {'O': open_, 'H': high, 'L': low, 'C': close, 'V': vol,
+            'B': close > open_, 'MA5': mytt.MA(close, 5), 'MA10': mytt.MA(close, 10)}
+
+
+# 每个函数的调用方式
+CASES = {
+    'RD': lambda b: mytt.RD(b['C']),
+    'RET': lambda b: mytt.RET(b['C']),
+    'ABS': lambda b: mytt.ABS(b['C']),
+    'MAX': lambda b: mytt.MAX(b['C'], b['O']),
+    'MIN': lambda b: mytt.MIN(b['C'], b['O']),
+    'MA': lambda b: mytt.MA(b['C'], 20),
+    'REF': lambda b: mytt.REF(b['C'], 1),
+    'DIFF': lambda b: mytt.DIFF(b['C'], 1),
+    'STD': lambda b: mytt.STD(b['C'], 20),
+    'IF': lambda b: mytt.IF(b['B'], b['C'], b['O']),
+    'SUM': lambda b: mytt.SUM(b['C'], 20),
+    'HHV': lambda b: mytt.HHV(b['H'], 20),
+    'LLV': lambda b: mytt.LLV(b['L'], 20),
+    'EMA': lambda b: mytt.EMA(b['C'], 12),
+    'SMA': lambda b: mytt.SMA(b['C'], 12),
+    'AVEDEV': lambda b: mytt.AVEDEV(b['C'], 14),
+    'SLOPE': lambda b: mytt.SLOPE(b['C'], 20),
+    'COUNT': lambda b: mytt.COUNT(b['B'], 5),
+    'EVERY': lambda b: mytt.EVERY(b['B'], 5),
+    'LAST': lambda b: mytt.LAST(b['B'], 5, 3),
+    'EXIST': lambda b: mytt.EXIST(b['B'], 5),
+    'BARSLAST': lambda b: mytt.BARSLAST(b['B']),
+    'FORCAST': lambda b: mytt.FORCAST(b['C'], 20),
+    'CROSS': lambda b: mytt.CROSS(b['MA5'], b['MA10']),
+    'MACD': lambda b: mytt.MACD(b['C']),
+    'KDJ': lambda b: mytt.KDJ(b['C'], b['H'], b['L']),
+    'RSI': lambda b: mytt.RSI(b['C']),
+    'WR': lambda b: mytt.WR(b['C'], b['H'], b['L']),
+    'BIAS': lambda b: mytt.BIAS(b['C']),
+    'BOLL': lambda b: mytt.BOLL(b['C']),
+    'PSY': lambda b: mytt.PSY(b['C']),
+    'CCI': lambda b: mytt.CCI(b['C'], b['H'], b['L']),
+    'ATR': lambda b: mytt.ATR(b['C'], b['H'], b['L']),
+    'BBI': lambda b: mytt.BBI(b['C']),
+    'DMI': lambda b: mytt.DMI(b['C'], b['H'], b['L']),
+    'TAQ': lambda b: mytt.TAQ(b['H'], b['L'], 20),
+    'TRIX': lambda b: mytt.TRIX(b['C']),
+    'VR': lambda b: mytt.VR(b['C'], b['V']),
+    'EMV': lambda b: mytt.EMV(b['H'], b['L'], b['V']),
+    'DPO': lambda b: mytt.DPO(b['C']),
+    'BRAR': lambda b: mytt.BRAR(b['O'], b['C'], b['H'], b['L']),
+    'DMA': lambda b: mytt.DMA(b['C']),
+    'MTM': lambda b: mytt.MTM(b['C']),
+    'ROC': lambda b: mytt.ROC(b['C']),
+}
+
+
+def time_call(func, bars, min_time: float = 0.2) -> float:
+    """重复调用直到累计 min_time 秒，返回单次平均耗时"""
+    calls, start = 0, time.perf_counter()
+    while True:
+        func(bars)
+        calls += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            return elapsed / calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description="mytt 指标吞吐量基准")
+    parser.add_argument('--bars', type=int, nargs='+', default=[1_000, 100_000, 1_000_000])
+    parser.add_argument('--only', nargs='+', help="只测试指定函数")
+    parser.add_argument('--budget', type=float, default=5.0, help="单次耗时超过该秒数后跳过更大规模")
+    parser.add_argument('--json', help="保存结果的JSON路径")
+    parser.add_argument('--baseline', help="基线结果JSON，吞吐量下降超过容忍度时返回非0")
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    args = parser.parse_args()
+
+    warnings.simplefilter('ignore')
+    names = args.only or list(CASES)
+    datasets = {n: make_bars(n) for n in args.bars}
+    results = {}
+    print(f"{'函数':<10} {'K线数':>9} {'单次(ms)':>12} {'K线/秒':>14}")
+    for name in names:
+        for n in args.bars:
+            try:
+                seconds = time_call(CASES[name], datasets[n])
+            except Exception as e:
+                results[f'{name}@{n}'] = {'error': str(e)}
+                print(f"{name:<10} {n:>9} 调用失败: {e}")
+                break
+            results[f'{name}@{n}'] = {'ms': round(seconds * 1000, 4), 'bars_per_sec': round(n / seconds, 1)}
+            print(f"{name:<10} {n:>9} {seconds * 1000:>12.3f} {n / seconds:>14,.0f}", flush=True)
+            if seconds > args.budget:
+                print(f"{name:<10} 单次超过 {args.budget}s，跳过更大规模")
+                break
+
+    if args.json:
+        save_results(results, args.json)
+    if args.baseline and compare_with_baseline(results, args.baseline, 'bars_per_sec', args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+K线解析微基准
+
+对比旧的 json.loads + 逐列 astype 解析方式与 mcp_ashare_quant.parsers
+在新浪/腾讯响应上的单次请求解析耗时，不访问网络。
+
+用法:
+    python benchmarks/bench_parsers.py [--bars 120 1000 10000] [--repeat 200]
+"""
+import argparse
+import datetime
+import json
+import os
+import sys
+import timeit
+import warnings
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from mcp_ashare_quant import parsers  # noqa: E402
+
+CODE = 'sh600519'
+
+
+# ---------- 构造与真实接口格式一致的响应 ----------
+def make_sina_payload(n: int) -> bytes:
+    start = datetime.date(2000, 1, 3)
+    rows = [{
+        'day': (start + datetime.timedelta(days=i)).isoformat(),
+        'open': f'{1700 + i % 50:.3f}', 'high': f'{1720 + i % 50:.3f}',
+        'low': f'{1690 + i % 50:.3f}', 'close': f'{1710 + i % 50:.3f}',
+        'volume': str(2000000 + i), 'ma_price5': 1705.1, 'ma_volume5': 2100000,
+    } for i in range(n)]
+    return json.dumps(rows).encode()
+
+
+def make_tx_day_payload(n: int) -> bytes:
+    start = datetime.date(2000, 1, 3)
+    rows = [[(start + datetime.timedelta(days=i)).isoformat(), f'{1700 + i % 50:.3f}', f'{1710 + i % 50:.3f}',
+             f'{1720 + i % 50:.3f}', f'{1690 + i % 50:.3f}', f'{20000.0 + i:.3f}'] for i in range(n)]
+    return json.dumps({'code': 0, 'data': {CODE: {'qfqday': rows}}}).encode()
+
+
+def make_tx_min_payload(n: int) -> bytes:
+    start = datetime.datetime(2024, 1, 2, 9, 30)
+    rows = [[(start + datetime.timedelta(minutes=i)).strftime('%Y%m%d%H%M'), f'{1700 + i % 50:.2f}',
+             f'{1710 + i % 50:.2f}', f'{1720 + i % 50:.2f}', f'{1690 + i % 50:.2f}', f'{200.0 + i:.2f}', {}, '']
+            for i in range(n)]
+    qt = {CODE: ['1', '贵州茅台', '600519', '1711.00']}
+    return json.dumps({'code': 0, 'data': {CODE: {'m1': rows, 'qt': qt}}}).encode()
+
+
+# ---------- 旧实现（逐列转换），仅用于对比 ----------
+def legacy_sina(raw: bytes) -> pd.DataFrame:
+    dstr = json.loads(raw)
+    df = pd.DataFrame(dstr, columns=['day', 'open', 'high', 'low', 'close', 'volume'])
+    df['open'] = df['open'].astype(float)
+    df['high'] = df['high'].astype(float)
+    df['low'] = df['low'].astype(float)
+    df['close'] = df['close'].astype(float)
+    df['volume'] = df['volume'].astype(float)
+    df['date'] = df['day']
+    df = df.drop(columns=['day'])
+    df.index.name = ''
+    return df
+
+
+def legacy_tx_day(raw: bytes) -> pd.DataFrame:
+    st = json.loads(raw)
+    buf = st['data'][CODE]['qfqday']
+    # 原实现传 dtype='float'，新版pandas遇到日期列会报错，这里改为构造后再转换
+    df = pd.DataFrame(buf, columns=['time', 'open', 'close', 'high', 'low', 'volume'])
+    df[['open', 'close', 'high', 'low', 'volume']] = df[['open', 'close', 'high', 'low', 'volume']].astype('float')
+    df.time = pd.to_datetime(df.time)
+    df.set_index(['time'], inplace=True)
+    df.index.name = ''
+    return df
+
+
+def legacy_tx_min(raw: bytes) -> pd.DataFrame:
+    st = json.loads(raw)
+    buf = st['data'][CODE]['m1']
+    df = pd.DataFrame(buf, columns=['time', 'open', 'close', 'high', 'low', 'volume', 'n1', 'n2'])
+    df = df[['time', 'open', 'close', 'high', 'low', 'volume']]
+    df[['open', 'close', 'high', 'low', 'volume']] = df[['open', 'close', 'high', 'low', 'volume']].astype('float')
+    df.time = pd.to_datetime(df.time, format='%Y%m%d%H%M')
+    df.set_index(['time'], inplace=True)
+    df.index.name = ''
+    df.iloc[-1, df.columns.get_loc('close')] = float(st['data'][CODE]['qt'][CODE][3])
+    return df
+
+
+CASES = [
+    ('sina', make_sina_payload, legacy_sina, lambda raw: parsers.parse_sina_kline(raw)),
+    ('tx_day', make_tx_day_payload, legacy_tx_day, lambda raw: parsers.parse_tx_day(raw, CODE, 'day')),
+    ('tx_min', make_tx_min_payload, legacy_tx_min, lambda raw: parsers.parse_tx_min(raw, CODE, 1)),
+]
+
+
+def per_call_us(func, raw: bytes, repeat: int) -> float:
+    """取多轮中的最小值，单位微秒"""
+    timer = timeit.Timer(lambda: func(raw))
+    return min(timer.repeat(repeat=5, number=repeat)) / repeat * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="K线解析微基准")
+    parser.add_argument('--bars', type=int, nargs='+', default=[120, 1000, 10000])
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    warnings.simplefilter('ignore')
+    print(f"JSON解码: {'orjson' if parsers.orjson else 'json'}")
+    print(f"{'接口':<8} {'条数':>7} {'旧实现(us)':>12} {'新实现(us)':>12} {'加速比':>8}")
+    for name, make_payload, legacy, fast in CASES:
+        for bars in args.bars:
+            raw = make_payload(bars)
+            repeat = max(1, args.repeat * 120 // bars)
+            before = per_call_us(legacy, raw, repeat)
+            after = per_call_us(fast, raw, repeat)
+            print(f"{name:<8} {bars:>7} {before:>12.1f} {after:>12.1f} {before / after:>7.2f}x")
+
+
+if __name__ == '__main__':
+    main()
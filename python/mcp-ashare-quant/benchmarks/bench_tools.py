@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+MCP工具端到端基准（离线）
+
+通过 fixture_server 回放行情接口，在 1/10/100 并发下测量 get_stock_data、
+recommend_a_shares、calculate_technical_indicators、plot_kline 的延迟与吞吐量。
+默认每轮前清空行情缓存以测量完整链路，--warm 则保留缓存。
+
+用法:
+    python benchmarks/bench_tools.py [--concurrency 1 10 100] [--rounds 3] [--tools get_stock_data ...]
+                                     [--json out.json] [--baseline base.json --tolerance 0.2]
+"""
+import argparse
+import asyncio
+import contextlib
+import logging
+import os
+import sys
+import tempfile
+import time
+
+os.environ.setdefault('MPLBACKEND', 'Agg')
+
+from common import PACKAGE_ROOT, compare_with_baseline, latency_stats, save_results  # noqa: E402
+from fixture_server import FixtureServer  # noqa: E402
+
+from mcp_ashare_quant import cache, server  # noqa: E402
+
+INDICATORS = ['MA5', 'MA10', 'BOLL', 'MACD']
+
+
+def make_calls(records, out_dir):
+    """各工具单次调用的协程工厂"""
+    counter = iter(range(10 ** 9))
+    return {
+        'get_stock_data': lambda: server.get_stock_data('sh600519', frequency='1d', count=120),
+        'recommend_a_shares': lambda: server.recommend_a_shares(limit=10),
+        'calculate_technical_indicators': lambda: server.calculate_technical_indicators(records, INDICATORS),
+        'plot_kline': lambda: server.plot_kline(
+            records, indicators=['MA5', 'MA10', 'BOLL'], title='bench',
+            save_path=os.path.join(out_dir, f'kline_{next(counter)}.png')),
+    }
+
+
+async def run_level(factory, concurrency: int, rounds: int, warm: bool):
+    latencies = []
+
+    async def timed():
+        start = time.perf_counter()
+        result = await factory()
+        latencies.append(time.perf_counter() - start)
+        if isinstance(result, dict) and (result.get('status') == 'error' or 'error' in result):
+            raise RuntimeError(f"工具调用失败: {result}")
+
+    wall = 0.0
+    for _ in range(rounds):
+        if not warm:
+            cache.bar_cache.clear()
+            cache.snapshot_cache.clear()
+        start = time.perf_counter()
+        await asyncio.gather(*(timed() for _ in range(concurrency)))
+        wall += time.perf_counter() - start
+    return latency_stats(latencies, wall)
+
+
+async def run(args) -> dict:
+    records = await server.get_stock_data('sh600519', frequency='1d', count=args.bars)
+    if not isinstance(records, list):
+        raise RuntimeError(f"回放数据获取失败: {records}")
+    results = {}
+    with tempfile.TemporaryDirectory() as out_dir:
+        calls = make_calls(records, out_dir)
+        for name in args.tools:
+            for concurrency in args.concurrency:
+                stats = await run_level(calls[name], concurrency, args.rounds, args.warm)
+                results[f'{name}@{concurrency}'] = stats
+                print(f"{name:<32} {concurrency:>5} {stats['mean_ms']:>10.1f} {stats['p50_ms']:>10.1f} "
+                      f"{stats['p95_ms']:>10.1f} {stats['throughput']:>10.1f}", flush=True)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MCP工具端到端基准（离线回放）")
+    parser.add_argument('--tools', nargs='+', default=['get_stock_data', 'recommend_a_shares',
+                                                       'calculate_technical_indicators', 'plot_kline'])
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 10, 100])
+    parser.add_argument('--rounds', type=int, default=3)
+    parser.add_argument('--bars', type=int, default=120, help="指标计算与绘图使用的K线条数")
+    parser.add_argument('--warm', action='store_true', help="保留行情缓存，测量缓存命中时的开销")
+    parser.add_argument('--json', help="保存结果的JSON路径")
+    parser.add_argument('--baseline', help="基线结果JSON，吞吐量下降超过容忍度时返回非0")
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    args = parser.parse_args()
+
+    # 工具内部的逐条日志与 recommend 的调试输出不计入终端，但仍会执行
+    logging.disable(logging.INFO)
+    os.environ['API_RESOURCE_MODE'] = 'file'
+    os.chdir(os.path.join(PACKAGE_ROOT, 'mcp_ashare_quant'))  # get_stock_data 从当前目录读取 stock_mapping.json
+
+    fixture_server = FixtureServer().start()
+    try:
+        print(f"{'工具':<32} {'并发':>5} {'平均(ms)':>10} {'p50(ms)':>10} {'p95(ms)':>10} {'调用/秒':>10}")
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stderr(devnull):
+            results = asyncio.run(run(args))
+    finally:
+        fixture_server.stop()
+
+    if args.json:
+        save_results(results, args.json)
+    if args.baseline and compare_with_baseline(results, args.baseline, 'throughput', args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
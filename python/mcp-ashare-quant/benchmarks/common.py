@@ -0,0 +1,54 @@
+"""
+基准测试公共函数：结果保存、与基线对比（供CI判断性能回退）
+"""
+import json
+import os
+import statistics
+import sys
+from typing import Dict, List
+
+PACKAGE_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+if PACKAGE_ROOT not in sys.path:
+    sys.path.insert(0, PACKAGE_ROOT)
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0.0
+
+
+def latency_stats(latencies: List[float], wall: float) -> Dict:
+    """单位：毫秒，吞吐量为每秒完成的调用数"""
+    return {
+        'calls': len(latencies),
+        'mean_ms': round(statistics.fmean(latencies) * 1000, 3),
+        'p50_ms': round(percentile(latencies, 0.5) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+        'throughput': round(len(latencies) / wall, 2) if wall > 0 else 0.0,
+    }
+
+
+def save_results(results: Dict, path: str) -> None:
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"结果已保存到 {path}")
+
+
+def compare_with_baseline(results: Dict, baseline_path: str, metric: str, tolerance: float) -> int:
+    """
+    与基线逐项比较 metric（数值越大越好，如 throughput），
+    下降超过 tolerance 比例的项目视为回退，返回回退项数
+    """
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    regressions = 0
+    for key, current in results.items():
+        old = baseline.get(key)
+        if not old or not old.get(metric) or not current.get(metric):
+            continue
+        change = current[metric] / old[metric] - 1
+        if change < -tolerance:
+            regressions += 1
+            print(f"性能回退: {key} {metric} {old[metric]} -> {current[metric]} ({change:+.1%})")
+    print(f"与基线对比完成，回退 {regressions} 项（容忍度 {tolerance:.0%}）")
+    return regressions
@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+行情接口回放服务
+
+以本地 HTTP 代理的方式回放新浪/腾讯/东方财富的响应：基准测试进程设置
+HTTP_PROXY 指向本服务后，ashare/recommend 中写死的 http:// 接口地址都会被转发到这里，
+业务代码无需任何改动即可离线运行。
+
+响应优先读取 benchmarks/fixtures/ 下录制的真实数据，没有时用固定随机种子生成
+与真实接口格式一致的数据。仓库中不附带录制文件，默认回放的都是合成数据；
+录制真实数据（需要能访问行情接口）：
+
+    python benchmarks/fixture_server.py --record
+
+新浪 suggest 接口与真实接口一样以 GBK 编码返回并声明 charset=GBK，
+按中文简称查询时走与线上相同的解码路径。
+"""
+import argparse
+import datetime
+import json
+import os
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlsplit
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+SUGGEST_HOST = 'suggest3.sinajs.cn'
+RECORD_CODE = 'sh600519'
+RECORD_NAME = '贵州茅台'
+
+# 录制时请求的真实接口
+RECORD_URLS = {
+    'sina_kline.json': f'http://money.finance.sina.com.cn/quotes_service/api/json_v2.php/CN_MarketData.getKLineData'
+                       f'?symbol={RECORD_CODE}&scale=240&ma=5&datalen=1023',
+    'tx_day.json': f'http://web.ifzq.gtimg.cn/appstock/app/fqkline/get?param={RECORD_CODE},day,,,2000,qfq',
+    'tx_min.json': f'http://ifzq.gtimg.cn/appstock/app/kline/mkline?param={RECORD_CODE},m1,,800',
+    'eastmoney_clist.json': 'http://72.push2.eastmoney.com/api/qt/clist/get?pn=1&pz=5000&po=1&np=1'
+                            '&ut=bd1d9ddb04089700cf9c27f6f7426281&fltt=2&invt=2&fid=f3'
+                            '&fs=m:0+t:6,m:0+t:13,m:0+t:80,m:1+t:2,m:1+t:23'
+                            '&fields=f1,f2,f3,f4,f5,f6,f7,f8,f9,f10,f12,f14,f15,f16,f17,f18,f20,f21,f23',
+}
+
+
+# ---------- 合成数据（格式与真实接口一致，固定随机种子） ----------
+def _random_walk(n: int, seed: int, start: float = 1500.0):
+    rng = random.Random(seed)
+    price, bars = start, []
+    for _ in range(n):
+        open_ = price
+        close = max(1.0, open_ * (1 + rng.gauss(0, 0.015)))
+        high = max(open_, close) * (1 + abs(rng.gauss(0, 0.005)))
+        low = min(open_, close) * (1 - abs(rng.gauss(0, 0.005)))
+        bars.append((open_, high, low, close, rng.randint(10000, 90000)))
+        price = close
+    return bars
+
+
+def _trading_days(n: int):
+    day, days = datetime.date(2015, 1, 5), []
+    while len(days) < n:
+        if day.weekday() < 5:
+            days.append(day)
+        day += datetime.timedelta(days=1)
+    return days
+
+
+def _trading_minutes(n: int):
+    minutes, day = [], datetime.date(2024, 1, 2)
+    while len(minutes) < n:
+        if day.weekday() < 5:
+            for start, count in ((datetime.time(9, 31), 120), (datetime.time(13, 1), 120)):
+                t0 = datetime.datetime.combine(day, start)
+                minutes.extend(t0 + datetime.timedelta(minutes=i) for i in range(count))
+        day += datetime.timedelta(days=1)
+    return minutes[-n:]
+
+
+def synth_sina_kline(n: int = 2000) -> list:
+    return [{
+        'day': d.isoformat(), 'open': f'{o:.3f}', 'high': f'{h:.3f}', 'low': f'{l:.3f}', 'close': f'{c:.3f}',
+        'volume': str(v * 100), 'ma_price5': round(c, 3), 'ma_volume5': v * 100,
+    } for d, (o, h, l, c, v) in zip(_trading_days(n), _random_walk(n, seed=1))]
+
+
+def synth_tx_day(n: int = 2000) -> dict:
+    rows = [[d.isoformat(), f'{o:.3f}', f'{c:.3f}', f'{h:.3f}', f'{l:.3f}', f'{v:.3f}']
+            for d, (o, h, l, c, v) in zip(_trading_days(n), _random_walk(n, seed=2))]
+    return {'code': 0, 'msg': '', 'data': {RECORD_CODE: {'qfqday': rows}}}
+
+
+def synth_tx_min(n: int = 800) -> dict:
+    bars = _random_walk(n, seed=3)
+    rows = [[t.strftime('%Y%m%d%H%M'), f'{o:.2f}', f'{c:.2f}', f'{h:.2f}', f'{l:.2f}', f'{v / 100:.2f}', {}, '']
+            for t, (o, h, l, c, v) in zip(_trading_minutes(n), bars)]
+    qt = {RECORD_CODE: ['1', RECORD_NAME, RECORD_CODE[2:], f'{bars[-1][3]:.2f}']}
+    return {'code': 0, 'msg': '', 'data': {RECORD_CODE: {'m1': rows, 'qt': qt}}}
+
+
+def synth_eastmoney_clist(n: int = 5000) -> dict:
+    rng = random.Random(4)
+    diff = []
+    for i in range(n):
+        price = round(rng.uniform(2, 300), 2)
+        diff.append({
+            'f1': 2, 'f2': price, 'f3': round(rng.uniform(-10, 10), 2), 'f4': round(rng.uniform(-5, 5), 2),
+            'f5': rng.randint(1000, 5000000), 'f6': rng.uniform(1e6, 5e9), 'f7': round(rng.uniform(0, 12), 2),
+            'f8': round(rng.uniform(0, 30), 2), 'f9': round(rng.uniform(-50, 150), 2),
+            'f10': round(rng.uniform(0, 5), 2), 'f12': f'{600000 + i:06d}', 'f14': f'股票{i:04d}',
+            'f15': price, 'f16': price, 'f17': price, 'f18': price, 'f20': rng.uniform(1e9, 2e12),
+            'f21': rng.uniform(1e9, 2e12), 'f23': round(rng.uniform(-2, 20), 2),
+        })
+    return {'rc': 0, 'data': {'total': n, 'diff': diff}}
+
+
+SYNTHESIZERS = {
+    'sina_kline.json': synth_sina_kline,
+    'tx_day.json': synth_tx_day,
+    'tx_min.json': synth_tx_min,
+    'eastmoney_clist.json': synth_eastmoney_clist,
+}
+
+
+def load_fixture(name: str):
+    """优先读取录制文件，否则生成合成数据"""
+    path = os.path.join(FIXTURE_DIR, name)
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return SYNTHESIZERS[name]()
+
+
+# ---------- 按请求参数裁剪响应 ----------
+class FixtureStore:
+    """所有股票代码共用同一份K线，按请求的条数截取最后N条"""
+
+    def __init__(self):
+        self.sina = load_fixture('sina_kline.json')
+        self.tx_day = load_fixture('tx_day.json')
+        self.tx_min = load_fixture('tx_min.json')
+        self.eastmoney = json.dumps(load_fixture('eastmoney_clist.json'), ensure_ascii=False).encode('utf-8')
+        self._cache: Dict[Tuple, bytes] = {}
+        self._lock = threading.Lock()
+
+    def respond(self, host: str, path: str, query: Dict[str, list]) -> Optional[bytes]:
+        key = (host, path, tuple(sorted((k, tuple(v)) for k, v in query.items())))
+        with self._lock:
+            if key in self._cache:
+                return self._cache[key]
+        body = self._build(host, path, query)
+        if body is not None:
+            with self._lock:
+                self._cache[key] = body
+        return body
+
+    def _build(self, host: str, path: str, query: Dict[str, list]) -> Optional[bytes]:
+        if path.endswith('CN_MarketData.getKLineData'):
+            count = int(query.get('datalen', ['10'])[0])
+            return json.dumps(self.sina[-count:]).encode()
+        if path.endswith('/fqkline/get'):
+            code, unit, _, _, count, _ = query['param'][0].split(',')
+            stk = next(iter(self.tx_day['data'].values()))
+            rows = stk.get('qfqday') or stk.get('day')
+            return json.dumps({'code': 0, 'data': {code: {'qfq' + unit: rows[-int(count):]}}}).encode()
+        if path.endswith('/kline/mkline'):
+            code, unit, _, count = query['param'][0].split(',')
+            stk = next(iter(self.tx_min['data'].values()))
+            rows = next(v for k, v in stk.items() if k.startswith('m') and isinstance(v, list))
+            qt = {code: next(iter(stk['qt'].values()))}
+            return json.dumps({'code': 0, 'data': {code: {unit: rows[-int(count):], 'qt': qt}}},
+                              ensure_ascii=False).encode('utf-8')
+        if path.endswith('/api/qt/clist/get'):
+            return self.eastmoney
+        if host.startswith(SUGGEST_HOST):
+            key = unquote(path.split('key=')[-1])
+            code = key if key[:2] in ('sh', 'sz') else RECORD_CODE
+            name = RECORD_NAME if code == RECORD_CODE else key
+            return f'var suggestvalue="{name},11,{code[2:]},{code},{name},,{name},99,1,ESG,,;";'.encode('gbk')
+        return None
+
+
+class _ProxyHandler(BaseHTTPRequestHandler):
+    store: FixtureStore = None
+
+    def do_GET(self):
+        url = urlsplit(self.path)  # 作为代理时 path 是完整URL
+        host = url.netloc or self.headers.get('Host', '')
+        body = self.store.respond(host, url.path, parse_qs(url.query))
+        if body is None:
+            self.send_error(404, f'没有对应的回放数据: {self.path}')
+            return
+        self.send_response(200)
+        if host.startswith(SUGGEST_HOST):
+            self.send_header('Content-Type', 'application/x-javascript; charset=GBK')
+        else:
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FixtureServer:
+    """在后台线程运行的回放代理，start() 后把 HTTP_PROXY 指向它"""
+
+    def __init__(self, port: int = 0):
+        handler = type('Handler', (_ProxyHandler,), {'store': FixtureStore()})
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', port), handler)
+        self.httpd.daemon_threads = True
+
+    @property
+    def url(self) -> str:
+        return f'http://127.0.0.1:{self.httpd.server_address[1]}'
+
+    def start(self) -> "FixtureServer":
+        threading.Thread(target=self.httpd.serve_forever, name='fixture-server', daemon=True).start()
+        os.environ['HTTP_PROXY'] = os.environ['http_proxy'] = self.url
+        os.environ['NO_PROXY'] = os.environ['no_proxy'] = ''
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def record() -> None:
+    """从真实接口录制回放数据"""
+    import requests
+
+    os.makedirs(FIXTURE_DIR, exist_ok=True)
+    for name, url in RECORD_URLS.items():
+        response = requests.get(url, headers={'User-Agent': 'Mozilla/5.0'}, timeout=30)
+        response.raise_for_status()
+        with open(os.path.join(FIXTURE_DIR, name), 'w', encoding='utf-8') as f:
+            json.dump(response.json(), f, ensure_ascii=False)
+        print(f"已录制 {name}: {len(response.content)} 字节")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="行情接口回放服务")
+    parser.add_argument('--record', action='store_true', help="从真实接口录制回放数据")
+    parser.add_argument('--port', type=int, default=18080)
+    args = parser.parse_args()
+    if args.record:
+        record()
+        return
+    server = FixtureServer(args.port)
+    print(f"回放代理已启动: {server.url}，设置 HTTP_PROXY={server.url} 后使用")
+    server.httpd.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
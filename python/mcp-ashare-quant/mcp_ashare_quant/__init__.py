@@ -10,12 +10,14 @@ __email__ = "your.email@example.com"
 
 # 导入主要模块和函数
 from .ashare import get_price
+from .bars import BarArray, SharedBars
 from .mytt import MA, BOLL, MACD, CROSS, RET
 from .server import main
 from .recommend import recommend_stocks, filter_and_rank_stocks
 
 __all__ = [
     "get_price",
+    "BarArray", "SharedBars",
     "MA", "BOLL", "MACD", "CROSS", "RET",
     "main",
     "recommend_stocks", "filter_and_rank_stocks"
@@ -1,5 +1,14 @@
 import json, requests, datetime
 import pandas as pd  #
+from .parsers import parse_sina_kline, parse_tx_day, parse_tx_min
+from .metrics import inc, span
+
+
+def _download(URL, source):  # 下载原始响应，记录耗时与字节数
+    with span('http'):
+        content = requests.get(URL).content
+    inc('bytes_downloaded_total', len(content), source=source)
+    return content
 
 
 # 腾讯日线
@@ -9,15 +18,9 @@ def get_price_day_tx(code, end_date='', count=10, frequency='1d'):  # 日线获
     end_date.split(' ')[0]
     end_date = '' if end_date == datetime.datetime.now().strftime('%Y-%m-%d') else end_date  # 如果日期今天就变成空
     URL = f'http://web.ifzq.gtimg.cn/appstock/app/fqkline/get?param={code},{unit},,{end_date},{count},qfq'
-    st = json.loads(requests.get(URL).content)
-    ms = 'qfq' + unit
-    stk = st['data'][code]
-    buf = stk[ms] if ms in stk else stk[unit]  # 指数返回不是qfqday,是day
-    df = pd.DataFrame(buf, columns=['time', 'open', 'close', 'high', 'low', 'volume'], dtype='float')
-    df.time = pd.to_datetime(df.time)
-    df.set_index(['time'], inplace=True)
-    df.index.name = ''  # 处理索引
-    return df
+    content = _download(URL, 'tencent')
+    with span('parse'):
+        return parse_tx_day(content, code, unit)
 
 
 # 腾讯分钟线
@@ -26,16 +29,9 @@ def get_price_min_tx(code, end_date=None, count=10, frequency='1d'):  # 分钟
     if end_date: end_date = end_date.strftime('%Y-%m-%d') if isinstance(end_date, datetime.date) else \
     end_date.split(' ')[0]
     URL = f'http://ifzq.gtimg.cn/appstock/app/kline/mkline?param={code},m{ts},,{count}'
-    st = json.loads(requests.get(URL).content)
-    buf = st['data'][code]['m' + str(ts)]
-    df = pd.DataFrame(buf, columns=['time', 'open', 'close', 'high', 'low', 'volume', 'n1', 'n2'])
-    df = df[['time', 'open', 'close', 'high', 'low', 'volume']]
-    df[['open', 'close', 'high', 'low', 'volume']] = df[['open', 'close', 'high', 'low', 'volume']].astype('float')
-    df.time = pd.to_datetime(df.time)
-    df.set_index(['time'], inplace=True)
-    df.index.name = ''  # 处理索引
-    df['close'][-1] = float(st['data'][code]['qt'][code][3])  # 最新基金数据是3位的
-    return df
+    content = _download(URL, 'tencent')
+    with span('parse'):
+        return parse_tx_min(content, code, ts)
 
 
 # sina新浪全周期获取函数，分钟线 5m,15m,30m,60m  日线1d=240m   周线1w=1200m  1月=7200m
@@ -49,18 +45,9 @@ def get_price_sina(code, end_date='', count=10, frequency='60m'):  # 新浪全
         count = count + (datetime.datetime.now() - end_date).days // unit  # 结束时间到今天有多少天自然日(肯定 >交易日)
         # print(code,end_date,count)
     URL = f'http://money.finance.sina.com.cn/quotes_service/api/json_v2.php/CN_MarketData.getKLineData?symbol={code}&scale={ts}&ma=5&datalen={count}'
-    dstr = json.loads(requests.get(URL).content)
-    # df=pd.DataFrame(dstr,columns=['day','open','high','low','close','volume'],dtype='float')
-    df = pd.DataFrame(dstr, columns=['day', 'open', 'high', 'low', 'close', 'volume'])
-    df['open'] = df['open'].astype(float)
-    df['high'] = df['high'].astype(float)  # 转换数据类型
-    df['low'] = df['low'].astype(float)
-    df['close'] = df['close'].astype(float)
-    df['volume'] = df['volume'].astype(float)
-    df['date'] = df['day']
-    df = df.drop(columns=['day'])
-
-    df.index.name = ''  # 处理索引
+    content = _download(URL, 'sina')
+    with span('parse'):
+        df = parse_sina_kline(content)  # 直接解析成带类型的列，索引为日期
     if (end_date != '') & (frequency in ['240m', '1200m', '7200m']): return df[df.index <= end_date][
                                                                             -mcount:]  # 日线带结束时间先返回
     return df
@@ -74,6 +61,7 @@ def get_price(code, end_date='', count=10, frequency='1d', fields=[]):  # 对外
         try:
             return get_price_sina(xcode, end_date=end_date, count=count, frequency=frequency)  # 主力
         except:
+            inc('source_fallbacks_total', source='sina', fallback='tencent')
             return get_price_day_tx(xcode, end_date=end_date, count=count,
                                     frequency=frequency)  # 备用
 
@@ -82,6 +70,7 @@ def get_price(code, end_date='', count=10, frequency='1d', fields=[]):  # 对外
         try:
             return get_price_sina(xcode, end_date=end_date, count=count, frequency=frequency)  # 主力
         except:
+            inc('source_fallbacks_total', source='sina', fallback='tencent')
             return get_price_min_tx(xcode, end_date=end_date, count=count, frequency=frequency)  # 备用
 
 
@@ -0,0 +1,290 @@
+"""
+全市场日线批量回填
+
+从全市场快照取得股票列表，限速并发地获取每只股票的日线，追加写入本地K线库（bar_store）。
+进度保存在K线库目录下的 checkpoint 文件中，中断后再次运行会跳过当天已完成的股票。
+
+- 尚未收盘的当天日线不写入（盘中运行时它还会变化，而K线库只追加，写入后不会再被更正）
+- 新浪（不复权）为主、腾讯（前复权）为备用；库中已有数据的股票只用与已有数据相同复权方式的来源
+- 前复权的股票在两次回填之间发生除权除息时，新取的K线与库中重叠日期的价格对不上，
+  此时重新获取覆盖库中全部日期的前复权日线，整段替换（bar_store.replace），避免在接缝处出现假跳空
+
+命令行用法：
+    mcp-ashare-backfill [--count 2000] [--concurrency 8] [--rate 20] [--symbols sh600519 sz000858]
+                        [--root 目录] [--no-resume]
+
+也可通过 MCP 工具 backfill_daily_bars 在服务进程后台运行。
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Dict, List, Optional
+
+from .ashare import get_price_day_tx, get_price_sina
+from .bar_store import BarStore
+from .bars import BarArray
+from .cache import load_market_snapshot
+from .market_hours import now_shanghai, session_closed
+from .metrics import inc
+
+logger = logging.getLogger(__name__)
+
+
+def market_code(symbol: str) -> str:
+    """快照中的6位代码加上交易所前缀：6/9开头为上交所，其余为深交所"""
+    symbol = symbol.strip().lower()
+    if symbol[:2] in ('sh', 'sz', 'bj'):
+        return symbol
+    return ('sh' if symbol[:1] in ('6', '9') else 'sz') + symbol
+
+
+class RateLimiter:
+    """限制请求发起速率（每秒 rate 次），rate 为 0 时不限速"""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate and rate > 0 else 0.0
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self) -> None:
+        if not self.interval:
+            return
+        async with self._lock:
+            now = asyncio.get_running_loop().time()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class Checkpoint:
+    """
+    回填进度：记录某个交易日、某个条数设置下已完成和失败的股票
+
+    日期或条数变化时视为新的一轮，已有K线仍只追加新的部分。
+    """
+
+    def __init__(self, path: str, run_key: str):
+        self.path = path
+        self.run_key = run_key
+        self.done: set = set()
+        self.failed: Dict[str, str] = {}
+
+    def load(self) -> "Checkpoint":
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return self
+        if state.get('run_key') == self.run_key:
+            self.done = set(state.get('done', []))
+            self.failed = state.get('failed', {})
+        return self
+
+    def save(self) -> None:
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'run_key': self.run_key, 'done': sorted(self.done), 'failed': self.failed},
+                      f, ensure_ascii=False)
+        os.replace(tmp, self.path)
+
+
+class Backfill:
+    """一次批量回填任务，progress() 可在运行中随时读取进度"""
+
+    def __init__(
+            self,
+            symbols: Optional[List[str]] = None,
+            count: int = 2000,
+            concurrency: int = 8,
+            rate: float = 20,
+            retries: int = 2,
+            resume: bool = True,
+            store: Optional[BarStore] = None,
+            checkpoint_every: int = 50
+    ):
+        self.symbols = [market_code(s) for s in symbols] if symbols else None
+        self.count = count
+        self.concurrency = concurrency
+        self.retries = retries
+        self.resume = resume
+        self.store = store or BarStore()
+        self.checkpoint_every = checkpoint_every
+        self.limiter = RateLimiter(rate)
+        # 盘中完成的股票不含当天日线，收盘后再运行时需要重新处理
+        now = now_shanghai()
+        state = 'closed' if session_closed(now.date(), now) else 'open'
+        self.checkpoint = Checkpoint(os.path.join(self.store.root, self.store.frequency, '.checkpoint.json'),
+                                     run_key=f'{now.date().isoformat()}:{count}:{state}')
+        self.total = 0
+        self.skipped = 0
+        self.completed = 0
+        self.bars_written = 0
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    def progress(self) -> Dict:
+        elapsed = ((self.finished_at or time.monotonic()) - self.started_at) if self.started_at else 0.0
+        return {
+            'total': self.total,
+            'skipped': self.skipped,
+            'completed': self.completed,
+            'failed': len(self.checkpoint.failed),
+            'bars_written': self.bars_written,
+            'elapsed_sec': round(elapsed, 1),
+            'symbols_per_sec': round(self.completed / elapsed, 2) if elapsed > 0 else 0.0,
+            'store': self.store.root,
+        }
+
+    async def _symbols(self) -> List[str]:
+        if self.symbols:
+            return self.symbols
+        stocks = await load_market_snapshot()
+        if not stocks:
+            raise RuntimeError("全市场快照为空，无法获取股票列表")
+        return sorted({market_code(stock['symbol']) for stock in stocks})
+
+    def _fetch(self, code: str):
+        """返回 (日线, 复权方式)，库中已有数据时只用相同复权方式的来源"""
+        adjust = self.store.adjustment(code)
+        if adjust == 'qfq':
+            return get_price_day_tx(code, count=self.count), 'qfq'
+        try:
+            return get_price_sina(code, count=self.count, frequency='1d'), 'none'
+        except Exception:
+            if adjust == 'none':
+                raise
+            inc('source_fallbacks_total', source='sina', fallback='tencent')
+            return get_price_day_tx(code, count=self.count), 'qfq'
+
+    @staticmethod
+    def _settled(df) -> BarArray:
+        """去掉尚未收盘的当天日线"""
+        now = now_shanghai()
+        if not session_closed(now.date(), now):
+            df = df[df.index.date < now.date()]
+        return BarArray.from_frame(df)
+
+    def _rewrite_qfq(self, code: str, bars: BarArray) -> int:
+        """前复权价格与库中对不上（期间发生过除权除息）：取回覆盖库中全部日期的前复权日线，整段替换"""
+        first, _ = self.store.bounds(code)
+        if bars.time[0] > first:
+            stored = self.store.load(code)
+            bars = self._settled(get_price_day_tx(code, count=len(stored) + len(bars)))
+            if bars.time[0] > first:
+                logger.warning(f"{code} 的前复权日线只能取到 {bars.time[0]} 起，库中更早的K线无法重新复权，已丢弃")
+        logger.info(f"{code} 的前复权价格已变化（除权除息），重写库中的K线")
+        inc('bar_store_rewrites_total', reason='qfq')
+        return self.store.replace(code, bars, adjust='qfq')
+
+    def _fetch_and_store(self, code: str) -> int:
+        df, adjust = self._fetch(code)
+        if df is None or df.empty:
+            return 0
+        bars = self._settled(df)
+        if not len(bars):
+            return 0
+        if adjust == 'qfq' and self.store.adjustment(code) == 'qfq' and not self.store.matches(code, bars):
+            return self._rewrite_qfq(code, bars)
+        return self.store.append(code, bars, adjust=adjust)
+
+    async def _one(self, code: str, semaphore: asyncio.Semaphore) -> None:
+        async with semaphore:
+            for attempt in range(self.retries + 1):
+                await self.limiter.wait()
+                try:
+                    written = await asyncio.to_thread(self._fetch_and_store, code)
+                except Exception as e:
+                    if attempt < self.retries:
+                        await asyncio.sleep(2 ** attempt)
+                        continue
+                    self.checkpoint.failed[code] = str(e)
+                    logger.warning(f"回填失败 {code}: {e}")
+                    return
+                self.bars_written += written
+                self.completed += 1
+                self.checkpoint.done.add(code)
+                self.checkpoint.failed.pop(code, None)
+                if self.completed % self.checkpoint_every == 0:
+                    self.checkpoint.save()
+                    p = self.progress()
+                    logger.info(f"回填进度 {p['completed']}/{p['total'] - p['skipped']}，{p['symbols_per_sec']} 只/秒")
+                return
+
+    async def run(self) -> Dict:
+        self.started_at = time.monotonic()
+        if self.resume:
+            self.checkpoint.load()
+        symbols = await self._symbols()
+        pending = [code for code in symbols if code not in self.checkpoint.done]
+        self.total = len(symbols)
+        self.skipped = self.total - len(pending)
+        logger.info(f"开始回填日线: 共{self.total}只，跳过已完成{self.skipped}只")
+        semaphore = asyncio.Semaphore(self.concurrency)
+        try:
+            await asyncio.gather(*(self._one(code, semaphore) for code in pending))
+        finally:
+            self.checkpoint.save()
+            self.finished_at = time.monotonic()
+        return self.progress()
+
+
+class BackfillJob:
+    """服务进程内最多同时运行一个回填任务，供 MCP 工具启动/查询/取消"""
+
+    def __init__(self):
+        self.backfill: Optional[Backfill] = None
+        self.task: Optional[asyncio.Task] = None
+
+    def start(self, **kwargs) -> Dict:
+        if self.task and not self.task.done():
+            return {'status': 'running', **self.backfill.progress()}
+        self.backfill = Backfill(**kwargs)
+        self.task = asyncio.create_task(self.backfill.run())
+        return {'status': 'started', **self.backfill.progress()}
+
+    def status(self) -> Dict:
+        if self.task is None:
+            return {'status': 'idle'}
+        if not self.task.done():
+            return {'status': 'running', **self.backfill.progress()}
+        if self.task.cancelled():
+            return {'status': 'cancelled', **self.backfill.progress()}
+        if self.task.exception():
+            return {'status': 'error', 'message': str(self.task.exception()), **self.backfill.progress()}
+        return {'status': 'finished', **self.backfill.progress()}
+
+    async def cancel(self) -> Dict:
+        if self.task and not self.task.done():
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+        return self.status()
+
+
+backfill_job = BackfillJob()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="全市场日线批量回填")
+    parser.add_argument('--symbols', nargs='+', help="只回填指定股票，默认取全市场快照")
+    parser.add_argument('--count', type=int, default=2000, help="每只股票获取的日线条数")
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--rate', type=float, default=20, help="每秒最多发起的请求数，0 表示不限")
+    parser.add_argument('--root', help="K线库目录，默认 ASHARE_BAR_STORE 或 ~/.mcp_ashare_quant/bars")
+    parser.add_argument('--no-resume', action='store_true', help="忽略已有进度，重新回填全部股票")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    backfill = Backfill(symbols=args.symbols, count=args.count, concurrency=args.concurrency, rate=args.rate,
+                        resume=not args.no_resume, store=BarStore(args.root))
+    result = asyncio.run(backfill.run())
+    print(f"回填完成: 成功{result['completed']}只，跳过{result['skipped']}只，失败{result['failed']}只，"
+           f"写入{result['bars_written']}根K线，用时{result['elapsed_sec']}秒（{result['symbols_per_sec']} 只/秒）")
+
+
+if __name__ == '__main__':
+    main()
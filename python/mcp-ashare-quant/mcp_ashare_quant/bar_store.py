@@ -0,0 +1,180 @@
+"""
+本地K线库
+
+按股票代码分目录、以只追加的分块文件保存 BarArray：
+
+    <root>/1d/sh600519/000001.npz
+    <root>/1d/sh600519/000002.npz   # 只包含库中还没有的K线
+
+每块是未压缩的 npz（各列一个数组），写入时先写临时文件再改名，中断不会留下半个分块。
+读取时按各块的起始时间排序后拼接。每块同时记录价格的复权方式（'none' 不复权 / 'qfq' 前复权），
+同一只股票只能追加相同复权方式的K线，避免不同来源的价格混在一起造成跳空。根目录默认为 ~/.mcp_ashare_quant/bars，可用环境变量 ASHARE_BAR_STORE 修改。
+
+前复权价格在每次除权除息后整体改变，旧的K线不能再与新K线拼接。replace() 把整段历史写成一个
+基准分块（<序号>.base.npz），读取时忽略序号更小的分块，之后再删除它们：删除前中断也不会读到新旧混合的数据。
+"""
+import os
+import re
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .bars import FIELDS, PRICE_FIELDS, BarArray
+
+_CHUNK = re.compile(r'^(\d{6})(\.base)?\.npz$')
+
+
+def default_root() -> str:
+    return os.getenv('ASHARE_BAR_STORE') or os.path.join(os.path.expanduser('~'), '.mcp_ashare_quant', 'bars')
+
+
+class BarStore:
+    """只追加的本地K线库，同一代码的写入串行化，不同代码可并发写入"""
+
+    def __init__(self, root: Optional[str] = None, frequency: str = '1d'):
+        self.root = root or default_root()
+        self.frequency = frequency
+        self._bounds: Dict[str, Optional[Tuple[np.datetime64, np.datetime64]]] = {}
+        self._adjust: Dict[str, Optional[str]] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+
+    def _dir(self, code: str) -> str:
+        return os.path.join(self.root, self.frequency, code)
+
+    def _lock(self, code: str) -> threading.Lock:
+        with self._locks_guard:
+            return self._locks.setdefault(code, threading.Lock())
+
+    def _all_chunks(self, code: str) -> List[str]:
+        path = self._dir(code)
+        if not os.path.isdir(path):
+            return []
+        return sorted(name for name in os.listdir(path) if _CHUNK.match(name))
+
+    def _chunks(self, code: str) -> List[str]:
+        """有效的分块：最后一个基准分块及其之后的分块"""
+        chunks = self._all_chunks(code)
+        bases = [i for i, name in enumerate(chunks) if _CHUNK.match(name).group(2)]
+        return chunks[bases[-1]:] if bases else chunks
+
+    def codes(self) -> List[str]:
+        """库中已有K线的全部代码"""
+        path = os.path.join(self.root, self.frequency)
+        if not os.path.isdir(path):
+            return []
+        return sorted(code for code in os.listdir(path) if self._chunks(code))
+
+    def bounds(self, code: str) -> Optional[Tuple[np.datetime64, np.datetime64]]:
+        """已保存K线的 (最早时间, 最晚时间)，没有数据时返回None"""
+        if code not in self._bounds:
+            bounds = None
+            for name in self._chunks(code):
+                with np.load(os.path.join(self._dir(code), name)) as chunk:
+                    times = chunk['time']
+                    bounds = (times[0], times[-1]) if bounds is None else \
+                        (min(bounds[0], times[0]), max(bounds[1], times[-1]))
+            self._bounds[code] = bounds
+        return self._bounds[code]
+
+    def adjustment(self, code: str) -> Optional[str]:
+        """已保存K线的复权方式，没有数据（或旧分块未记录）时返回None"""
+        if code not in self._adjust:
+            adjust = None
+            for name in self._chunks(code):
+                with np.load(os.path.join(self._dir(code), name)) as chunk:
+                    if 'adjust' in chunk.files:
+                        adjust = str(chunk['adjust'])
+                        break
+            self._adjust[code] = adjust
+        return self._adjust[code]
+
+    def _write_chunk(self, code: str, bars: BarArray, adjust: str, base: bool = False) -> None:
+        chunks = self._all_chunks(code)
+        seq = int(_CHUNK.match(chunks[-1]).group(1)) + 1 if chunks else 1
+        path = self._dir(code)
+        os.makedirs(path, exist_ok=True)
+        tmp = os.path.join(path, f'.{seq:06d}.tmp.npz')
+        np.savez(tmp, adjust=np.array(adjust), **{field: getattr(bars, field) for field in FIELDS})
+        os.replace(tmp, os.path.join(path, f'{seq:06d}.base.npz' if base else f'{seq:06d}.npz'))
+
+    def append(self, code: str, bars: BarArray, adjust: str = 'none') -> int:
+        """
+        写入库中还没有的K线，返回实际写入的条数
+
+        比已有数据更新的部分和更早的部分（加大 count 回填更长历史时）各写成一个新分块，
+        已有时间范围内的K线不会重复写入。复权方式与已保存的K线不同时抛出 ValueError。
+        """
+        with self._lock(code):
+            stored = self.adjustment(code)
+            if stored is not None and stored != adjust:
+                raise ValueError(f"{code} 已保存的K线复权方式为 {stored}，不能追加复权方式为 {adjust} 的K线")
+            bounds = self.bounds(code)
+            if bounds is None:
+                parts = [bars]
+            else:
+                first, last = bounds
+                parts = [_slice(bars, 0, int(np.searchsorted(bars.time, first, side='left'))),
+                         _slice(bars, int(np.searchsorted(bars.time, last, side='right')), len(bars))]
+            written = 0
+            for part in parts:
+                if len(part):
+                    self._write_chunk(code, part, adjust)
+                    self._adjust[code] = adjust
+                    written += len(part)
+                    bounds = (part.time[0], part.time[-1]) if bounds is None else \
+                        (min(bounds[0], part.time[0]), max(bounds[1], part.time[-1]))
+            self._bounds[code] = bounds
+            return written
+
+    def replace(self, code: str, bars: BarArray, adjust: str = 'none') -> int:
+        """用 bars 替换某只股票已保存的全部K线（如前复权价格因除权除息整体改变），返回写入的条数"""
+        with self._lock(code):
+            if not len(bars):
+                raise ValueError(f"{code} 替换用的K线为空")
+            self._write_chunk(code, bars, adjust, base=True)
+            live = set(self._chunks(code))
+            for name in self._all_chunks(code):
+                if name not in live:
+                    try:
+                        os.remove(os.path.join(self._dir(code), name))
+                    except OSError:
+                        pass  # 已被忽略的旧分块，留到下次替换时再删
+            self._bounds[code] = (bars.time[0], bars.time[-1])
+            self._adjust[code] = adjust
+            return len(bars)
+
+    def matches(self, code: str, bars: BarArray, rtol: float = 1e-4) -> bool:
+        """
+        bars 与已保存的K线在重叠的时间上价格是否一致
+
+        前复权K线在上次保存之后发生过除权除息时，重叠部分的价格会整体变化，此时返回 False；
+        没有重叠部分（无法确认）时也返回 False。
+        """
+        bounds = self.bounds(code)
+        if bounds is None or not len(bars):
+            return False
+        stored = self.load(code)
+        common, i, j = np.intersect1d(stored.time, bars.time, assume_unique=True, return_indices=True)
+        if not len(common):
+            return False
+        return all(np.allclose(getattr(stored, field)[i], getattr(bars, field)[j], rtol=rtol)
+                   for field in PRICE_FIELDS)
+
+    def load(self, code: str, count: Optional[int] = None) -> Optional[BarArray]:
+        """读取某只股票的全部K线（或最后 count 条），没有数据时返回None"""
+        chunks = []
+        for name in self._chunks(code):
+            with np.load(os.path.join(self._dir(code), name)) as chunk:
+                chunks.append({field: chunk[field] for field in FIELDS})
+        if not chunks:
+            return None
+        # 分块之间时间范围不重叠，按各块的起始时间排序后拼接
+        chunks.sort(key=lambda chunk: chunk['time'][0])
+        bars = BarArray(**{field: np.concatenate([chunk[field] for chunk in chunks]) for field in FIELDS})
+        return bars.tail(count) if count else bars
+
+
+def _slice(bars: BarArray, start: int, stop: int) -> BarArray:
+    return BarArray(*(getattr(bars, field)[start:stop] for field in FIELDS))
@@ -0,0 +1,174 @@
+"""
+紧凑K线容器
+
+按列存储（structure-of-arrays）的K线数据：时间为 datetime64[s]，价格可选 float32，
+成交量为 int64。相比 float64 的 DataFrame，大量股票的分钟线常驻内存时占用约减半。
+
+SharedBars 把 BarArray 放进 multiprocessing.shared_memory，
+其他进程中的指标计算只需拿到 spec 即可零拷贝地挂载同一块内存：
+
+    shared = SharedBars.create(BarArray.from_frame(df))
+    pool.submit(worker, shared.spec)          # worker 内: SharedBars.attach(spec).bars.close
+    ...
+    shared.close(); shared.unlink()
+"""
+import sys
+import threading
+from multiprocessing import resource_tracker, shared_memory
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+PRICE_FIELDS = ('open', 'high', 'low', 'close')
+FIELDS = ('time',) + PRICE_FIELDS + ('volume',)
+_ALIGN = 64  # 每列按缓存行对齐
+_attach_lock = threading.Lock()
+
+
+class BarArray:
+    """列存K线，各字段都是等长的一维 numpy 数组"""
+
+    def __init__(self, time, open, high, low, close, volume):
+        self.time = time
+        self.open = open
+        self.high = high
+        self.low = low
+        self.close = close
+        self.volume = volume
+        n = len(time)
+        if any(len(getattr(self, field)) != n for field in FIELDS):
+            raise ValueError("K线各列长度不一致")
+
+    @property
+    def price_dtype(self) -> np.dtype:
+        return self.close.dtype
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, price_dtype=np.float32) -> "BarArray":
+        """
+        由 get_price 返回的 DataFrame 构造
+
+        时间取自 datetime 索引，没有时退回 date 列（新浪接口旧格式）。
+        """
+        if isinstance(df.index, pd.DatetimeIndex):
+            times = df.index.values
+        else:
+            times = pd.to_datetime(df['date']).values
+        return cls(
+            time=np.ascontiguousarray(times, dtype='datetime64[s]'),
+            open=np.ascontiguousarray(df['open'].values, dtype=price_dtype),
+            high=np.ascontiguousarray(df['high'].values, dtype=price_dtype),
+            low=np.ascontiguousarray(df['low'].values, dtype=price_dtype),
+            close=np.ascontiguousarray(df['close'].values, dtype=price_dtype),
+            volume=np.rint(df['volume'].values).astype(np.int64) if 'volume' in df else np.zeros(len(df), np.int64),
+        )
+
+    def to_frame(self) -> pd.DataFrame:
+        """转换回与 get_price 相同列名的 DataFrame（会复制数据）"""
+        index = pd.DatetimeIndex(self.time.astype('datetime64[ns]'), name='')
+        return pd.DataFrame({
+            'open': self.open, 'high': self.high, 'low': self.low,
+            'close': self.close, 'volume': self.volume,
+        }, index=index)
+
+    def tail(self, n: int) -> "BarArray":
+        """最后 n 根K线（视图，不复制）"""
+        return BarArray(*(getattr(self, field)[-n:] for field in FIELDS))
+
+    def __len__(self) -> int:
+        return len(self.time)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(getattr(self, field).nbytes for field in FIELDS)
+
+
+def _layout(length: int, price_dtype) -> Dict[str, tuple]:
+    """计算各列在共享内存块中的 (偏移, dtype)，返回值附带总大小 '_size'"""
+    dtypes = {'time': np.dtype('datetime64[s]'), 'volume': np.dtype(np.int64)}
+    dtypes.update({field: np.dtype(price_dtype) for field in PRICE_FIELDS})
+    offset, layout = 0, {}
+    for field in FIELDS:
+        layout[field] = (offset, dtypes[field])
+        offset += -(-length * dtypes[field].itemsize // _ALIGN) * _ALIGN
+    layout['_size'] = (max(offset, 1), None)
+    return layout
+
+
+def _open_untracked(name: str) -> shared_memory.SharedMemory:
+    """
+    挂载已存在的共享内存块，不登记到 resource_tracker
+
+    登记后挂载方进程退出时 resource_tracker 会删除（或报告泄漏）这块内存，
+    而它的生命周期由创建方负责。3.13 起可直接传 track=False；
+    之前的版本在挂载期间跳过对这个名字的登记。
+    """
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    with _attach_lock:
+        register = resource_tracker.register
+        target = name if name.startswith('/') else '/' + name
+
+        def register_others(resource: str, rtype: str) -> None:
+            if not (rtype == 'shared_memory' and resource in (name, target)):
+                register(resource, rtype)
+
+        resource_tracker.register = register_others
+        try:
+            return shared_memory.SharedMemory(name=name)
+        finally:
+            resource_tracker.register = register
+
+
+class SharedBars:
+    """存放在共享内存中的 BarArray，创建进程负责 unlink，其他进程 attach 后只读使用"""
+
+    def __init__(self, shm: shared_memory.SharedMemory, length: int, price_dtype):
+        self.shm = shm
+        self.length = length
+        self.price_dtype = np.dtype(price_dtype)
+        layout = _layout(length, self.price_dtype)
+        self.bars = BarArray(**{
+            field: np.ndarray((length,), dtype=dtype, buffer=shm.buf, offset=offset)
+            for field, (offset, dtype) in layout.items() if field != '_size'
+        })
+
+    @classmethod
+    def create(cls, bars: BarArray, name: Optional[str] = None) -> "SharedBars":
+        """新建共享内存块并把 bars 复制进去（唯一一次复制）"""
+        size = _layout(len(bars), bars.price_dtype)['_size'][0]
+        shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        shared = cls(shm, len(bars), bars.price_dtype)
+        for field in FIELDS:
+            getattr(shared.bars, field)[:] = getattr(bars, field)
+        return shared
+
+    @classmethod
+    def attach(cls, spec: Dict) -> "SharedBars":
+        """按 spec 挂载已存在的共享内存块，不复制数据；挂载方退出不会删除这块内存"""
+        return cls(_open_untracked(spec['name']), spec['length'], spec['price_dtype'])
+
+    @property
+    def spec(self) -> Dict:
+        """可 pickle 的描述信息，传给其他进程用于 attach"""
+        return {'name': self.shm.name, 'length': self.length, 'price_dtype': self.price_dtype.str}
+
+    def close(self) -> None:
+        """释放本进程的映射，之后不能再访问 bars"""
+        self.bars = None
+        try:
+            self.shm.close()
+        except BufferError:
+            # 仍有视图引用这块内存（如异常回溯中的局部变量），映射在这些视图释放后随对象一起回收
+            pass
+
+    def unlink(self) -> None:
+        """删除共享内存块（仅创建方调用）"""
+        self.shm.unlink()
+
+    def __enter__(self) -> "SharedBars":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -0,0 +1,177 @@
+"""
+行情数据缓存
+
+进程内的 K 线缓存与全市场快照缓存，get_stock_data、recommend_a_shares
+和预热调度器（prefetch）共用同一份数据。
+"""
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from .ashare import get_price
+from .market_hours import cache_ttl
+from .metrics import inc
+from .recommend import get_stock_data as fetch_market_snapshot
+from .singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# 非预热情况下各周期的默认缓存时间（秒），交易时段外自动延长到下一次开盘
+DEFAULT_BAR_TTL = {'1m': 30, '5m': 60, '15m': 60, '30m': 60, '60m': 60, '1d': 60, '1w': 300, '1M': 600}
+DEFAULT_SNAPSHOT_TTL = 30
+
+
+def normalize_code(code) -> str:
+    """
+    证券代码规范化为小写带交易所前缀的形式，作为缓存 key 的一部分
+
+    'SH600519'、' sh600519 '、'600519.XSHG' 都得到 'sh600519'，与 get_price 的代码兼容处理一致；
+    不带前缀和后缀的6位代码无法区分交易所（如 000001 既是上证指数也是平安银行），原样保留。
+    """
+    code = str(code).strip()
+    upper = code.upper()
+    if upper.endswith('.XSHG'):
+        return 'sh' + code[:-5].lower()
+    if upper.endswith('.XSHE'):
+        return 'sz' + code[:-5].lower()
+    return code.lower()
+
+
+class TTLCache:
+    """带过期时间和容量上限的键值缓存（线程安全，超出容量时淘汰最久未使用的项）"""
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self._data: "OrderedDict[Any, tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key) -> Optional[Any]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl: float) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class BarCache:
+    """
+    K线缓存，按 (代码, 周期, 结束日期) 保存最近一次获取的 DataFrame
+
+    缓存中保存的条数不少于请求条数时直接截取尾部返回，
+    因此预热时取较多条数即可覆盖后续各种 count 的请求。
+    """
+
+    def __init__(self, maxsize: int = 1024):
+        self._cache = TTLCache(maxsize)
+
+    @staticmethod
+    def _key(code: str, frequency: str, end_date: Optional[str]) -> tuple:
+        return normalize_code(code), frequency, end_date or ''
+
+    def get(self, code: str, frequency: str, count: int, end_date: str = ''):
+        entry = self._cache.get(self._key(code, frequency, end_date))
+        if entry is None:
+            return None
+        cached_count, df = entry
+        if count > cached_count:
+            return None
+        return df.tail(count)
+
+    def put(self, code: str, frequency: str, count: int, end_date: str, df, ttl: float,
+            replace: bool = False) -> None:
+        key = self._key(code, frequency, end_date)
+        entry = self._cache.get(key)
+        if not replace and entry is not None and entry[0] > count:
+            return  # 已有更长且仍有效的数据，不用短数据覆盖
+        self._cache.set(key, (count, df), ttl)
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+
+bar_cache = BarCache()
+snapshot_cache = TTLCache(maxsize=1)
+singleflight = SingleFlight()
+
+
+def refresh_price(code: str, frequency: str = '1d', count: int = 10, end_date: str = '', ttl: Optional[float] = None):
+    """跳过缓存直接获取K线并写入缓存"""
+    df = get_price(code, end_date=end_date, count=count, frequency=frequency)
+    if hasattr(df, 'to_dict'):
+        if ttl is None:
+            ttl = cache_ttl(DEFAULT_BAR_TTL.get(frequency, 60))
+        bar_cache.put(code, frequency, count, end_date, df, ttl, replace=True)
+    return df
+
+
+def cached_get_price(code: str, frequency: str = '1d', count: int = 10, end_date: str = ''):
+    """带缓存的 get_price，命中缓存时不发起网络请求"""
+    df = bar_cache.get(code, frequency, count, end_date)
+    if df is not None:
+        inc('cache_hits_total', cache='bars')
+        logger.info(f"K线缓存命中: {code} {frequency} {count}")
+        return df
+    inc('cache_misses_total', cache='bars')
+    return refresh_price(code, frequency=frequency, count=count, end_date=end_date)
+
+
+def refresh_market_snapshot(ttl: Optional[float] = None) -> List[Dict]:
+    """跳过缓存重新下载全市场快照并写入缓存"""
+    stocks = fetch_market_snapshot()
+    if stocks:
+        snapshot_cache.set('snapshot', stocks, ttl if ttl is not None else cache_ttl(DEFAULT_SNAPSHOT_TTL))
+    return stocks
+
+
+def price_request_key(code: str, frequency: str, count: int, end_date: Optional[str]) -> tuple:
+    """规范化K线请求参数，作为请求合并的 key"""
+    return 'price', normalize_code(code), frequency, int(count), end_date or ''
+
+
+async def load_price(code: str, frequency: str = '1d', count: int = 10, end_date: str = ''):
+    """
+    异步获取K线：先查缓存，未命中时在线程中请求接口，
+    并发的相同请求合并为一次
+    """
+    df = bar_cache.get(code, frequency, count, end_date)
+    if df is not None:
+        inc('cache_hits_total', cache='bars')
+        logger.info(f"K线缓存命中: {code} {frequency} {count}")
+        return df
+    key = price_request_key(code, frequency, count, end_date)
+    return await singleflight.do_in_thread(key, cached_get_price, code, frequency=frequency, count=count,
+                                           end_date=end_date)
+
+
+async def load_market_snapshot() -> List[Dict]:
+    """异步获取全市场快照，并发的下载合并为一次，每个调用方拿到各自的浅拷贝"""
+    stocks = snapshot_cache.get('snapshot')
+    if stocks is None:
+        inc('cache_misses_total', cache='snapshot')
+        stocks = await singleflight.do_in_thread('snapshot', refresh_market_snapshot)
+    else:
+        inc('cache_hits_total', cache='snapshot')
+        logger.info("全市场快照缓存命中")
+    return [dict(stock) for stock in stocks]
@@ -0,0 +1,197 @@
+"""
+多只股票的相关系数 / 协方差
+
+把各股票的日线收盘价按日期对齐成 (交易日, 股票) 矩阵，计算对数收益率后，
+用一次矩阵乘法 Xᵀ·X 得到全部两两协方差（由 numpy 调用 BLAS），再换算成相关系数。
+
+对齐规则：
+- 日期轴取所有股票交易日的并集中最近的 count+1 天
+- 停牌日沿用前一交易日收盘价（收益率为0）；上市前的日期视为缺失
+- 缺失收益率超过 max_missing 比例的股票不参与计算，其余缺失按0处理
+"""
+import asyncio
+import logging
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .backfill import market_code
+from .bar_store import BarStore
+from .bars import FIELDS, BarArray
+from .cache import load_price
+from .market_hours import latest_session
+
+logger = logging.getLogger(__name__)
+
+# 股票数超过该值时用 float32 计算，矩阵内存减半（5000只约100MB）
+FLOAT32_ABOVE = 2000
+
+
+async def load_daily_bars(
+        symbols: List[str],
+        count: int,
+        store: Optional[BarStore] = None,
+        fetch_missing: bool = True
+) -> Dict[str, BarArray]:
+    """
+    读取各股票最近 count+1 根日线
+
+    优先使用本地K线库（见 backfill），库中没有的股票在 fetch_missing 时经行情缓存获取。
+    fetch_missing 时库中数据没有更新到最近一个交易日的股票也视为没有，改为整段重新获取：
+    否则与新获取的股票对齐时，缺少的最近几天会被前值填充成0收益率，使相关系数失真。
+    """
+    store = store or BarStore()
+    codes = [market_code(symbol) for symbol in symbols]
+    latest = np.datetime64(latest_session(), 'D')
+
+    def from_store():
+        series = {}
+        for code in codes:
+            bars = store.load(code, count + 1)
+            if bars is None or not len(bars):
+                continue
+            if fetch_missing and bars.time[-1].astype('datetime64[D]') < latest:
+                logger.info(f"本地K线库中 {code} 只到 {bars.time[-1].astype('datetime64[D]')}，重新获取")
+                continue
+            series[code] = bars
+        return series
+
+    series = await asyncio.to_thread(from_store)
+    missing = [code for code in codes if code not in series]
+    if missing and fetch_missing:
+        frames = await asyncio.gather(*(load_price(code, frequency='1d', count=count + 1) for code in missing),
+                                      return_exceptions=True)
+        for code, df in zip(missing, frames):
+            if isinstance(df, Exception) or df is None or df.empty:
+                logger.warning(f"获取K线失败，跳过 {code}: {df if isinstance(df, Exception) else '无数据'}")
+                continue
+            series[code] = BarArray.from_frame(df, price_dtype=np.float64)
+    return series
+
+
+def pack_bars(series: Dict[str, BarArray]) -> Tuple[BarArray, List[str], List[int]]:
+    """把各股票的K线首尾相接拼成一个 BarArray（用于放进 SharedBars），返回 (K线, 代码, 各段起点及总长)"""
+    codes = list(series)
+    offsets = np.concatenate([[0], np.cumsum([len(series[code]) for code in codes])]).astype(int).tolist()
+    bars = BarArray(**{field: np.concatenate([getattr(series[code], field) for code in codes])
+                       for field in FIELDS})
+    return bars, codes, offsets
+
+
+def unpack_bars(bars: BarArray, codes: List[str], offsets: List[int]) -> Dict[str, BarArray]:
+    """pack_bars 的逆操作，各股票的K线是 bars 的视图"""
+    return {code: BarArray(*(getattr(bars, field)[offsets[i]:offsets[i + 1]] for field in FIELDS))
+            for i, code in enumerate(codes)}
+
+
+def align_returns(
+        series: Dict[str, BarArray],
+        count: int,
+        max_missing: float = 0.1
+) -> Tuple[List[str], np.ndarray, np.ndarray]:
+    """返回 (参与计算的代码, 收益率对应的日期, 收益率矩阵[日期, 股票])"""
+    if not series:
+        return [], np.array([], dtype='datetime64[s]'), np.empty((0, 0))
+    dates = np.unique(np.concatenate([bars.time.astype('datetime64[D]') for bars in series.values()]))[-(count + 1):]
+    codes = list(series)
+    closes = np.full((len(dates), len(codes)), np.nan)
+    for j, code in enumerate(codes):
+        times = series[code].time.astype('datetime64[D]')
+        pos = np.searchsorted(dates, times)
+        inside = (pos < len(dates)) & (dates[np.minimum(pos, len(dates) - 1)] == times)
+        closes[pos[inside], j] = series[code].close[inside]
+
+    closes = pd.DataFrame(closes).ffill().to_numpy()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        returns = np.diff(np.log(closes), axis=0)
+    missing = np.isnan(returns).mean(axis=0) if len(returns) else np.ones(len(codes))
+    keep = missing <= max_missing
+    returns = np.nan_to_num(returns[:, keep], nan=0.0, posinf=0.0, neginf=0.0)
+    return [code for code, k in zip(codes, keep) if k], dates[1:], returns
+
+
+def covariance(returns: np.ndarray) -> np.ndarray:
+    """样本协方差矩阵：去均值后一次矩阵乘法"""
+    dtype = np.float32 if returns.shape[1] > FLOAT32_ABOVE else np.float64
+    x = returns - returns.mean(axis=0)
+    x = x.astype(dtype, copy=False)
+    return (x.T @ x) / max(len(x) - 1, 1)
+
+
+def correlation(cov: np.ndarray) -> np.ndarray:
+    std = np.sqrt(np.diag(cov))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        corr = cov / np.outer(std, std)
+    corr = np.nan_to_num(corr, nan=0.0)
+    np.fill_diagonal(corr, 1.0)
+    return corr
+
+
+def top_neighbors(matrix: np.ndarray, codes: List[str], k: int, precision: int = 4) -> Dict[str, List]:
+    """每只股票取数值最大的 k 个其他股票，返回 {代码: [[代码, 数值], ...]}"""
+    n = len(codes)
+    k = min(k, n - 1)
+    if k <= 0:
+        return {code: [] for code in codes}
+    scores = matrix.astype(np.float64, copy=True)
+    np.fill_diagonal(scores, -np.inf)
+    idx = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    top = np.take_along_axis(scores, idx, axis=1)
+    order = np.argsort(-top, axis=1)
+    idx = np.take_along_axis(idx, order, axis=1)
+    top = np.round(np.take_along_axis(top, order, axis=1), precision)
+    return {code: [[codes[j], v] for j, v in zip(idx[i].tolist(), top[i].tolist())] for i, code in enumerate(codes)}
+
+
+def rolling_mean_correlation(
+        returns: np.ndarray,
+        dates: np.ndarray,
+        window: int,
+        step: int = 1,
+        precision: int = 4
+) -> List[Dict]:
+    """滚动窗口内全部股票两两相关系数的均值（市场同涨同跌程度），每个窗口一次矩阵乘法"""
+    n = returns.shape[1]
+    result = []
+    if n < 2:
+        return result
+    for end in range(len(returns), window - 1, -step):
+        corr = correlation(covariance(returns[end - window:end]))
+        mean = (corr.sum() - n) / (n * (n - 1))
+        result.append({'end': str(dates[end - 1]), 'mean_corr': round(float(mean), precision)})
+    return result[::-1]
+
+
+def correlation_report(
+        series: Dict[str, BarArray],
+        count: int,
+        method: str = 'correlation',
+        window: Optional[int] = None,
+        step: int = 20,
+        top_k: Optional[int] = 5,
+        include_matrix: Optional[bool] = None,
+        precision: int = 4
+) -> Dict:
+    """analyze_correlation 的计算部分：对齐收益率、计算矩阵、邻居和滚动均值"""
+    codes, dates, returns = align_returns(series, count)
+    if len(codes) < 2 or len(returns) < 2:
+        raise ValueError(f"可用于计算的股票或交易日不足: {len(codes)}只, {len(returns)}天")
+    latest = returns[-window:] if window else returns
+    cov = covariance(latest)
+    matrix = correlation(cov) if method == 'correlation' else cov
+    result = {
+        "method": method,
+        "symbols": codes,
+        "dropped": sorted(set(series) - set(codes)),
+        "start": str(dates[-len(latest)]),
+        "end": str(dates[-1]),
+        "observations": len(latest),
+    }
+    if include_matrix or (include_matrix is None and len(codes) <= 50):
+        result["matrix"] = np.round(matrix, precision).tolist()
+    if top_k:
+        result["neighbors"] = top_neighbors(matrix, codes, top_k, precision)
+    if window:
+        result["rolling"] = rolling_mean_correlation(returns, dates, window, step, precision)
+    return result
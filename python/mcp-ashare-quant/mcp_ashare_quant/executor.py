@@ -0,0 +1,159 @@
+"""
+CPU密集型工具的进程池执行层
+
+plot_kline、calculate_technical_indicators、analyze_cross、analyze_correlation 的计算部分（见 tasks）
+分发到常驻的工作进程中执行，避免一次耗时的绘图阻塞事件循环上其他请求。
+
+- 工作进程在启动时预先导入 numpy/pandas/matplotlib，serve() 启动时即拉起全部进程
+- 每个工具有独立的并发上限，超出的调用在事件循环中排队（不占用进程池队列）
+- 排队中的调用被取消或超时时不会再提交；已在执行的调用无法中断，结果被丢弃
+- 数据量小于 ASHARE_TOOL_INLINE_BARS 时直接在当前进程执行，省去进程间传输开销
+- analyze_correlation 的大量本地K线经 bars.SharedBars 共享给工作进程，参数中只传 spec
+
+通过环境变量配置：
+    ASHARE_TOOL_WORKERS       工作进程数，默认 min(4, CPU核数)；0 表示不用进程池，改在线程中执行
+    ASHARE_TOOL_CONCURRENCY   各工具同时执行的调用数，如 "plot_kline:2,analyze_cross:4"
+    ASHARE_TOOL_TIMEOUT       单次调用超时秒数，默认 60
+    ASHARE_TOOL_INLINE_BARS   小于该K线数的计算直接执行，默认 2000
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, Optional
+
+from .metrics import inc, metrics, span
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LIMITS = {'plot_kline': 2, 'calculate_technical_indicators': 4, 'analyze_cross': 4, 'analyze_correlation': 2}
+
+
+def parse_limits(value: str) -> Dict[str, int]:
+    """解析 "plot_kline:2,analyze_cross:4" 形式的并发配置"""
+    limits = {}
+    for item in filter(None, (part.strip() for part in value.split(','))):
+        tool, _, limit = item.partition(':')
+        if not limit or int(limit) < 1:
+            raise ValueError(f"并发配置格式错误: {item}")
+        limits[tool] = int(limit)
+    return limits
+
+
+def _init_worker() -> None:
+    """工作进程初始化：stdout 是 MCP 的 stdio 通道，子进程的输出全部改到 stderr；预先导入重型依赖"""
+    os.dup2(2, 1)
+    sys.stdout = sys.stderr
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot  # noqa: F401
+    import numpy  # noqa: F401
+    import pandas  # noqa: F401
+    from . import tasks  # noqa: F401
+
+
+def _ping() -> int:
+    return os.getpid()
+
+
+class ToolExecutor:
+    """按工具限流、把同步计算分发到工作进程的执行器"""
+
+    def __init__(
+            self,
+            workers: Optional[int] = None,
+            limits: Optional[Dict[str, int]] = None,
+            timeout: Optional[float] = 60,
+            inline_bars: int = 2000
+    ):
+        self.workers = min(4, os.cpu_count() or 1) if workers is None else workers
+        self.limits = {**DEFAULT_LIMITS, **(limits or {})}
+        self.timeout = timeout
+        self.inline_bars = inline_bars
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+
+    @classmethod
+    def from_env(cls) -> "ToolExecutor":
+        timeout = float(os.getenv('ASHARE_TOOL_TIMEOUT', '60'))
+        workers = os.getenv('ASHARE_TOOL_WORKERS')
+        return cls(
+            workers=int(workers) if workers else None,
+            limits=parse_limits(os.getenv('ASHARE_TOOL_CONCURRENCY', '')),
+            timeout=timeout if timeout > 0 else None,
+            inline_bars=int(os.getenv('ASHARE_TOOL_INLINE_BARS', '2000')),
+        )
+
+    def start(self) -> None:
+        """创建进程池并拉起全部工作进程"""
+        if self._pool is not None or self.workers <= 0:
+            return
+        # 服务进程里有指标/预热线程，用 spawn 避免 fork 时复制线程持有的锁
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+        )
+        for _ in range(self.workers):
+            self._pool.submit(_ping)
+        logger.info(f"工具进程池已启动: {self.workers} 个工作进程")
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def _semaphore(self, tool: str) -> asyncio.Semaphore:
+        if tool not in self._semaphores:
+            self._semaphores[tool] = asyncio.Semaphore(self.limits.get(tool, max(1, self.workers)))
+        return self._semaphores[tool]
+
+    async def run(self, tool: str, func: Callable, *args, size: Optional[int] = None):
+        """
+        执行 tasks 中的函数并返回其结果，各阶段耗时记入 tool 的运行指标
+
+        Args:
+            size: 输入的K线数，小于 inline_bars 时直接在当前进程执行
+        """
+        if size is not None and size < self.inline_bars:
+            result, stages = func(*args)
+        else:
+            with span('queue', tool=tool):
+                await self._semaphore(tool).acquire()
+            try:
+                result, stages = await self._submit(tool, func, *args)
+            finally:
+                self._semaphore(tool).release()
+        for stage, seconds in stages.items():
+            metrics.observe(tool, stage, seconds)
+        return result
+
+    async def _submit(self, tool: str, func: Callable, *args):
+        if self._pool is None and self.workers > 0:
+            self.start()
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        future = loop.run_in_executor(self._pool, func, *args)
+        try:
+            return await asyncio.wait_for(future, self.timeout)
+        except asyncio.CancelledError:
+            inc('tool_cancelled_total', tool=tool)
+            raise
+        except asyncio.TimeoutError:
+            inc('tool_timeouts_total', tool=tool)
+            raise TimeoutError(f"{tool} 执行超过 {self.timeout} 秒")
+        except BrokenProcessPool:
+            # 工作进程异常退出（如内存不足被杀），重建进程池后由调用方报错
+            logger.error(f"工具进程池已损坏，正在重建 ({tool})")
+            self._pool = None
+            self.start()
+            raise
+        finally:
+            metrics.observe(tool, 'worker', time.perf_counter() - start)
+
+
+tool_executor = ToolExecutor.from_env()
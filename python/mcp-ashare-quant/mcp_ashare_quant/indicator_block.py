@@ -0,0 +1,95 @@
+"""
+技术指标输出编码
+
+把 calculate_technical_indicators 计算出的各指标（单个数组或数组元组）按K线对齐成
+一个二维列块，统一做截取、四舍五入和预热期 NaN 处理，再输出为紧凑的列式结构：
+
+    {
+        'start': 12,                      # 第一行对应输入数据的下标
+        'index': ['2024-01-02', ...],     # 输入数据带 date 时给出
+        'columns': {'MA5': [...], 'BOLL_UPPER': [...]},
+        'warmup': {'MA5': 4, ...},        # nan_mode='offset' 时各列前导 NaN 的个数
+    }
+
+nan_mode:
+    offset  各列去掉前导 NaN，只在 warmup 中记录个数（默认，体积最小）
+    trim    去掉任意一列仍在预热期的行，所有列等长
+    null    保留全部行，NaN 输出为 None
+"""
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# 返回元组的指标各分量名称
+INDICATOR_COLUMNS = {
+    'BOLL': ('UPPER', 'MID', 'LOWER'),
+    'MACD': ('DIF', 'DEA', 'MACD'),
+}
+NAN_MODES = ('offset', 'trim', 'null')
+
+
+def align_indicators(results: Dict) -> Tuple[List[str], np.ndarray]:
+    """把 {名称: 数组或数组元组} 展开成列名列表和 (K线数, 列数) 的 float64 二维数组"""
+    names, columns = [], []
+    for name, value in results.items():
+        if isinstance(value, tuple):
+            suffixes = INDICATOR_COLUMNS.get(name) or [str(i) for i in range(len(value))]
+            for suffix, series in zip(suffixes, value):
+                names.append(f'{name}_{suffix}')
+                columns.append(np.asarray(series, dtype=np.float64))
+        else:
+            names.append(name)
+            columns.append(np.asarray(value, dtype=np.float64))
+    if not columns:
+        return names, np.empty((0, 0))
+    return names, np.column_stack(columns)
+
+
+def _to_list(column: np.ndarray) -> list:
+    """NaN 转为 None，其余保持 float"""
+    mask = np.isnan(column)
+    if not mask.any():
+        return column.tolist()
+    values = column.astype(object)
+    values[mask] = None
+    return values.tolist()
+
+
+def encode_block(
+        names: List[str],
+        block: np.ndarray,
+        index: Optional[Sequence] = None,
+        precision: Optional[int] = 3,
+        last_k: Optional[int] = None,
+        nan_mode: str = 'offset'
+) -> Dict:
+    """按 precision / last_k / nan_mode 编码对齐后的指标列块"""
+    if nan_mode not in NAN_MODES:
+        raise ValueError(f"不支持的NaN处理方式: {nan_mode}，可选: {', '.join(NAN_MODES)}")
+    start = max(0, len(block) - last_k) if last_k else 0
+    block = block[start:]
+    if precision is not None:
+        block = np.round(block, precision)
+
+    valid = ~np.isnan(block)
+    # 各列第一个有效值所在的行，整列都是 NaN 时为行数
+    first_valid = np.where(valid.any(axis=0), valid.argmax(axis=0), len(block)) if names else np.empty(0, int)
+
+    result = {'start': start}
+    if nan_mode == 'trim':
+        row0 = int(first_valid.max()) if len(first_valid) else 0
+        block = block[row0:]
+        start += row0
+        result['start'] = start
+        columns = {name: _to_list(block[:, j]) for j, name in enumerate(names)}
+    elif nan_mode == 'offset':
+        columns = {name: _to_list(block[first_valid[j]:, j]) for j, name in enumerate(names)}
+        result['warmup'] = {name: int(first_valid[j]) for j, name in enumerate(names)}
+    else:
+        columns = {name: _to_list(block[:, j]) for j, name in enumerate(names)}
+
+    result['length'] = len(block)
+    if index is not None:
+        result['index'] = list(index[start:start + len(block)])
+    result['columns'] = columns
+    return result
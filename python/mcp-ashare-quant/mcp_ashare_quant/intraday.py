@@ -0,0 +1,262 @@
+"""
+分钟线日内统计
+
+对 1 分钟K线按交易日分组，计算：
+- 每根K线：当日累计成交量、累计 VWAP（累计成交额 / 累计成交股数；接口没给成交额的K线用典型价 (高+低+收)/3 × 成交量估算）
+- 每个交易日：开高低收、成交量、VWAP、开盘区间（开盘后前N分钟）的高低点及收盘相对区间的位置
+- 成交量分布：已完成交易日在每个时刻的累计成交量占全天比例的均值
+
+分组全部基于排好序的时间数组用 np.add.reduceat 等向量化完成。
+IntradayAggregator 按股票缓存上述结果，新K线到达时只计算新增部分并与当天已有的累计值合并，
+盘中反复查询无需每次从头重算整天的数据。缓存的最后一根K线可能尚未走完（成交量不全、收盘价为实时报价），
+每次更新都会用新数据替换它，累计值从它之前的一根接着算。
+K线窗口最前面的交易日若不是从开盘开始（count 截断了当天前面的K线），整天丢弃，不当作完整交易日统计。
+新数据与缓存的当天K线之间缺了K线时（has_gap），缓存中的这一天同样作废，由新数据从开盘起重建。
+"""
+import datetime
+import logging
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+SESSION_OPEN = datetime.time(9, 30)
+# 第一根K线不晚于该时刻才视为从开盘开始的完整交易日
+SESSION_FIRST_BAR = datetime.time(9, 31)
+MORNING_CLOSE = datetime.time(11, 30)
+AFTERNOON_OPEN = datetime.time(13, 0)
+AFTERNOON_FIRST_BAR = datetime.time(13, 1)
+# 一个交易日的1分钟K线数（9:30、9:31-11:30、13:01-15:00）
+SESSION_BARS = 241
+# 分钟线成交量的单位是手
+LOT_SHARES = 100
+
+
+def _groups(days: np.ndarray):
+    """已排序的日期数组 -> (各组起始下标, 各组长度)"""
+    starts = np.concatenate(([0], np.flatnonzero(days[1:] != days[:-1]) + 1)) if len(days) else np.empty(0, int)
+    lengths = np.diff(np.append(starts, len(days)))
+    return starts, lengths
+
+
+def _next_bar(t: pd.Timestamp) -> pd.Timestamp:
+    """同一交易日内 t 之后应当出现的下一根1分钟K线的时间"""
+    day = t.normalize()
+    if t.time() < SESSION_OPEN:
+        return day + pd.Timedelta(hours=SESSION_FIRST_BAR.hour, minutes=SESSION_FIRST_BAR.minute)
+    if MORNING_CLOSE <= t.time() < AFTERNOON_OPEN:
+        return day + pd.Timedelta(hours=AFTERNOON_FIRST_BAR.hour, minutes=AFTERNOON_FIRST_BAR.minute)
+    return t + pd.Timedelta(minutes=1)
+
+
+def _group_cumsum(values: np.ndarray, starts: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """组内累加：全局累加后减去每组开始前的累计值"""
+    total = np.cumsum(values)
+    base = total[starts] - values[starts]
+    return total - np.repeat(base, lengths)
+
+
+class IntradayAggregator:
+    """按股票缓存日内统计结果，update() 只处理比已缓存数据更新的K线"""
+
+    def __init__(self, opening_range: int = 30, max_days: int = 20, max_codes: int = 256):
+        self.opening_range = opening_range
+        self.max_days = max_days
+        self.max_codes = max_codes
+        self._bars: "OrderedDict[str, pd.DataFrame]" = OrderedDict()
+        self._sessions: Dict[str, pd.DataFrame] = {}
+
+    def has_gap(self, code: str, df: pd.DataFrame) -> bool:
+        """df 中比缓存更新的部分与缓存的最后一根K线在同一交易日，但没有接上（中间缺了K线）"""
+        bars = self._bars.get(code)
+        if bars is None or not len(bars):
+            return False
+        last = bars.index[-1]
+        newer = df.index[df.index >= last]
+        return len(newer) > 0 and newer[0].normalize() == last.normalize() and newer[0] > _next_bar(last)
+
+    def update(self, code: str, df: pd.DataFrame) -> int:
+        """
+        合并新的分钟线，返回新增的K线数（不含被替换的最后一根缓存K线）
+
+        has_gap 时丢弃缓存中的这一天，用 df 中这一天的K线重建；df 也不是从这一天开盘开始时，
+        按截断规则整天丢弃，不输出缺K线的统计。调用方可以先用 has_gap 检查，多取一些K线再更新。
+        """
+        bars = self._bars.get(code)
+        replaced = 0
+        if bars is not None and len(bars):
+            if self.has_gap(code, df):
+                day = bars.index[-1].normalize()
+                logger.warning(f"{code} 的分钟线在 {bars.index[-1]} 之后缺K线，重建 {day.date()} 的日内统计")
+                bars = self._drop_from(code, day)
+                df = df[df.index >= day]
+            else:
+                # 最后一根缓存K线可能还没走完，连同它一起重新读入
+                df = df[df.index >= bars.index[-1]]
+                if len(df) and df.index[0] == bars.index[-1]:
+                    bars = bars.iloc[:-1]
+                    replaced = 1
+        if df.empty:
+            return 0
+
+        times = df.index.values
+        days = times.astype('datetime64[D]')
+        continues = bars is not None and len(bars) > 0 and days[0] == bars.index[-1].to_datetime64().astype('datetime64[D]')
+        if not continues:
+            # 窗口最前面的一天若被截断（不是从开盘开始），整天丢弃
+            first_minute = (times[0] - days[0].astype(times.dtype)) // np.timedelta64(1, 'm')
+            if first_minute > SESSION_FIRST_BAR.hour * 60 + SESSION_FIRST_BAR.minute:
+                df = df[days != days[0]]
+                if df.empty:
+                    return 0
+                times = df.index.values
+                days = times.astype('datetime64[D]')
+        starts, lengths = _groups(days)
+        high = df['high'].to_numpy(np.float64)
+        low = df['low'].to_numpy(np.float64)
+        close = df['close'].to_numpy(np.float64)
+        volume = df['volume'].to_numpy(np.float64)
+        amount = df['amount'].to_numpy(np.float64) if 'amount' in df else np.full(len(df), np.nan)
+        amount = np.where(np.isnan(amount), (high + low + close) / 3 * volume * LOT_SHARES, amount)
+
+        cum_volume = _group_cumsum(volume, starts, lengths)
+        cum_amount = _group_cumsum(amount, starts, lengths)
+        # 新K线所在的第一天可能已有缓存数据，接上当天已有的累计值
+        if continues:
+            first = slice(0, lengths[0])
+            cum_volume[first] += bars['cum_volume'].iat[-1]
+            cum_amount[first] += bars['cum_amount'].iat[-1]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            vwap = np.where(cum_volume > 0, cum_amount / (cum_volume * LOT_SHARES), close)
+
+        new_bars = pd.DataFrame({
+            'open': df['open'].to_numpy(np.float64), 'high': high, 'low': low, 'close': close, 'volume': volume,
+            'amount': amount, 'cum_volume': cum_volume, 'cum_amount': cum_amount, 'vwap': vwap,
+        }, index=df.index)
+        bars = new_bars if bars is None or not len(bars) else pd.concat([bars, new_bars])
+        keep_days = np.unique(bars.index.values.astype('datetime64[D]'))[-self.max_days:]
+        bars = bars[bars.index.values.astype('datetime64[D]') >= keep_days[0]]
+        self._bars[code] = bars
+        self._bars.move_to_end(code)
+        self._sessions[code] = self._merge_sessions(code, bars, days[0])
+        while len(self._bars) > self.max_codes:
+            evicted, _ = self._bars.popitem(last=False)
+            self._sessions.pop(evicted, None)
+        return len(new_bars) - replaced
+
+    def _drop_from(self, code: str, day: pd.Timestamp) -> Optional[pd.DataFrame]:
+        """删除 day 及之后的缓存K线和日统计，返回剩下的K线（没有剩余时为None）"""
+        bars = self._bars[code]
+        bars = bars[bars.index < day]
+        if not len(bars):
+            del self._bars[code]
+            self._sessions.pop(code, None)
+            return None
+        self._bars[code] = bars
+        sessions = self._sessions.get(code)
+        if sessions is not None:
+            self._sessions[code] = sessions[sessions.index < day]
+        return bars
+
+    def _merge_sessions(self, code: str, bars: pd.DataFrame, first_day: np.datetime64) -> pd.DataFrame:
+        """
+        重新汇总 first_day 及之后各交易日的统计，替换已有的日统计中对应的部分
+
+        first_day 当天已缓存的K线一并参与汇总（最多一天的数据），被替换的最后一根K线不会残留在高低点、成交量中。
+        """
+        all_days = bars.index.values.astype('datetime64[D]')
+        new_bars = bars[all_days >= first_day]
+        times = new_bars.index.values
+        days = times.astype('datetime64[D]')
+        starts, _ = _groups(days)
+        minutes = (times - days.astype(times.dtype)) // np.timedelta64(1, 'm')
+        open_minute = SESSION_OPEN.hour * 60 + SESSION_OPEN.minute
+        in_range = minutes <= open_minute + self.opening_range
+        high = new_bars['high'].to_numpy()
+        low = new_bars['low'].to_numpy()
+        ends = np.append(starts[1:], len(times)) - 1
+
+        chunk = pd.DataFrame({
+            'open': new_bars['open'].to_numpy()[starts],
+            'high': np.maximum.reduceat(high, starts),
+            'low': np.minimum.reduceat(low, starts),
+            'close': new_bars['close'].to_numpy()[ends],
+            'volume': np.add.reduceat(new_bars['volume'].to_numpy(), starts),
+            'cum_amount': new_bars['cum_amount'].to_numpy()[ends],
+            'range_high': np.maximum.reduceat(np.where(in_range, high, -np.inf), starts),
+            'range_low': np.minimum.reduceat(np.where(in_range, low, np.inf), starts),
+            'bars': np.diff(np.append(starts, len(times))),
+        }, index=pd.DatetimeIndex(days[starts], name='day'))
+
+        sessions = self._sessions.get(code)
+        if sessions is not None:
+            sessions = sessions[sessions.index < chunk.index[0]]
+        sessions = chunk if sessions is None else pd.concat([sessions, chunk])
+        return sessions.iloc[-self.max_days:]
+
+    def sessions(self, code: str, days: Optional[int] = None) -> List[Dict]:
+        """最近 days 个交易日的日内统计"""
+        sessions = self._sessions.get(code)
+        if sessions is None:
+            return []
+        sessions = sessions.iloc[-days:] if days else sessions
+        vwap = (sessions['cum_amount'] / (sessions['volume'] * LOT_SHARES)).where(sessions['volume'] > 0,
+                                                                                  sessions['close'])
+        range_high = sessions['range_high'].where(np.isfinite(sessions['range_high']))
+        range_low = sessions['range_low'].where(np.isfinite(sessions['range_low']))
+        position = np.select([sessions['close'] > range_high, sessions['close'] < range_low],
+                             ['above', 'below'], 'inside')
+        out = pd.DataFrame({
+            'day': sessions.index.strftime('%Y-%m-%d'),
+            'open': sessions['open'], 'high': sessions['high'], 'low': sessions['low'], 'close': sessions['close'],
+            'volume': sessions['volume'].round(4), 'vwap': np.round(vwap, 4),
+            'range_high': range_high, 'range_low': range_low,
+            'range_width_pct': np.round((range_high - range_low) / range_low * 100, 3),
+            'close_vs_range': position, 'bars': sessions['bars'],
+        })
+        return out.replace({np.nan: None}).to_dict(orient='records')
+
+    def bars(self, code: str, count: Optional[int] = None) -> List[Dict]:
+        """最近 count 根分钟线及其当日累计成交量、VWAP"""
+        bars = self._bars.get(code)
+        if bars is None:
+            return []
+        bars = bars.iloc[-count:] if count else bars
+        out = bars[['open', 'high', 'low', 'close', 'volume']].copy()
+        out['cum_volume'] = bars['cum_volume'].round(4)
+        out['vwap'] = bars['vwap'].round(4)
+        out.insert(0, 'time', bars.index.strftime('%Y-%m-%d %H:%M'))
+        return out.to_dict(orient='records')
+
+    def volume_profile(self, code: str) -> List[List]:
+        """已完成交易日（不含最新一天）每个时刻累计成交量占全天比例的均值，[[HH:MM, 比例], ...]"""
+        bars = self._bars.get(code)
+        if bars is None:
+            return []
+        times = bars.index.values
+        days = times.astype('datetime64[D]')
+        completed = days < days[-1]
+        if not completed.any():
+            return []
+        times, days = times[completed], days[completed]
+        starts, lengths = _groups(days)
+        totals = np.repeat(np.add.reduceat(bars['volume'].to_numpy()[completed], starts), lengths)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            fraction = np.where(totals > 0, bars['cum_volume'].to_numpy()[completed] / totals, 0.0)
+        minutes = ((times - days.astype(times.dtype)) // np.timedelta64(1, 'm')).astype(np.int64)
+        slots, inverse = np.unique(minutes, return_inverse=True)
+        mean = np.bincount(inverse, weights=fraction) / np.bincount(inverse)
+        return [[f'{m // 60:02d}:{m % 60:02d}', round(float(v), 4)] for m, v in zip(slots, mean)]
+
+
+_aggregators: Dict[int, IntradayAggregator] = {}
+
+
+def get_aggregator(opening_range: int = 30) -> IntradayAggregator:
+    """每种开盘区间长度对应一个全局缓存"""
+    if opening_range not in _aggregators:
+        _aggregators[opening_range] = IntradayAggregator(opening_range)
+    return _aggregators[opening_range]
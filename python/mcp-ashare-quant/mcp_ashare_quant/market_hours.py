@@ -0,0 +1,99 @@
+"""
+A股交易时段工具
+
+提供交易时段判断与下一次刷新时间的计算，供行情缓存和预热调度器使用。
+注意：只按工作日判断，不包含法定节假日休市。
+"""
+import datetime
+from typing import Optional
+from zoneinfo import ZoneInfo
+
+SHANGHAI_TZ = ZoneInfo("Asia/Shanghai")
+
+# 连续竞价时段（上午、下午）
+TRADING_SESSIONS = (
+    (datetime.time(9, 30), datetime.time(11, 30)),
+    (datetime.time(13, 0), datetime.time(15, 0)),
+)
+
+PREOPEN_LEAD = datetime.timedelta(minutes=4)  # 开盘前提前预热（9:26集合竞价结果已出）
+CLOSE_SETTLE = datetime.timedelta(seconds=30)  # 收盘后再刷新一次，拿到最终收盘价
+
+
+def now_shanghai() -> datetime.datetime:
+    """返回北京时间的当前时刻"""
+    return datetime.datetime.now(SHANGHAI_TZ)
+
+
+def _session_windows(day: datetime.date):
+    """返回某一天各交易时段的 (预热开始, 收盘结算) 时间窗口"""
+    if day.weekday() >= 5:  # 周末休市
+        return []
+    windows = []
+    for start, end in TRADING_SESSIONS:
+        s = datetime.datetime.combine(day, start, tzinfo=SHANGHAI_TZ)
+        e = datetime.datetime.combine(day, end, tzinfo=SHANGHAI_TZ)
+        windows.append((s - PREOPEN_LEAD, e + CLOSE_SETTLE))
+    return windows
+
+
+def is_trading_time(now: Optional[datetime.datetime] = None) -> bool:
+    """判断当前是否处于交易时段（含开盘前预热和收盘后结算窗口）"""
+    now = (now or now_shanghai()).astimezone(SHANGHAI_TZ)
+    return any(s <= now < e for s, e in _session_windows(now.date()))
+
+
+def seconds_until_next_window(now: Optional[datetime.datetime] = None) -> float:
+    """距离下一个交易时段窗口开始的秒数，当前已在窗口内则返回0"""
+    now = (now or now_shanghai()).astimezone(SHANGHAI_TZ)
+    for offset in range(8):
+        day = now.date() + datetime.timedelta(days=offset)
+        for s, e in _session_windows(day):
+            if s <= now < e:
+                return 0.0
+            if s > now:
+                return (s - now).total_seconds()
+    return 24 * 3600.0  # 理论上不会走到这里
+
+
+def next_refresh_delay(interval: float, now: Optional[datetime.datetime] = None) -> float:
+    """
+    计算下一次刷新前需要等待的秒数
+
+    交易时段内按 interval 刷新，且保证在收盘结算点再刷新一次；
+    非交易时段则一直等到下一个时段的开盘前预热点。
+    """
+    now = (now or now_shanghai()).astimezone(SHANGHAI_TZ)
+    for s, e in _session_windows(now.date()):
+        if s <= now < e:
+            return max(1.0, min(interval, (e - now).total_seconds()))
+    return max(1.0, seconds_until_next_window(now))
+
+
+def cache_ttl(interval: float, now: Optional[datetime.datetime] = None) -> float:
+    """
+    缓存有效期：交易时段内为 interval，非交易时段行情不再变化，
+    一直有效到下一个时段开盘前预热点
+    """
+    now = (now or now_shanghai()).astimezone(SHANGHAI_TZ)
+    if is_trading_time(now):
+        return interval
+    return max(interval, seconds_until_next_window(now))
+
+
+def session_closed(day: datetime.date, now: Optional[datetime.datetime] = None) -> bool:
+    """某个交易日是否已收盘结算（当天的日线不会再变化）"""
+    now = (now or now_shanghai()).astimezone(SHANGHAI_TZ)
+    close = datetime.datetime.combine(day, TRADING_SESSIONS[-1][1], tzinfo=SHANGHAI_TZ) + CLOSE_SETTLE
+    return now >= close
+
+
+def latest_session(now: Optional[datetime.datetime] = None) -> datetime.date:
+    """最近一个已经开盘的交易日（当天开盘前则为上一个工作日）"""
+    now = (now or now_shanghai()).astimezone(SHANGHAI_TZ)
+    day = now.date()
+    if now.time() < TRADING_SESSIONS[0][0]:
+        day -= datetime.timedelta(days=1)
+    while day.weekday() >= 5:
+        day -= datetime.timedelta(days=1)
+    return day
@@ -0,0 +1,184 @@
+"""
+运行指标
+
+为每个MCP工具记录分阶段耗时（p50/p95/p99）以及缓存命中、数据源回退、下载字节数等计数，
+通过 get_metrics 工具查看；设置环境变量 ASHARE_METRICS_PORT 后还会在该端口提供
+Prometheus 文本格式的 /metrics 接口。
+
+用法:
+    @instrument_tool
+    async def get_stock_data(...):
+        with span('fetch'):
+            ...
+    inc('cache_hits_total', cache='bars')
+"""
+import contextvars
+import functools
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 耗时直方图的桶边界（秒）
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+QUANTILES = (0.5, 0.95, 0.99)
+RESERVOIR_SIZE = 2048  # 分位数按最近N次样本计算
+
+_current_tool = contextvars.ContextVar('current_tool', default='background')
+
+
+class Histogram:
+    """耗时分布：累计桶用于Prometheus，最近样本用于计算分位数"""
+
+    def __init__(self):
+        self.buckets = [0] * len(BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+        self.samples = deque(maxlen=RESERVOIR_SIZE)
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.sum += value
+        self.samples.append(value)
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.buckets[i] += 1
+
+    def quantile(self, q: float) -> float:
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def summary(self) -> Dict:
+        result = {'count': self.count, 'sum_ms': round(self.sum * 1000, 3)}
+        for q in QUANTILES:
+            result[f'p{int(q * 100)}_ms'] = round(self.quantile(q) * 1000, 3)
+        return result
+
+
+class Metrics:
+    """进程内指标注册表（线程安全，阻塞请求在线程池中执行时同样可以记录）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms: Dict[Tuple[str, str], Histogram] = {}
+        self._counters: Dict[Tuple[str, Tuple], float] = {}
+
+    def observe(self, tool: str, stage: str, seconds: float) -> None:
+        with self._lock:
+            histogram = self._histograms.get((tool, stage))
+            if histogram is None:
+                histogram = self._histograms[(tool, stage)] = Histogram()
+            histogram.observe(seconds)
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def reset(self) -> None:
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+    def snapshot(self) -> Dict:
+        """get_metrics 工具返回的结构：{'latency': {工具: {阶段: 分位数}}, 'counters': {...}}"""
+        with self._lock:
+            latency: Dict[str, Dict] = {}
+            for (tool, stage), histogram in sorted(self._histograms.items()):
+                latency.setdefault(tool, {})[stage] = histogram.summary()
+            counters: Dict[str, Dict] = {}
+            for (name, labels), value in sorted(self._counters.items()):
+                label_text = ','.join(f'{k}={v}' for k, v in labels) or 'total'
+                counters.setdefault(name, {})[label_text] = value
+        return {'latency': latency, 'counters': counters}
+
+    def prometheus(self) -> str:
+        """Prometheus 文本格式"""
+        lines = []
+        with self._lock:
+            if self._histograms:
+                lines.append('# TYPE ashare_stage_seconds histogram')
+            for (tool, stage), histogram in sorted(self._histograms.items()):
+                labels = f'tool="{tool}",stage="{stage}"'
+                for bound, count in zip(BUCKETS, histogram.buckets):
+                    lines.append(f'ashare_stage_seconds_bucket{{{labels},le="{bound}"}} {count}')
+                lines.append(f'ashare_stage_seconds_bucket{{{labels},le="+Inf"}} {histogram.count}')
+                lines.append(f'ashare_stage_seconds_sum{{{labels}}} {histogram.sum}')
+                lines.append(f'ashare_stage_seconds_count{{{labels}}} {histogram.count}')
+            seen = set()
+            for (name, labels), value in sorted(self._counters.items()):
+                if name not in seen:
+                    lines.append(f'# TYPE ashare_{name} counter')
+                    seen.add(name)
+                label_text = ','.join(f'{k}="{v}"' for k, v in labels)
+                lines.append(f'ashare_{name}{{{label_text}}} {value}' if label_text else f'ashare_{name} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
+
+
+@contextmanager
+def span(stage: str, tool: Optional[str] = None):
+    """记录一个阶段的耗时，归属到当前正在执行的工具"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.observe(tool or _current_tool.get(), stage, time.perf_counter() - start)
+
+
+def inc(name: str, value: float = 1, **labels) -> None:
+    metrics.inc(name, value, **labels)
+
+
+def instrument_tool(func):
+    """工具函数装饰器：记录总耗时与调用次数，并让内部的 span 归属到该工具"""
+    name = func.__name__
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        token = _current_tool.set(name)
+        inc('tool_calls_total', tool=name)
+        try:
+            with span('total', tool=name):
+                return await func(*args, **kwargs)
+        finally:
+            _current_tool.reset(token)
+
+    return wrapper
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = metrics.prometheus().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):  # 不向stderr打印访问日志
+        pass
+
+
+def start_metrics_server(port: Optional[int] = None) -> Optional[ThreadingHTTPServer]:
+    """按 ASHARE_METRICS_PORT 在后台线程启动 /metrics 接口，未配置时返回None"""
+    port = port or int(os.getenv('ASHARE_METRICS_PORT', '0'))
+    if not port:
+        return None
+    httpd = ThreadingHTTPServer((os.getenv('ASHARE_METRICS_HOST', '127.0.0.1'), port), _MetricsHandler)
+    threading.Thread(target=httpd.serve_forever, name='ashare-metrics', daemon=True).start()
+    logger.info(f"Prometheus 指标接口已启动: http://{httpd.server_address[0]}:{port}/metrics")
+    return httpd
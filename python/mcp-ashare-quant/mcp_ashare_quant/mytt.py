@@ -68,7 +68,7 @@ def EXIST(S_BOOL, N=5):                # EXIST(CLOSE>3010, N=5)  n日内是否
 
 def BARSLAST(S_BOOL):                  #上一次条件成立到当前的周期  
     M=np.argwhere(S_BOOL);             # BARSLAST(CLOSE/REF(CLOSE)>=1.1) 上一次涨停到今天的天数
-    return len(S_BOOL)-int(M[-1])-1  if M.size>0 else -1
+    return len(S_BOOL)-int(M[-1,0])-1  if M.size>0 else -1
 
 def FORCAST(S,N):                      #返S序列N周期回线性回归后的预测值
     K,Y=SLOPE(S,N,RS=True)
@@ -0,0 +1,107 @@
+"""
+行情接口响应解析
+
+把新浪/腾讯K线接口返回的原始JSON直接解码成带类型的NumPy列，
+再一次性构造DataFrame，避免逐列 astype 和链式赋值。
+安装了 orjson 时优先使用 orjson 解码，否则退回标准库 json。
+"""
+import json
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+try:
+    import orjson
+
+    def loads(raw):
+        return orjson.loads(raw)
+except ImportError:  # orjson 为可选依赖
+    orjson = None
+
+    def loads(raw):
+        return json.loads(raw)
+
+OHLCV = ['open', 'high', 'low', 'close', 'volume']
+
+
+def _float_column(values: Sequence, dtype) -> np.ndarray:
+    """字符串/数字序列一次性转换成指定精度的浮点数组"""
+    return np.array(values, dtype=np.float64).astype(dtype, copy=False)
+
+
+def _datetime_index(values, fmt: Optional[str] = None) -> pd.DatetimeIndex:
+    """构造名为空字符串的 datetime64 索引（与原来的 df.index.name = '' 保持一致）"""
+    if fmt is None:
+        times = np.array(values, dtype='datetime64[s]')
+    else:
+        times = pd.to_datetime(values, format=fmt).values
+    return pd.DatetimeIndex(times.astype('datetime64[ns]'), name='')
+
+
+def build_frame(index: pd.DatetimeIndex, columns: Dict[str, np.ndarray]) -> pd.DataFrame:
+    """由已经带类型的列构造DataFrame，不再做额外的类型转换"""
+    return pd.DataFrame(columns, index=index, copy=False)
+
+
+def parse_sina_kline(raw: bytes, price_dtype=np.float64) -> pd.DataFrame:
+    """
+    解析新浪 CN_MarketData.getKLineData 响应
+
+    返回以日期为索引的OHLCV，并保留原始的 date 字符串列，
+    get_stock_data 输出的记录格式不变。
+    """
+    rows: List[dict] = loads(raw) or []
+    days = [row['day'] for row in rows]
+    columns = {name: _float_column([row[name] for row in rows], price_dtype) for name in OHLCV[:4]}
+    columns['volume'] = _float_column([row['volume'] for row in rows], np.float64)
+    columns['date'] = np.array(days, dtype=object)
+    return build_frame(_datetime_index(days), columns)
+
+
+def _tx_amount(values: Sequence) -> np.ndarray:
+    """腾讯分钟线的成交额（万元）转换为元，缺失或为空串时为 NaN"""
+    amount = pd.to_numeric(np.array(values, dtype=object), errors='coerce')
+    return np.asarray(amount, dtype=np.float64) * 10000
+
+
+def _tx_columns(buf: List[list], price_dtype, amount: bool = False):
+    """
+    腾讯K线每行为 [time, open, close, high, low, volume, {...}, amount]，取前6列并转置
+
+    amount 为 True 时（分钟线）同时取第8列成交额，输出为以元为单位的 amount 列；成交量的单位是手。
+    """
+    if not buf:
+        columns = {name: np.empty(0, dtype=price_dtype) for name in OHLCV}
+        if amount:
+            columns['amount'] = np.empty(0, dtype=np.float64)
+        return [], columns
+    times, opens, closes, highs, lows, volumes = zip(*(row[:6] for row in buf))
+    columns = {
+        'open': _float_column(opens, price_dtype),
+        'close': _float_column(closes, price_dtype),
+        'high': _float_column(highs, price_dtype),
+        'low': _float_column(lows, price_dtype),
+        'volume': _float_column(volumes, np.float64),
+    }
+    if amount:
+        columns['amount'] = _tx_amount([row[7] if len(row) > 7 else None for row in buf])
+    return times, columns
+
+
+def parse_tx_day(raw: bytes, code: str, unit: str, price_dtype=np.float64) -> pd.DataFrame:
+    """解析腾讯 fqkline 日/周/月线响应"""
+    stk = loads(raw)['data'][code]
+    ms = 'qfq' + unit
+    buf = stk[ms] if ms in stk else stk[unit]  # 指数返回不是qfqday,是day
+    times, columns = _tx_columns(buf, price_dtype)
+    return build_frame(_datetime_index(list(times)), columns)
+
+
+def parse_tx_min(raw: bytes, code: str, ts: int, price_dtype=np.float64) -> pd.DataFrame:
+    """解析腾讯 mkline 分钟线响应，最后一根K线的收盘价用实时报价 qt 修正；带成交额 amount 列（元）"""
+    data = loads(raw)['data'][code]
+    times, columns = _tx_columns(data['m' + str(ts)], price_dtype, amount=True)
+    if len(times):
+        columns['close'][-1] = float(data['qt'][code][3])  # 最新基金数据是3位的
+    return build_frame(_datetime_index(list(times), fmt='%Y%m%d%H%M'), columns)
@@ -0,0 +1,117 @@
+"""
+自选股预热调度器
+
+在服务进程内按交易时段定时刷新自选股K线和全市场快照，
+使 get_stock_data 和 recommend_a_shares 开盘后的第一次请求也能命中缓存。
+
+通过环境变量配置：
+    ASHARE_WATCHLIST              自选股代码，逗号分隔，如 "sh600519,sz000858"
+    ASHARE_WATCHLIST_FREQUENCIES  刷新的K线周期及间隔秒数，如 "1d,1m:30"，默认 "1d"
+    ASHARE_PREFETCH_COUNT         每次预热的K线条数，默认 120
+    ASHARE_PREFETCH_SNAPSHOT      是否预热全市场快照，默认 "1"
+    ASHARE_SNAPSHOT_INTERVAL      快照刷新间隔秒数，默认 60
+    ASHARE_PREFETCH_CONCURRENCY   同时进行的请求数，默认 4
+"""
+import asyncio
+import logging
+import os
+from typing import Dict, List, Optional
+
+from .cache import refresh_market_snapshot, refresh_price
+from .market_hours import cache_ttl, next_refresh_delay
+
+logger = logging.getLogger(__name__)
+
+# 各周期默认的交易时段内刷新间隔（秒）
+DEFAULT_INTERVALS = {'1m': 60, '5m': 120, '15m': 300, '30m': 300, '60m': 300, '1d': 300, '1w': 1800, '1M': 3600}
+
+
+def parse_frequencies(value: str) -> Dict[str, float]:
+    """解析 "1d,1m:30" 形式的周期配置，返回 {周期: 刷新间隔秒数}"""
+    frequencies = {}
+    for item in filter(None, (part.strip() for part in value.split(','))):
+        frequency, _, interval = item.partition(':')
+        if frequency not in DEFAULT_INTERVALS:
+            raise ValueError(f"不支持的预热周期: {frequency}")
+        frequencies[frequency] = float(interval) if interval else DEFAULT_INTERVALS[frequency]
+    return frequencies
+
+
+class WatchlistPrefetcher:
+    """按交易时段定时刷新自选股K线与全市场快照的后台任务"""
+
+    def __init__(
+            self,
+            watchlist: List[str],
+            frequencies: Dict[str, float],
+            count: int = 120,
+            snapshot_interval: Optional[float] = 60,
+            concurrency: int = 4
+    ):
+        self.watchlist = watchlist
+        self.frequencies = frequencies
+        self.count = count
+        self.snapshot_interval = snapshot_interval
+        self.concurrency = concurrency
+        self._tasks: List[asyncio.Task] = []
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    @classmethod
+    def from_env(cls) -> Optional["WatchlistPrefetcher"]:
+        """从环境变量创建调度器，未配置自选股时返回None"""
+        watchlist = [code.strip() for code in os.getenv('ASHARE_WATCHLIST', '').split(',') if code.strip()]
+        if not watchlist:
+            return None
+        snapshot_enabled = os.getenv('ASHARE_PREFETCH_SNAPSHOT', '1').lower() not in ('0', 'false', 'no')
+        return cls(
+            watchlist=watchlist,
+            frequencies=parse_frequencies(os.getenv('ASHARE_WATCHLIST_FREQUENCIES', '1d')),
+            count=int(os.getenv('ASHARE_PREFETCH_COUNT', '120')),
+            snapshot_interval=float(os.getenv('ASHARE_SNAPSHOT_INTERVAL', '60')) if snapshot_enabled else None,
+            concurrency=int(os.getenv('ASHARE_PREFETCH_CONCURRENCY', '4')),
+        )
+
+    def start(self) -> None:
+        """在当前事件循环中启动所有刷新任务"""
+        if self._tasks:
+            return
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        for frequency, interval in self.frequencies.items():
+            self._tasks.append(asyncio.create_task(self._bars_loop(frequency, interval)))
+        if self.snapshot_interval:
+            self._tasks.append(asyncio.create_task(self._snapshot_loop(self.snapshot_interval)))
+        logger.info(f"预热调度器已启动: 自选股{len(self.watchlist)}只, 周期{list(self.frequencies)}")
+
+    async def stop(self) -> None:
+        """取消所有刷新任务并等待其退出"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+
+    async def _refresh_one(self, code: str, frequency: str, ttl: float) -> None:
+        async with self._semaphore:
+            try:
+                await asyncio.to_thread(refresh_price, code, frequency=frequency, count=self.count, ttl=ttl)
+            except Exception as e:
+                logger.warning(f"预热K线失败 {code} {frequency}: {e}")
+
+    async def _bars_loop(self, frequency: str, interval: float) -> None:
+        while True:
+            delay = next_refresh_delay(interval)
+            # 缓存需要撑到下一次刷新完成，多留一个间隔的余量
+            ttl = max(delay, cache_ttl(interval)) + interval
+            await asyncio.gather(*(self._refresh_one(code, frequency, ttl) for code in self.watchlist))
+            logger.info(f"已预热 {len(self.watchlist)} 只股票的 {frequency} K线，{delay:.0f}秒后再次刷新")
+            await asyncio.sleep(next_refresh_delay(interval))
+
+    async def _snapshot_loop(self, interval: float) -> None:
+        while True:
+            delay = next_refresh_delay(interval)
+            ttl = max(delay, cache_ttl(interval)) + interval
+            async with self._semaphore:
+                try:
+                    await asyncio.to_thread(refresh_market_snapshot, ttl)
+                except Exception as e:
+                    logger.warning(f"预热全市场快照失败: {e}")
+            await asyncio.sleep(next_refresh_delay(interval))
@@ -4,6 +4,7 @@ import pandas as pd
 from datetime import datetime
 import time
 import random
+from .metrics import inc, span
 
 
 def get_stock_data():
@@ -30,7 +31,9 @@ def get_stock_data():
     }
 
     try:
-        response = requests.get(url, params=params, headers=headers, timeout=10)
+        with span('http'):
+            response = requests.get(url, params=params, headers=headers, timeout=10)
+        inc('bytes_downloaded_total', len(response.content), source='eastmoney')
 
         print(f"API响应状态码: {response.status_code}", file=sys.stderr)
 
@@ -38,7 +41,8 @@ def get_stock_data():
             print(f"API请求失败，状态码: {response.status_code}", file=sys.stderr)
             return []
 
-        json_data = response.json()
+        with span('parse'):
+            json_data = response.json()
 
         print(f"API返回的数据类型: {type(json_data)}", file=sys.stderr)
         print(f"API返回的数据键: {json_data.keys()}", file=sys.stderr)
@@ -140,9 +144,10 @@ def filter_and_rank_stocks(stocks, criteria):
     return ranked_stocks
 
 
-def recommend_stocks(limit=10):
-    """推荐股票"""
-    stock_data = get_stock_data()
+def recommend_stocks(limit=10, stock_data=None):
+    """推荐股票，可传入已获取的全市场快照以避免重复下载"""
+    if stock_data is None:
+        stock_data = get_stock_data()
 
     if not stock_data:
         print("无法获取股票数据，请检查网络连接或尝试稍后再试", file=sys.stderr)
@@ -2,12 +2,21 @@ import os
 import platform
 import json
 import logging
-import matplotlib.pyplot as plt
-from typing import List, Dict, Optional, Annotated, Literal
+from typing import List, Dict, Optional, Annotated, Literal, Union
 from mcp.server.fastmcp import FastMCP
 from .ashare import get_price
 from .mytt import *
 from .recommend import recommend_stocks, filter_and_rank_stocks
+from .cache import load_price, load_market_snapshot
+from .prefetch import WatchlistPrefetcher
+from .metrics import instrument_tool, metrics, span, start_metrics_server
+from .executor import tool_executor
+from .backfill import backfill_job, market_code
+from .correlation import load_daily_bars, pack_bars
+from .bar_store import BarStore
+from .bars import SharedBars
+from .intraday import SESSION_BARS, get_aggregator
+from .tasks import compute_correlation, compute_correlation_shared, compute_cross, compute_indicators, render_kline
 import requests
 import re
 import sys
@@ -107,6 +116,7 @@ def get_os_type() -> str:
 # ======================
 
 @mcp.tool()
+@instrument_tool
 async def recommend_a_shares(
         limit: int = 10,
         min_price: float = 1,
@@ -142,8 +152,11 @@ async def recommend_a_shares(
     }
 
     try:
-        stock_data = recommend_stocks(limit)
-        ranked_stocks = filter_and_rank_stocks(stock_data, criteria)
+        with span('snapshot'):
+            snapshot = await load_market_snapshot()
+        with span('rank'):
+            stock_data = recommend_stocks(limit, stock_data=snapshot)
+            ranked_stocks = filter_and_rank_stocks(stock_data, criteria)
 
         recommendations = []
         for stock in ranked_stocks[:limit]:
@@ -178,6 +191,7 @@ async def recommend_a_shares(
 
 
 @mcp.tool()
+@instrument_tool
 async def get_stock_data(
         code: object,
         frequency: str = '1d',
@@ -200,6 +214,7 @@ async def get_stock_data(
             - low: 最低价
             - close: 收盘价
             - volume: 成交量（如果可用）
+            - amount: 成交额，单位元（仅1分钟线）
 
     Raises:
         ValueError: 如果输入参数无效
@@ -221,19 +236,21 @@ async def get_stock_data(
             raise ValueError("结束日期格式不正确，应为YYYY-MM-DD")
 
         # 股票名称到代码的映射
-        try:
-            with open('stock_mapping.json', 'r', encoding='utf-8') as f:
-                STOCK_NAME_MAP = json.load(f)
-        except Exception as e:
-            logger.warning(f"加载股票映射文件失败: {e}")
-            STOCK_NAME_MAP = {}
+        with span('load_mapping'):
+            try:
+                with open('stock_mapping.json', 'r', encoding='utf-8') as f:
+                    STOCK_NAME_MAP = json.load(f)
+            except Exception as e:
+                logger.warning(f"加载股票映射文件失败: {e}")
+                STOCK_NAME_MAP = {}
 
         # 如果是中文名称，转换为股票代码
         if code in STOCK_NAME_MAP:
             code = STOCK_NAME_MAP[code]
         else:
             # 本地映射找不到，尝试通过API查询
-            stock_code = get_stock_code_by_name(code)
+            with span('resolve_symbol'):
+                stock_code = get_stock_code_by_name(code)
             if stock_code:
                 code = stock_code
             else:
@@ -249,7 +266,8 @@ async def get_stock_data(
         }
 
         logger.info(f"获取股票数据，参数: {params}")
-        df = get_price(**params)
+        with span('fetch'):
+            df = await load_price(**params)
 
         # 添加类型检查
         if not hasattr(df, 'to_dict'):
@@ -257,7 +275,8 @@ async def get_stock_data(
             return {"error": "数据格式错误", "details": "API返回的数据格式不符合预期"}
 
         # 转换数据格式
-        data = df.to_dict(orient='records')
+        with span('to_dict'):
+            data = df.to_dict(orient='records')
         logger.info(f"成功获取{len(data)}条股票数据")
         return data
 
@@ -270,36 +289,33 @@ async def get_stock_data(
 
 
 @mcp.tool()
+@instrument_tool
 async def calculate_technical_indicators(
         data: List[Dict],
-        indicators: List[str]
+        indicators: List[str],
+        precision: Optional[int] = 3,
+        last_k: Optional[int] = None,
+        nan_mode: str = 'offset'
 ) -> Dict:
-    """计算技术指标"""
+    """
+    计算技术指标，所有指标按K线对齐成一个列块返回
+
+    Args:
+        precision: 保留的小数位数，None 表示不做四舍五入
+        last_k: 只返回最后K根K线的值
+        nan_mode: 预热期NaN的处理方式，offset/trim/null，详见 indicator_block
+    """
     try:
-        close = [d['close'] for d in data]
-        open = [d['open'] for d in data]
-        high = [d['high'] for d in data]
-        low = [d['low'] for d in data]
-
-        results = {}
-        for indicator in indicators:
-            if indicator == 'MA5':
-                results['MA5'] = MA(close, 5)
-            elif indicator == 'MA10':
-                results['MA10'] = MA(close, 10)
-            elif indicator == 'BOLL':
-                results['BOLL'] = BOLL(close)
-            elif indicator == 'MACD':
-                results['MACD'] = MACD(close)
-            # 添加更多指标计算...
-
-        return results
+        return await tool_executor.run(
+            'calculate_technical_indicators', compute_indicators,
+            data, indicators, precision, last_k, nan_mode, size=len(data))
     except Exception as e:
         logger.error(f"计算技术指标失败: {e}")
         return {"error": str(e)}
 
 
 @mcp.tool()
+@instrument_tool
 async def plot_kline(
         data: List[Dict],
         indicators: Optional[List[str]] = ['MA5', 'MA10'],
@@ -308,81 +324,22 @@ async def plot_kline(
 ) -> Dict:
     """绘制K线图，支持本地或网络url返回，模式由环境变量 API_RESOURCE_MODE 控制"""
     try:
-        if not data:
-            raise ValueError("数据不能为空")
-        required_fields = ['date', 'open', 'high', 'low', 'close']
-        for i, item in enumerate(data):
-            for field in required_fields:
-                if field not in item:
-                    raise ValueError(f"第{i + 1}条数据缺少必需字段: {field}")
-            if not isinstance(item['date'], str) or not re.match(r'\d{4}-\d{2}-\d{2}', item['date']):
-                raise ValueError(f"第{i + 1}条数据的日期格式不正确，应为YYYY-MM-DD")
-
-        plt.rcParams['font.sans-serif'] = ['Arial Unicode MS']
-        plt.rcParams['axes.unicode_minus'] = False
-
-        dates = [d['date'] for d in data]
-        opens = [d['open'] for d in data]
-        highs = [d['high'] for d in data]
-        lows = [d['low'] for d in data]
-        closes = [d['close'] for d in data]
-        volumes = [d['volume'] for d in data] if 'volume' in data[0] else None
-
-        fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(15, 10), gridspec_kw={'height_ratios': [3, 1]})
-        for i in range(len(dates)):
-            color = 'green' if closes[i] >= opens[i] else 'red'
-            ax1.plot([i, i], [lows[i], highs[i]], color=color, linewidth=1)
-            ax1.plot([i - 0.2, i + 0.2], [opens[i], opens[i]], color=color, linewidth=3)
-            ax1.plot([i - 0.2, i + 0.2], [closes[i], closes[i]], color=color, linewidth=3)
-
-        if indicators:
-            close_values = [d['close'] for d in data]
-            for indicator in indicators:
-                if indicator == 'MA5':
-                    ma5 = MA(close_values, 5)
-                    ax1.plot(range(len(ma5)), ma5, label='MA5', color='blue', linewidth=1)
-                elif indicator == 'MA10':
-                    ma10 = MA(close_values, 10)
-                    ax1.plot(range(len(ma10)), ma10, label='MA10', color='orange', linewidth=1)
-                elif indicator == 'BOLL':
-                    upper, mid, lower = BOLL(close_values)
-                    ax1.plot(range(len(upper)), upper, label='BOLL Upper', color='purple', linewidth=1)
-                    ax1.plot(range(len(mid)), mid, label='BOLL Mid', color='purple', linewidth=1)
-                    ax1.plot(range(len(lower)), lower, label='BOLL Lower', color='purple', linewidth=1)
-
-        if volumes:
-            for i in range(len(dates)):
-                color = 'green' if closes[i] >= opens[i] else 'red'
-                ax2.bar(i, volumes[i], color=color, alpha=0.5)
-
-        ax1.set_title(title)
-        ax1.set_ylabel('Price')
-        ax1.legend()
-        ax1.grid(True)
-        if volumes:
-            ax2.set_ylabel('Volume')
-            ax2.grid(True)
-        plt.xticks(range(len(dates)), dates, rotation=45)
-
         resource_mode = os.getenv('API_RESOURCE_MODE', 'url')
         if resource_mode == "file":
-            if save_path:
-                plt.savefig(save_path)
-                plt.close()
-                return {"status": "success", "path": save_path, "message": "图表已保存到本地"}
-            else:
-                plt.close()
+            if not save_path:
                 return {"status": "error", "message": "resource_mode=file 时必须提供 save_path"}
+            await tool_executor.run('plot_kline', render_kline, data, indicators, title, save_path)
+            return {"status": "success", "path": save_path, "message": "图表已保存到本地"}
         else:
             # url模式，始终上传
             tmp_filename = f"/tmp/kline_{uuid.uuid4().hex}.png"
-            plt.savefig(tmp_filename)
-            plt.close()
+            await tool_executor.run('plot_kline', render_kline, data, indicators, title, tmp_filename)
             upload_url = "https://www.mcpcn.cc/api/fileUploadAndDownload/uploadMcpFile"
-            async with httpx.AsyncClient(timeout=30) as client:
-                with open(tmp_filename, "rb") as f:
-                    files = {'file': (os.path.basename(tmp_filename), f, 'image/png')}
-                    response = await client.post(upload_url, files=files)
+            with span('upload'):
+                async with httpx.AsyncClient(timeout=30) as client:
+                    with open(tmp_filename, "rb") as f:
+                        files = {'file': (os.path.basename(tmp_filename), f, 'image/png')}
+                        response = await client.post(upload_url, files=files)
             try:
                 os.remove(tmp_filename)
             except Exception:
@@ -404,22 +361,168 @@ async def plot_kline(
 
 
 @mcp.tool()
+@instrument_tool
 async def analyze_cross(
         data1: List[float],
         data2: List[float]
 ) -> Dict:
     """分析两条线的交叉情况"""
     try:
-        cross_result = CROSS(data1, data2)
-        return {
-            "cross_today": RET(cross_result),
-            "cross_history": cross_result.tolist()
-        }
+        return await tool_executor.run('analyze_cross', compute_cross, data1, data2, size=len(data1))
     except Exception as e:
         logger.error(f"分析交叉情况失败: {e}")
         return {"error": str(e)}
 
 
+@mcp.tool()
+@instrument_tool
+async def get_intraday_stats(
+        code: str,
+        count: int = 800,
+        opening_range: int = 30,
+        days: int = 5,
+        include_bars: int = 0
+) -> Dict:
+    """基于1分钟K线的日内统计：VWAP、当日高低点、开盘区间、累计成交量分布
+
+    Args:
+        code (str): 股票代码，如 "sh600519"
+        count (int, optional): 获取的1分钟K线条数. Defaults to 800.
+        opening_range (int, optional): 开盘区间的分钟数. Defaults to 30.
+        days (int, optional): 返回最近多少个交易日的统计. Defaults to 5.
+        include_bars (int, optional): 同时返回最近多少根分钟线（含累计成交量与VWAP），0 表示不返回. Defaults to 0.
+    """
+    try:
+        code = market_code(code)
+        with span('fetch'):
+            df = await load_price(code, frequency='1m', count=count)
+            aggregator = get_aggregator(opening_range)
+            if aggregator.has_gap(code, df):
+                # 缓存的当天K线与新数据之间缺了K线，多取一个交易日的量，让这一天从开盘起完整重建
+                df = await load_price(code, frequency='1m', count=len(df) + SESSION_BARS)
+        with span('aggregate'):
+            added = aggregator.update(code, df)
+            result = {
+                "code": code,
+                "new_bars": added,
+                "sessions": aggregator.sessions(code, days),
+                "volume_profile": aggregator.volume_profile(code),
+            }
+            if include_bars:
+                result["bars"] = aggregator.bars(code, include_bars)
+        return result
+    except Exception as e:
+        logger.error(f"日内统计失败: {e}", exc_info=True)
+        return {"error": str(e), "type": "runtime_error"}
+
+
+@mcp.tool()
+@instrument_tool
+async def analyze_correlation(
+        symbols: Optional[List[str]] = None,
+        count: int = 250,
+        method: str = 'correlation',
+        window: Optional[int] = None,
+        step: int = 20,
+        top_k: Optional[int] = 5,
+        include_matrix: Optional[bool] = None,
+        precision: int = 4
+) -> Dict:
+    """计算多只股票日收益率的相关系数或协方差矩阵
+
+    Args:
+        symbols (List[str], optional): 股票代码列表，为空时使用本地K线库中的全部股票. Defaults to None.
+        count (int, optional): 使用最近多少个交易日的收益率. Defaults to 250.
+        method (str, optional): 'correlation' 相关系数，'covariance' 协方差. Defaults to 'correlation'.
+        window (int, optional): 滚动窗口长度，给出时矩阵按最后一个窗口计算，并返回各窗口的平均相关系数. Defaults to None.
+        step (int, optional): 滚动窗口的步长. Defaults to 20.
+        top_k (int, optional): 返回每只股票最相关的前K只股票. Defaults to 5.
+        include_matrix (bool, optional): 是否返回完整矩阵，默认股票数不超过50时返回. Defaults to None.
+        precision (int, optional): 保留的小数位数. Defaults to 4.
+    """
+    try:
+        with span('load'):
+            if not symbols:
+                store = BarStore()
+                symbols = await asyncio.to_thread(store.codes)
+                if not symbols:
+                    raise ValueError("本地K线库为空，请指定 symbols 或先运行 backfill_daily_bars")
+                series = await load_daily_bars(symbols, count, store=store, fetch_missing=False)
+            else:
+                series = await load_daily_bars(symbols, count)
+
+        options = (method, window, step, top_k, include_matrix, precision)
+        size = sum(len(bars) for bars in series.values())
+        if size < tool_executor.inline_bars:
+            return await tool_executor.run('analyze_correlation', compute_correlation, series, count, *options,
+                                           size=size)
+        # 全市场的K线较大，放进共享内存，工作进程只拿到 spec 零拷贝挂载
+        packed, codes, offsets = pack_bars(series)
+        shared = SharedBars.create(packed)
+        try:
+            return await tool_executor.run('analyze_correlation', compute_correlation_shared,
+                                           shared.spec, codes, offsets, count, *options)
+        finally:
+            shared.close()
+            shared.unlink()
+    except ValueError as e:
+        logger.error(f"相关性分析参数错误: {e}")
+        return {"status": "error", "message": str(e), "type": "invalid_data"}
+    except Exception as e:
+        logger.error(f"相关性分析失败: {e}", exc_info=True)
+        return {"status": "error", "message": str(e), "type": "runtime_error"}
+
+
+@mcp.tool()
+@instrument_tool
+async def backfill_daily_bars(
+        action: str = 'start',
+        symbols: Optional[List[str]] = None,
+        count: int = 2000,
+        concurrency: int = 8,
+        rate_limit: float = 20,
+        resume: bool = True
+) -> Dict:
+    """批量回填日线到本地K线库，在后台运行，可随时查询进度或取消
+
+    Args:
+        action (str, optional): 'start' 启动，'status' 查询进度，'cancel' 取消. Defaults to 'start'.
+        symbols (List[str], optional): 只回填指定股票，为空时取全市场快照中的全部股票. Defaults to None.
+        count (int, optional): 每只股票获取的日线条数. Defaults to 2000.
+        concurrency (int, optional): 同时进行的请求数. Defaults to 8.
+        rate_limit (float, optional): 每秒最多发起的请求数，0 表示不限. Defaults to 20.
+        resume (bool, optional): 是否跳过当天已完成的股票. Defaults to True.
+    """
+    try:
+        if action == 'status':
+            return backfill_job.status()
+        if action == 'cancel':
+            return await backfill_job.cancel()
+        return backfill_job.start(symbols=symbols, count=count, concurrency=concurrency,
+                                  rate=rate_limit, resume=resume)
+    except Exception as e:
+        logger.error(f"批量回填失败: {e}", exc_info=True)
+        return {"status": "error", "message": str(e)}
+
+
+@mcp.tool()
+@instrument_tool
+async def get_metrics(
+        format: str = 'json',
+        reset: bool = False
+) -> Union[Dict, str]:
+    """获取各工具的分阶段耗时（p50/p95/p99）与缓存命中、数据源回退、下载字节数等计数
+
+    Args:
+        format (str, optional): 'json' 返回结构化数据，'prometheus' 返回Prometheus文本格式. Defaults to 'json'.
+        reset (bool, optional): 读取后是否清空已有指标. Defaults to False.
+    """
+    result = metrics.prometheus() if format == 'prometheus' else metrics.snapshot()
+    if reset:
+        metrics.reset()
+    return result
+
+
 # ========== 工具参数模型 ==========
 class RecommendASharesParams(BaseModel):
     limit: Annotated[int, Field(default=10, description="推荐股票数量")]
@@ -463,6 +566,9 @@ class GetStockDataParams(BaseModel):
 class CalculateTechnicalIndicatorsParams(BaseModel):
     data: Annotated[List[Dict], Field(description="历史K线数据列表，每项包含open/high/low/close等字段")]
     indicators: Annotated[List[str], Field(description="要计算的技术指标名称列表，如['MA5','BOLL']")]
+    precision: Annotated[Optional[int], Field(default=3, ge=0, le=10, description="保留的小数位数，为空表示不四舍五入")]
+    last_k: Annotated[Optional[int], Field(default=None, gt=0, description="只返回最后K根K线的指标值")]
+    nan_mode: Annotated[Literal['offset', 'trim', 'null'], Field(default='offset', description="预热期NaN处理: offset=各列去掉前导NaN并记录个数, trim=去掉仍在预热期的行, null=NaN输出为None")]
 
 class PlotKlineParams(BaseModel):
     data: Annotated[List[Dict], Field(description="历史K线数据列表，每项包含open/high/low/close等字段")]
@@ -474,6 +580,35 @@ class AnalyzeCrossParams(BaseModel):
     data1: Annotated[List[float], Field(description="第一条线的数据序列")]
     data2: Annotated[List[float], Field(description="第二条线的数据序列")]
 
+class GetIntradayStatsParams(BaseModel):
+    code: Annotated[str, Field(description="股票代码，如 sh600519")]
+    count: Annotated[int, Field(default=800, gt=0, description="获取的1分钟K线条数")]
+    opening_range: Annotated[int, Field(default=30, gt=0, le=240, description="开盘区间的分钟数")]
+    days: Annotated[int, Field(default=5, gt=0, description="返回最近多少个交易日的统计")]
+    include_bars: Annotated[int, Field(default=0, ge=0, description="同时返回最近多少根分钟线（含累计成交量与VWAP），0 表示不返回")]
+
+class AnalyzeCorrelationParams(BaseModel):
+    symbols: Annotated[Optional[List[str]], Field(default=None, description="股票代码列表，为空时使用本地K线库中的全部股票")]
+    count: Annotated[int, Field(default=250, ge=2, description="使用最近多少个交易日的收益率")]
+    method: Annotated[Literal['correlation', 'covariance'], Field(default='correlation', description="correlation 相关系数，covariance 协方差")]
+    window: Annotated[Optional[int], Field(default=None, ge=2, description="滚动窗口长度，给出时矩阵按最后一个窗口计算并返回各窗口平均相关系数")]
+    step: Annotated[int, Field(default=20, ge=1, description="滚动窗口步长")]
+    top_k: Annotated[Optional[int], Field(default=5, ge=0, description="返回每只股票最相关的前K只股票")]
+    include_matrix: Annotated[Optional[bool], Field(default=None, description="是否返回完整矩阵，默认股票数不超过50时返回")]
+    precision: Annotated[int, Field(default=4, ge=0, le=10, description="保留的小数位数")]
+
+class BackfillDailyBarsParams(BaseModel):
+    action: Annotated[Literal['start', 'status', 'cancel'], Field(default='start', description="start 启动回填，status 查询进度，cancel 取消")]
+    symbols: Annotated[Optional[List[str]], Field(default=None, description="只回填指定股票代码，为空时取全市场快照")]
+    count: Annotated[int, Field(default=2000, gt=0, description="每只股票获取的日线条数")]
+    concurrency: Annotated[int, Field(default=8, gt=0, description="同时进行的请求数")]
+    rate_limit: Annotated[float, Field(default=20, ge=0, description="每秒最多发起的请求数，0 表示不限")]
+    resume: Annotated[bool, Field(default=True, description="是否跳过当天已完成的股票")]
+
+class GetMetricsParams(BaseModel):
+    format: Annotated[Literal['json', 'prometheus'], Field(default='json', description="返回格式：json 或 prometheus 文本")]
+    reset: Annotated[bool, Field(default=False, description="读取后是否清空已有指标")]
+
 # ========== 新服务结构 ==========
 async def serve() -> None:
     server = Server("mcp-ashare-quant")
@@ -486,6 +621,10 @@ async def serve() -> None:
             Tool(name="calculate_technical_indicators", description="计算技术指标", inputSchema=CalculateTechnicalIndicatorsParams.model_json_schema()),
             Tool(name="plot_kline", description="绘制K线图", inputSchema=PlotKlineParams.model_json_schema()),
             Tool(name="analyze_cross", description="分析两条线的交叉情况", inputSchema=AnalyzeCrossParams.model_json_schema()),
+            Tool(name="get_intraday_stats", description="基于1分钟K线计算日内VWAP、高低点、开盘区间与成交量分布", inputSchema=GetIntradayStatsParams.model_json_schema()),
+            Tool(name="analyze_correlation", description="计算多只股票收益率的相关系数/协方差矩阵及最相关的股票", inputSchema=AnalyzeCorrelationParams.model_json_schema()),
+            Tool(name="backfill_daily_bars", description="后台批量回填全市场日线到本地K线库，支持断点续传与进度查询", inputSchema=BackfillDailyBarsParams.model_json_schema()),
+            Tool(name="get_metrics", description="获取各工具分阶段耗时与缓存/回退/下载量等运行指标", inputSchema=GetMetricsParams.model_json_schema()),
         ]
 
     @server.call_tool()
@@ -518,7 +657,10 @@ async def serve() -> None:
                 args = CalculateTechnicalIndicatorsParams(**arguments)
                 result = await calculate_technical_indicators(
                     data=args.data,
-                    indicators=args.indicators
+                    indicators=args.indicators,
+                    precision=args.precision,
+                    last_k=args.last_k,
+                    nan_mode=args.nan_mode
                 )
                 return [TextContent(type="text", text=str(result))]
             elif name == "plot_kline":
@@ -537,6 +679,44 @@ async def serve() -> None:
                     data2=args.data2
                 )
                 return [TextContent(type="text", text=str(result))]
+            elif name == "get_intraday_stats":
+                args = GetIntradayStatsParams(**arguments)
+                result = await get_intraday_stats(
+                    code=args.code,
+                    count=args.count,
+                    opening_range=args.opening_range,
+                    days=args.days,
+                    include_bars=args.include_bars
+                )
+                return [TextContent(type="text", text=str(result))]
+            elif name == "analyze_correlation":
+                args = AnalyzeCorrelationParams(**arguments)
+                result = await analyze_correlation(
+                    symbols=args.symbols,
+                    count=args.count,
+                    method=args.method,
+                    window=args.window,
+                    step=args.step,
+                    top_k=args.top_k,
+                    include_matrix=args.include_matrix,
+                    precision=args.precision
+                )
+                return [TextContent(type="text", text=str(result))]
+            elif name == "backfill_daily_bars":
+                args = BackfillDailyBarsParams(**arguments)
+                result = await backfill_daily_bars(
+                    action=args.action,
+                    symbols=args.symbols,
+                    count=args.count,
+                    concurrency=args.concurrency,
+                    rate_limit=args.rate_limit,
+                    resume=args.resume
+                )
+                return [TextContent(type="text", text=str(result))]
+            elif name == "get_metrics":
+                args = GetMetricsParams(**arguments)
+                result = await get_metrics(format=args.format, reset=args.reset)
+                return [TextContent(type="text", text=str(result))]
             else:
                 raise ValueError(f"未知的工具名称: {name}")
         except Exception as e:
@@ -551,8 +731,21 @@ async def serve() -> None:
         raise Exception("不支持的操作")
 
     options = server.create_initialization_options()
-    async with stdio_server() as (read_stream, write_stream):
-        await server.run(read_stream, write_stream, options, raise_exceptions=True)
+    metrics_server = start_metrics_server()
+    tool_executor.start()
+    prefetcher = WatchlistPrefetcher.from_env()
+    if prefetcher:
+        prefetcher.start()
+    try:
+        async with stdio_server() as (read_stream, write_stream):
+            await server.run(read_stream, write_stream, options, raise_exceptions=True)
+    finally:
+        await backfill_job.cancel()
+        if prefetcher:
+            await prefetcher.stop()
+        if metrics_server:
+            metrics_server.shutdown()
+        tool_executor.shutdown()
 
 def main():
     asyncio.run(serve())
@@ -0,0 +1,43 @@
+"""
+请求合并（single-flight）
+
+同一时刻 key 相同的多个请求只真正执行一次，其余请求等待并共享同一个结果，
+避免多个 Agent 同时查询同一只股票时重复访问行情接口。
+"""
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+from .metrics import inc
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """按 key 合并并发调用，结果（或异常）会分发给所有等待者"""
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            inc('coalesced_requests_total')
+            logger.info(f"合并进行中的请求: {key}")
+        # shield：某个调用方被取消时不影响其他等待同一结果的调用方
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+
+    async def do_in_thread(self, key: Hashable, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """同步的阻塞函数放到线程中执行，并按 key 合并"""
+        return await self.do(key, lambda: asyncio.to_thread(func, *args, **kwargs))
+
+    def __len__(self) -> int:
+        return len(self._inflight)
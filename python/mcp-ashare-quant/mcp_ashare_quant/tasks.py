@@ -0,0 +1,161 @@
+"""
+CPU密集型工具的同步实现
+
+这些函数由 executor 分发到工作进程执行，因此只依赖可序列化的参数并放在模块顶层。
+每个函数返回 (结果, 各阶段耗时秒数)，由主进程记入运行指标。
+"""
+import re
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+import matplotlib
+from matplotlib.figure import Figure
+
+from .bars import BarArray, SharedBars
+from .correlation import correlation_report, unpack_bars
+from .indicator_block import align_indicators, encode_block
+from .mytt import BOLL, CROSS, MA, MACD, RET
+
+
+class _Stages(dict):
+    """在工作进程内累计各阶段耗时"""
+
+    @contextmanager
+    def __call__(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self[stage] = self.get(stage, 0.0) + time.perf_counter() - start
+
+
+def compute_indicators(
+        data: List[Dict],
+        indicators: List[str],
+        precision: Optional[int] = 3,
+        last_k: Optional[int] = None,
+        nan_mode: str = 'offset'
+) -> Tuple[Dict, Dict]:
+    stages = _Stages()
+    close = [d['close'] for d in data]
+
+    results = {}
+    with stages('compute'):
+        for indicator in indicators:
+            if indicator == 'MA5':
+                results['MA5'] = MA(close, 5)
+            elif indicator == 'MA10':
+                results['MA10'] = MA(close, 10)
+            elif indicator == 'BOLL':
+                results['BOLL'] = BOLL(close)
+            elif indicator == 'MACD':
+                results['MACD'] = MACD(close)
+            # 添加更多指标计算...
+
+    with stages('encode'):
+        names, block = align_indicators(results)
+        index = [d['date'] for d in data] if data and 'date' in data[0] else None
+        result = encode_block(names, block, index=index, precision=precision, last_k=last_k, nan_mode=nan_mode)
+    return result, stages
+
+
+def render_kline(
+        data: List[Dict],
+        indicators: Optional[List[str]],
+        title: str,
+        path: str
+) -> Tuple[str, Dict]:
+    """校验数据、绘制K线图并保存到 path，数据不合法时抛出 ValueError"""
+    stages = _Stages()
+    with stages('validate'):
+        if not data:
+            raise ValueError("数据不能为空")
+        required_fields = ['date', 'open', 'high', 'low', 'close']
+        for i, item in enumerate(data):
+            for field in required_fields:
+                if field not in item:
+                    raise ValueError(f"第{i + 1}条数据缺少必需字段: {field}")
+            if not isinstance(item['date'], str) or not re.match(r'\d{4}-\d{2}-\d{2}', item['date']):
+                raise ValueError(f"第{i + 1}条数据的日期格式不正确，应为YYYY-MM-DD")
+
+    with stages('render'):
+        matplotlib.rcParams['font.sans-serif'] = ['Arial Unicode MS']
+        matplotlib.rcParams['axes.unicode_minus'] = False
+
+        dates = [d['date'] for d in data]
+        opens = [d['open'] for d in data]
+        highs = [d['high'] for d in data]
+        lows = [d['low'] for d in data]
+        closes = [d['close'] for d in data]
+        volumes = [d['volume'] for d in data] if 'volume' in data[0] else None
+
+        # 直接使用 Figure 而不经过 pyplot 的全局状态，线程中执行时也互不干扰
+        fig = Figure(figsize=(15, 10))
+        ax1, ax2 = fig.subplots(2, 1, gridspec_kw={'height_ratios': [3, 1]})
+        for i in range(len(dates)):
+            color = 'green' if closes[i] >= opens[i] else 'red'
+            ax1.plot([i, i], [lows[i], highs[i]], color=color, linewidth=1)
+            ax1.plot([i - 0.2, i + 0.2], [opens[i], opens[i]], color=color, linewidth=3)
+            ax1.plot([i - 0.2, i + 0.2], [closes[i], closes[i]], color=color, linewidth=3)
+
+        if indicators:
+            close_values = [d['close'] for d in data]
+            for indicator in indicators:
+                if indicator == 'MA5':
+                    ma5 = MA(close_values, 5)
+                    ax1.plot(range(len(ma5)), ma5, label='MA5', color='blue', linewidth=1)
+                elif indicator == 'MA10':
+                    ma10 = MA(close_values, 10)
+                    ax1.plot(range(len(ma10)), ma10, label='MA10', color='orange', linewidth=1)
+                elif indicator == 'BOLL':
+                    upper, mid, lower = BOLL(close_values)
+                    ax1.plot(range(len(upper)), upper, label='BOLL Upper', color='purple', linewidth=1)
+                    ax1.plot(range(len(mid)), mid, label='BOLL Mid', color='purple', linewidth=1)
+                    ax1.plot(range(len(lower)), lower, label='BOLL Lower', color='purple', linewidth=1)
+
+        if volumes:
+            for i in range(len(dates)):
+                color = 'green' if closes[i] >= opens[i] else 'red'
+                ax2.bar(i, volumes[i], color=color, alpha=0.5)
+
+        ax1.set_title(title)
+        ax1.set_ylabel('Price')
+        ax1.legend()
+        ax1.grid(True)
+        if volumes:
+            ax2.set_ylabel('Volume')
+            ax2.grid(True)
+        ax2.set_xticks(range(len(dates)), dates, rotation=45)
+
+    with stages('savefig'):
+        fig.savefig(path)
+    return path, stages
+
+
+def compute_cross(data1: List[float], data2: List[float]) -> Tuple[Dict, Dict]:
+    stages = _Stages()
+    with stages('compute'):
+        cross_result = CROSS(data1, data2)
+    return {
+        "cross_today": RET(cross_result),
+        "cross_history": cross_result.tolist()
+    }, stages
+
+
+def compute_correlation(series: Dict[str, BarArray], count: int, *options) -> Tuple[Dict, Dict]:
+    """options 依次为 correlation_report 的 method、window、step、top_k、include_matrix、precision"""
+    stages = _Stages()
+    with stages('compute'):
+        result = correlation_report(series, count, *options)
+    return result, stages
+
+
+def compute_correlation_shared(spec: Dict, codes: List[str], offsets: List[int], count: int,
+                               *options) -> Tuple[Dict, Dict]:
+    """同 compute_correlation，K线由主进程放在 SharedBars 中（见 correlation.pack_bars），只传 spec"""
+    shared = SharedBars.attach(spec)
+    try:
+        return compute_correlation(unpack_bars(shared.bars, codes, offsets), count, *options)
+    finally:
+        shared.close()
@@ -0,0 +1,77 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from mcp_ashare_quant import backfill
+from mcp_ashare_quant.backfill import Backfill
+from mcp_ashare_quant.bar_store import BarStore
+from mcp_ashare_quant.bars import BarArray
+
+CODE = 'sh600000'
+
+
+def make_frame(start, n, scale=1.0):
+    close = np.round(10 + np.arange(n) * 0.1, 2)
+    prices = np.round(close * scale, 2)
+    return pd.DataFrame({'open': prices, 'high': prices + 0.1, 'low': prices - 0.1, 'close': prices,
+                         'volume': np.full(n, 1000.0)}, index=pd.bdate_range(start, periods=n, name=''))
+
+
+def qfq_backfill(tmp_path, monkeypatch, source):
+    """让回填只走腾讯前复权接口，source 为返回最新 count 条日线的全量数据"""
+    def get_price_day_tx(code, count=10, **kwargs):
+        return source[-count:]
+
+    def get_price_sina(code, **kwargs):
+        raise RuntimeError("新浪接口不可用")
+
+    monkeypatch.setattr(backfill, 'get_price_day_tx', get_price_day_tx)
+    monkeypatch.setattr(backfill, 'get_price_sina', get_price_sina)
+    return Backfill(symbols=[CODE], count=30, store=BarStore(str(tmp_path)))
+
+
+def test_matching_qfq_bars_are_appended(tmp_path, monkeypatch):
+    history = make_frame('2024-01-01', 50)
+    job = qfq_backfill(tmp_path, monkeypatch, history[:40])
+    assert job._fetch_and_store(CODE) == 30
+    job = qfq_backfill(tmp_path, monkeypatch, history)
+    assert job._fetch_and_store(CODE) == 10
+    assert len(os.listdir(os.path.join(str(tmp_path), '1d', CODE))) == 2
+
+
+def test_ex_dividend_rewrites_qfq_history(tmp_path, monkeypatch):
+    before = make_frame('2024-01-01', 40)
+    job = qfq_backfill(tmp_path, monkeypatch, before)
+    job._fetch_and_store(CODE)
+
+    # 除权除息后前复权价格整体下调，再加上10个新交易日
+    after = make_frame('2024-01-01', 50, scale=0.9)
+    job = qfq_backfill(tmp_path, monkeypatch, after)
+    job._fetch_and_store(CODE)
+
+    store = BarStore(str(tmp_path))
+    bars = store.load(CODE)
+    # 重新获取的条数覆盖库中全部日期（这里数据源只有50条，全部取回）
+    expected = BarArray.from_frame(after)
+    assert np.array_equal(bars.time, expected.time)
+    assert np.allclose(bars.close, expected.close)
+    assert os.listdir(os.path.join(str(tmp_path), '1d', CODE)) == ['000002.base.npz']
+
+
+def test_replace_ignores_older_chunks_left_behind(tmp_path):
+    store = BarStore(str(tmp_path))
+    store.append(CODE, BarArray.from_frame(make_frame('2024-01-01', 20)), adjust='qfq')
+    old = os.path.join(str(tmp_path), '1d', CODE, '000001.npz')
+    saved = open(old, 'rb').read()
+    store.replace(CODE, BarArray.from_frame(make_frame('2024-01-01', 25, scale=0.5)), adjust='qfq')
+    # 模拟删除旧分块之前中断
+    open(old, 'wb').write(saved)
+
+    store = BarStore(str(tmp_path))
+    bars = store.load(CODE)
+    assert len(bars) == 25
+    assert np.allclose(bars.close, BarArray.from_frame(make_frame('2024-01-01', 25, scale=0.5)).close)
+    assert store.adjustment(CODE) == 'qfq'
+    assert store.append(CODE, BarArray.from_frame(make_frame('2024-01-01', 26, scale=0.5)), adjust='qfq') == 1
+    assert len(store.load(CODE)) == 26
@@ -0,0 +1,36 @@
+import pandas as pd
+
+from mcp_ashare_quant.cache import BarCache, normalize_code, price_request_key
+
+
+def make_bars(n):
+    index = pd.date_range('2024-01-02', periods=n, freq='D')
+    return pd.DataFrame({'close': range(n)}, index=index)
+
+
+def test_normalize_code_spellings():
+    for spelling in ('sh600519', 'SH600519', ' sh600519 ', '600519.XSHG', '600519.xshg'):
+        assert normalize_code(spelling) == 'sh600519'
+    assert normalize_code('000001.XSHE') == 'sz000001'
+    assert normalize_code('000001.XSHG') == 'sh000001'
+    assert normalize_code('600519') == '600519'
+
+
+def test_bar_cache_mixed_spellings_share_entry():
+    cache = BarCache()
+    cache.put('SH600519', '1d', 20, '', make_bars(20), ttl=60)
+
+    for spelling in ('sh600519', '600519.XSHG', ' Sh600519'):
+        df = cache.get(spelling, '1d', 10)
+        assert df is not None and len(df) == 10
+    assert cache.get('sz600519', '1d', 10) is None
+
+    # 不同写法的短数据不覆盖已有的长数据
+    cache.put('600519.XSHG', '1d', 5, None, make_bars(5), ttl=60)
+    assert len(cache.get('sh600519', '1d', 20)) == 20
+    assert len(cache._cache) == 1
+
+
+def test_price_request_key_matches_across_spellings():
+    keys = {price_request_key(code, '1d', 10, None) for code in ('SH600519', 'sh600519', '600519.XSHG')}
+    assert keys == {('price', 'sh600519', '1d', 10, '')}
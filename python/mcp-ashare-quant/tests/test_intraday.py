@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+
+from mcp_ashare_quant.intraday import IntradayAggregator
+from mcp_ashare_quant.parsers import parse_tx_min
+
+
+def session_times(day):
+    day = pd.Timestamp(day)
+    morning = pd.date_range(day + pd.Timedelta('9h30min'), day + pd.Timedelta('11h30min'), freq='min')
+    afternoon = pd.date_range(day + pd.Timedelta('13h01min'), day + pd.Timedelta('15h'), freq='min')
+    return morning.append(afternoon)
+
+
+def make_minutes(times, seed=0):
+    rng = np.random.default_rng(seed)
+    close = 100 + np.cumsum(rng.normal(0, 0.1, len(times)))
+    volume = rng.integers(10, 100, len(times)).astype(float)
+    # 成交价在高低点之间、与收盘价不同，VWAP 不能由 OHLC 推出
+    price = close - 0.03
+    return pd.DataFrame({'open': close, 'high': close + 0.05, 'low': close - 0.05, 'close': close,
+                         'volume': volume, 'amount': price * volume * 100}, index=pd.DatetimeIndex(times, name=''))
+
+
+def test_vwap_uses_amount():
+    df = make_minutes(session_times('2024-01-02'))
+    aggregator = IntradayAggregator()
+    aggregator.update('sh600000', df)
+    expected = df['amount'].sum() / (df['volume'].sum() * 100)
+    assert abs(aggregator.sessions('sh600000')[0]['vwap'] - round(expected, 4)) < 1e-9
+    bars = aggregator.bars('sh600000')
+    assert abs(bars[-1]['vwap'] - round(expected, 4)) < 1e-9
+
+
+def test_gap_rebuilds_day_from_full_data():
+    full = make_minutes(session_times('2024-01-02').append(session_times('2024-01-03')))
+    aggregator = IntradayAggregator()
+    aggregator.update('sh600000', full[:'2024-01-03 10:00'])
+    # 10:01-10:20 没有拿到，下一次的窗口从 10:21 开始
+    later = full['2024-01-03 10:21':]
+    assert aggregator.has_gap('sh600000', later)
+    assert not aggregator.has_gap('sh600000', full['2024-01-03 10:00':])
+    aggregator.update('sh600000', later)
+    assert [s['day'] for s in aggregator.sessions('sh600000')] == ['2024-01-02']
+
+    # 多取的K线覆盖当天开盘后，这一天完整重建，与一次性计算的结果相同
+    aggregator.update('sh600000', full)
+    reference = IntradayAggregator()
+    reference.update('sh600000', full)
+    assert aggregator.sessions('sh600000') == reference.sessions('sh600000')
+    assert aggregator.bars('sh600000') == reference.bars('sh600000')
+
+
+def test_lunch_break_is_not_a_gap():
+    full = make_minutes(session_times('2024-01-02'))
+    aggregator = IntradayAggregator()
+    aggregator.update('sh600000', full[:'2024-01-02 11:30'])
+    assert not aggregator.has_gap('sh600000', full['2024-01-02 13:01':])
+
+
+def test_parse_tx_min_amount():
+    raw = (b'{"data": {"sz000001": {"m1": ['
+           b'["202104091500", "21.49", "21.50", "21.50", "21.48", "1690.00", {}, "363.2105"],'
+           b'["202104091501", "21.50", "21.50", "21.50", "21.50", "10.00", {}, ""]],'
+           b'"qt": {"sz000001": ["51", "x", "000001", "21.50"]}}}}')
+    df = parse_tx_min(raw, 'sz000001', 1)
+    assert abs(df['amount'].iloc[0] - 3632105.0) < 1e-6
+    assert np.isnan(df['amount'].iloc[1])
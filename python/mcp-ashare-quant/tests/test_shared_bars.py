@@ -0,0 +1,76 @@
+import multiprocessing
+import os
+import subprocess
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from mcp_ashare_quant.bars import BarArray, SharedBars
+from mcp_ashare_quant.correlation import pack_bars, unpack_bars
+from mcp_ashare_quant.tasks import compute_correlation, compute_correlation_shared
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def make_bars(n, seed=0, start='2024-01-02'):
+    rng = np.random.default_rng(seed)
+    close = 10 * np.exp(np.cumsum(rng.normal(0, 0.02, n)))
+    df = pd.DataFrame({'open': close, 'high': close * 1.01, 'low': close * 0.99, 'close': close,
+                       'volume': rng.integers(1000, 2000, n)}, index=pd.bdate_range(start, periods=n))
+    return BarArray.from_frame(df)
+
+
+def close_sum(spec):
+    shared = SharedBars.attach(spec)
+    try:
+        return float(shared.bars.close.astype(np.float64).sum())
+    finally:
+        shared.close()
+
+
+def test_worker_exit_does_not_unlink_segment():
+    bars = make_bars(500)
+    shared = SharedBars.create(bars)
+    try:
+        # 每次调用后工作进程退出，挂载方不登记 resource_tracker，共享内存仍然存在
+        for _ in range(2):
+            with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context('spawn'),
+                                     max_tasks_per_child=1) as pool:
+                assert pool.submit(close_sum, shared.spec).result() == float(bars.close.astype(np.float64).sum())
+        # 独立的进程有自己的 resource_tracker，登记过的话退出时会删除共享内存
+        subprocess.run([sys.executable, '-c', f'from tests.test_shared_bars import close_sum; close_sum({shared.spec!r})'],
+                       check=True, cwd=ROOT)
+        again = SharedBars.attach(shared.spec)
+        assert np.array_equal(again.bars.time, bars.time)
+        again.close()
+    finally:
+        shared.close()
+        shared.unlink()
+
+
+def test_pack_round_trip():
+    series = {'sh600000': make_bars(30, 1), 'sz000001': make_bars(20, 2, '2024-01-10')}
+    packed, codes, offsets = pack_bars(series)
+    assert offsets == [0, 30, 50]
+    for code, bars in unpack_bars(packed, codes, offsets).items():
+        assert np.array_equal(bars.time, series[code].time)
+        assert np.array_equal(bars.close, series[code].close)
+
+
+def test_shared_correlation_matches_inline():
+    series = {f'sh60000{i}': make_bars(120, i) for i in range(5)}
+    options = ('correlation', 60, 20, 2, True, 4)
+    expected, _ = compute_correlation(series, 100, *options)
+
+    packed, codes, offsets = pack_bars(series)
+    shared = SharedBars.create(packed)
+    try:
+        result, stages = compute_correlation_shared(shared.spec, codes, offsets, 100, *options)
+    finally:
+        shared.close()
+        shared.unlink()
+    assert result == expected
+    assert 'compute' in stages
@@ -0,0 +1,134 @@
+"""
+批量处理
+
+对多张图片（列表或 glob 匹配）在工作进程池中并行执行同一组操作并保存到目录，
+可按感知哈希跳过索引中已处理过的图片和本批次内的重复图片
+"""
+from typing import Annotated, Awaitable, Callable, List, Optional, Tuple
+from urllib.parse import urlparse
+import asyncio
+import io
+import os
+import time
+from PIL import Image
+from pydantic import BaseModel, Field
+from encoding import ImageFormatType, Animation, EncodeOptions, infer_image_format, is_multiframe, encode_image
+from operations import PipelineStep, run_pipeline
+from phash import hash_sources, hash_index, hamming, hash_key
+from workers import BATCH_WORKERS, get_batch_pool, collect_sources, read_source
+
+# ========== 批量处理 ==========
+class BatchProcess(BaseModel):
+    sources: Annotated[Optional[List[str]], Field(default=None, description="图片来源列表 (URL、本地文件路径或 Base64 编码的图片)")]
+    pattern: Annotated[Optional[str], Field(default=None, description="本地文件的 glob 匹配模式，如 '/data/products/**/*.jpg'，可与 sources 同时使用")]
+    operations: Annotated[List[PipelineStep], Field(min_length=1, description="对每张图片按顺序执行的操作列表，格式同 process_pipeline")]
+    output_dir: Annotated[str, Field(description="结果保存目录")]
+    output_format: Annotated[Optional[ImageFormatType], Field(default=None, description="可选，输出格式，默认沿用源文件扩展名（无法判断时为 PNG）")]
+    skip_duplicates: Annotated[bool, Field(default=False, description="是否跳过已处理过的图片：按感知哈希（pHash）查找索引中已有输出的相同或近似图片，本批次内的重复图片也只处理第一张；处理结果会记入索引")]
+    max_distance: Annotated[int, Field(default=4, ge=0, le=32, description="skip_duplicates 时视为重复的最大汉明距离（64 位 pHash），0 表示只跳过内容几乎完全相同的图片")]
+
+def batch_output_path(source: str, index: int, output_dir: str, output_format: Optional[str], used: set) -> str:
+    """按源文件名生成输出路径，重名时加上序号"""
+    if source.startswith(('http://', 'https://', 'file://')):
+        name = os.path.basename(urlparse(source).path)
+    elif len(source) < 4096 and os.path.exists(source):
+        name = os.path.basename(source)
+    else:
+        name = ''
+    stem, ext = os.path.splitext(name)
+    stem = stem or f'image_{index:05d}'
+    if output_format:
+        ext = {'JPEG': '.jpg', 'TIFF': '.tiff'}.get(output_format, '.' + output_format.lower())
+    elif infer_image_format(name) == 'PNG':
+        # 没有扩展名或扩展名无法识别时保存为 PNG
+        ext = '.png'
+    if stem + ext in used:
+        stem = f'{stem}_{index:05d}'
+    used.add(stem + ext)
+    return os.path.join(output_dir, stem + ext)
+
+def process_batch_item(path: Optional[str], data: Optional[bytes], output_path: str,
+                       steps: List[BaseModel], output_format: Optional[str]) -> Tuple[int, int]:
+    """在工作进程中解码、处理并保存一张图片，返回结果尺寸"""
+    img = Image.open(path) if path is not None else Image.open(io.BytesIO(data))
+    if is_multiframe(img):
+        # 批量任务已经按图片并行，同一张图的各帧在工作进程内顺序处理
+        animation = Animation.from_image(img)
+        img = animation.with_frames([run_pipeline(frame, steps) for frame in animation.frames])
+    else:
+        img = run_pipeline(img, steps)
+    format = output_format or infer_image_format(output_path)
+    encode_image(img, output_path, format, EncodeOptions(format))
+    return img.width, img.height
+
+async def run_batch(args: BatchProcess, report: Callable[[int, int], Awaitable[None]]) -> dict:
+    """并行处理全部图片，每完成一张调用一次 report(已完成数, 总数)"""
+    sources = collect_sources(args.sources, args.pattern)
+    os.makedirs(args.output_dir, exist_ok=True)
+    used: set = set()
+    outputs = [batch_output_path(src, i, args.output_dir, args.output_format, used) for i, src in enumerate(sources)]
+
+    pool = get_batch_pool()
+    loop = asyncio.get_running_loop()
+    # 限制同时在途的图片数，避免远程图片全部下载到内存后才开始处理
+    in_flight = asyncio.Semaphore(BATCH_WORKERS * 2)
+    started = time.monotonic()
+
+    # 跳过重复：先并行计算全部来源的哈希，与索引中已有输出的记录及本批次中更早的图片比较
+    skipped, hashes = {}, {}
+    if args.skip_duplicates:
+        for index, item in enumerate(await hash_sources(sources)):
+            if "error" not in item:
+                hashes[index] = item
+        index_matches = await asyncio.to_thread(hash_index.match_processed, {i: h["phash"] for i, h in hashes.items()},
+                                                args.max_distance)
+        kept: List[int] = []
+        for index in sorted(hashes):
+            if index in index_matches:
+                skipped[index] = index_matches[index]
+                continue
+            phash = hashes[index]["phash"]
+            earlier = next((i for i in kept if hamming(phash, hashes[i]["phash"]) <= args.max_distance), None)
+            if earlier is not None:
+                skipped[index] = {"key": sources[earlier], "output": outputs[earlier],
+                                  "distance": hamming(phash, hashes[earlier]["phash"])}
+            else:
+                kept.append(index)
+
+    async def process(index: int) -> dict:
+        if index in skipped:
+            return {"source": index, "skipped": skipped[index]}
+        async with in_flight:
+            try:
+                path, data = await read_source(sources[index])
+                size = await loop.run_in_executor(pool, process_batch_item, path, data, outputs[index],
+                                                  args.operations, args.output_format)
+                return {"source": index, "output": outputs[index], "size": list(size)}
+            except Exception as e:
+                return {"source": index, "error": str(e)}
+
+    results, done = [], 0
+    for future in asyncio.as_completed([process(i) for i in range(len(sources))]):
+        results.append(await future)
+        done += 1
+        await report(done, len(sources))
+
+    results.sort(key=lambda r: r["source"])
+    if args.skip_duplicates:
+        processed = [dict(hashes[r["source"]], key=hash_key(sources[r["source"]], hashes[r["source"]]), output=r["output"])
+                     for r in results if "output" in r and r["source"] in hashes]
+        await asyncio.to_thread(hash_index.add, processed)
+    errors = [{"source": sources[r["source"]][:200], "error": r["error"]} for r in results if "error" in r]
+    skipped_items = [{"source": sources[r["source"]][:200], "duplicate_of": r["skipped"]["key"][:200],
+                      "previous_output": r["skipped"]["output"], "distance": r["skipped"]["distance"]}
+                     for r in results if "skipped" in r]
+    return {
+        "total": len(sources),
+        "succeeded": len(sources) - len(errors) - len(skipped_items),
+        "skipped": len(skipped_items),
+        "failed": len(errors),
+        "output_dir": args.output_dir,
+        "elapsed_seconds": round(time.monotonic() - started, 2),
+        "errors": errors,
+        "skipped_items": skipped_items,
+    }
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+逐像素操作基准：查找表实现 vs Pillow 原有实现
+
+在 1MP / 12MP / 24MP 的 RGB 与 RGBA 图像上分别计时，输出每次调用的毫秒数和加速比：
+- brightness / contrast: operations.adjust（numpy 查找表 + Image.point）vs ImageEnhance
+- gamma: operations.adjust vs 逐像素 numpy 浮点运算
+- border: operations.add_border（原模式画布）vs 先建 RGBA 画布再粘贴
+- crop / flip: Pillow 的 crop/transpose vs numpy 切片视图再转回 Image（说明为何保留 Pillow 实现）
+
+用法:
+    python benchmarks/bench_ops.py [--sizes 1 12 24] [--repeat 5] [--json out.json]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+from PIL import Image, ImageEnhance
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import operations  # noqa: E402
+
+
+def make_image(megapixels: float, mode: str, seed: int = 0) -> Image.Image:
+    height = int((megapixels * 1e6 * 3 / 4) ** 0.5)
+    width = int(height * 4 / 3)
+    rng = np.random.default_rng(seed)
+    # 平滑的渐变加噪声，接近照片的像素分布
+    y, x = np.mgrid[0:height, 0:width]
+    base = (x / width * 160 + y / height * 60)[..., None] + rng.normal(0, 20, (height, width, 1))
+    data = np.clip(base + np.array([0, 20, 40]), 0, 255).astype(np.uint8)
+    img = Image.fromarray(data, 'RGB')
+    return img.convert(mode) if mode != 'RGB' else img
+
+
+def pillow_border(img: Image.Image, border_width: int, color: str = 'black') -> Image.Image:
+    canvas = Image.new('RGBA', (img.width + 2 * border_width, img.height + 2 * border_width), color)
+    canvas.paste(img, (border_width, border_width))
+    return canvas
+
+
+def numpy_gamma(img: Image.Image, gamma: float) -> Image.Image:
+    data = np.asarray(img, dtype=np.float32) / 255
+    return Image.fromarray(np.round(255 * data ** (1 / gamma)).astype(np.uint8), img.mode)
+
+
+def numpy_crop(img: Image.Image, box) -> Image.Image:
+    left, top, right, bottom = box
+    return Image.fromarray(np.asarray(img)[top:bottom, left:right])
+
+
+def numpy_flip(img: Image.Image) -> Image.Image:
+    return Image.fromarray(np.asarray(img)[:, ::-1])
+
+
+def cases(img: Image.Image):
+    box = (img.width // 10, img.height // 10, img.width * 9 // 10, img.height * 9 // 10)
+    return {
+        'brightness': (lambda: ImageEnhance.Brightness(img).enhance(1.3), lambda: operations.adjust(img, 'brightness', 1.3)),
+        'contrast': (lambda: ImageEnhance.Contrast(img).enhance(1.3), lambda: operations.adjust(img, 'contrast', 1.3)),
+        'gamma': (lambda: numpy_gamma(img, 2.2), lambda: operations.adjust(img, 'gamma', 2.2)),
+        'border': (lambda: pillow_border(img, 20), lambda: operations.add_border(img, 20)),
+        'crop': (lambda: numpy_crop(img, box), lambda: operations.crop(img, *box)),
+        'flip': (lambda: numpy_flip(img), lambda: operations.flip(img, 'horizontal')),
+    }
+
+
+def timeit(func, repeat: int) -> float:
+    func()
+    started = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="逐像素操作基准")
+    parser.add_argument('--sizes', nargs='+', type=float, default=[1, 12, 24], help="图像大小（百万像素）")
+    parser.add_argument('--modes', nargs='+', default=['RGB', 'RGBA'])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--json', help="结果保存路径")
+    args = parser.parse_args()
+
+    results = {}
+    print(f"{'操作':<12}{'模式':<6}{'像素':>6}{'对照(ms)':>12}{'当前(ms)':>12}{'加速比':>8}")
+    for megapixels in args.sizes:
+        for mode in args.modes:
+            img = make_image(megapixels, mode)
+            for name, (baseline, current) in cases(img).items():
+                base_ms = timeit(baseline, args.repeat)
+                cur_ms = timeit(current, args.repeat)
+                key = f'{name}/{mode}/{megapixels:g}MP'
+                results[key] = {'baseline_ms': round(base_ms, 2), 'current_ms': round(cur_ms, 2),
+                                'speedup': round(base_ms / cur_ms, 2)}
+                print(f"{name:<12}{mode:<6}{megapixels:>5g}M{base_ms:>12.1f}{cur_ms:>12.1f}{base_ms / cur_ms:>8.2f}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"结果已保存到 {args.json}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+"""
+图片下载
+
+服务进程内共用一个 HTTP 客户端（连接池、TLS 会话复用），下载的图片字节按 URL 缓存，
+过期后用 ETag/Last-Modified 条件请求验证
+"""
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, Tuple
+from urllib.parse import urlparse
+import os
+import tempfile
+import time
+import httpx
+
+# 下载缓存容量（MB）与免验证时间（秒），超过免验证时间后用 ETag/Last-Modified 向源站确认是否变化
+DOWNLOAD_CACHE_MB = int(os.getenv('IMAGE_DOWNLOAD_CACHE_MB', '256'))
+DOWNLOAD_FRESH_SECONDS = float(os.getenv('IMAGE_DOWNLOAD_FRESH_SECONDS', '30'))
+
+_http_client: Optional[httpx.AsyncClient] = None
+
+def get_http_client() -> httpx.AsyncClient:
+    """服务进程内共用的 HTTP 客户端，复用连接池与 TLS 会话"""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            follow_redirects=True,
+            timeout=httpx.Timeout(30.0),
+            limits=httpx.Limits(max_connections=32, max_keepalive_connections=16),
+        )
+    return _http_client
+
+async def close_http_client() -> None:
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+@dataclass
+class CachedDownload:
+    content: bytes
+    etag: Optional[str]
+    last_modified: Optional[str]
+    fetched_at: float
+
+class DownloadCache:
+    """按 URL 缓存下载的图片字节，总大小超过上限时淘汰最久未使用的项"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries: "OrderedDict[str, CachedDownload]" = OrderedDict()
+
+    def get(self, url: str) -> Optional[CachedDownload]:
+        entry = self._entries.get(url)
+        if entry is not None:
+            self._entries.move_to_end(url)
+        return entry
+
+    def put(self, url: str, entry: CachedDownload) -> None:
+        self.discard(url)
+        if len(entry.content) > self.max_bytes:
+            return
+        self._entries[url] = entry
+        self.size += len(entry.content)
+        while self.size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= len(evicted.content)
+
+    def discard(self, url: str) -> None:
+        entry = self._entries.pop(url, None)
+        if entry is not None:
+            self.size -= len(entry.content)
+
+download_cache = DownloadCache(DOWNLOAD_CACHE_MB * 1024 * 1024)
+
+async def download_bytes(url: str) -> bytes:
+    """下载 URL 内容，命中缓存时在免验证时间内直接返回，否则带条件请求头验证，304 时沿用缓存"""
+    entry = download_cache.get(url)
+    if entry and time.monotonic() - entry.fetched_at < DOWNLOAD_FRESH_SECONDS:
+        return entry.content
+    headers = {}
+    if entry and entry.etag:
+        headers['If-None-Match'] = entry.etag
+    if entry and entry.last_modified:
+        headers['If-Modified-Since'] = entry.last_modified
+    response = await get_http_client().get(url, headers=headers)
+    if response.status_code == 304 and entry:
+        entry.fetched_at = time.monotonic()
+        return entry.content
+    response.raise_for_status()
+    if 'no-store' in response.headers.get('Cache-Control', ''):
+        download_cache.discard(url)
+    else:
+        download_cache.put(url, CachedDownload(
+            content=response.content,
+            etag=response.headers.get('ETag'),
+            last_modified=response.headers.get('Last-Modified'),
+            fetched_at=time.monotonic(),
+        ))
+    return response.content
+
+async def fetch_head(url: str, limit: int) -> Tuple[bytes, Optional[int]]:
+    """用 Range 请求获取 URL 开头的 limit 个字节，返回 (数据, 文件总大小)；服务器不支持 Range 时读够即断开"""
+    entry = download_cache.get(url)
+    if entry:
+        return entry.content, len(entry.content)
+    chunks, received, total = [], 0, None
+    async with get_http_client().stream('GET', url, headers={'Range': f'bytes=0-{limit - 1}'}) as response:
+        response.raise_for_status()
+        if response.status_code == 206:
+            # Content-Range: bytes 0-65535/1234567
+            size = response.headers.get('Content-Range', '').rpartition('/')[2]
+            total = int(size) if size.isdigit() else None
+        elif 'Content-Length' in response.headers and 'Content-Encoding' not in response.headers:
+            total = int(response.headers['Content-Length'])
+        async for chunk in response.aiter_bytes():
+            chunks.append(chunk)
+            received += len(chunk)
+            if received >= limit:
+                break
+    return b''.join(chunks), total
+
+async def download_to_file(url: str) -> str:
+    """把 URL 内容流式写入临时文件，返回文件路径（调用方负责删除）"""
+    fd, path = tempfile.mkstemp(suffix=os.path.splitext(urlparse(url).path)[1])
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            async with get_http_client().stream('GET', url) as response:
+                response.raise_for_status()
+                async for chunk in response.aiter_bytes(1 << 20):
+                    f.write(chunk)
+    except Exception:
+        os.remove(path)
+        raise
+    return path
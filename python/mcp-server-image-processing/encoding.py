@@ -0,0 +1,185 @@
+"""
+图像编码
+
+输出格式的选择（按扩展名或按内容自动选择）、各格式的编码参数，以及多帧图像（动图、多页 TIFF）的拆分与重新组装
+"""
+from dataclasses import dataclass
+from typing import List, Literal, Optional, Union
+import base64
+import io
+import os
+from PIL import Image, ImageSequence, features
+
+# 定义图片格式类型
+ImageFormatType = Literal['PNG', 'JPEG', 'WEBP', 'GIF', 'BMP', 'TIFF']
+# 输出格式，auto 按图像内容选择
+OutputFormatType = Literal['auto', 'PNG', 'JPEG', 'WEBP', 'GIF', 'BMP', 'TIFF']
+
+def infer_image_format(file_path: str) -> ImageFormatType:
+    """从文件路径推断图像格式"""
+    ext = os.path.splitext(file_path)[1].lower()
+    if ext in ['.jpg', '.jpeg']:
+        return 'JPEG'
+    elif ext == '.gif':
+        return 'GIF'
+    elif ext == '.bmp':
+        return 'BMP'
+    elif ext in ['.tif', '.tiff']:
+        return 'TIFF'
+    elif ext == '.webp':
+        return 'WEBP'
+    else:
+        return 'PNG'  # 默认使用 PNG
+
+# ========== 多帧图像 ==========
+# 动图（GIF/APNG/WEBP）和多页 TIFF 拆成逐帧的完整图像分别处理，再按原来的帧时长、处置方式和循环次数重新组装
+
+ANIMATED_FORMATS = ('GIF', 'PNG', 'WEBP', 'TIFF')
+
+@dataclass
+class Animation:
+    frames: List[Image.Image]
+    durations: List[Optional[int]]
+    disposals: List[int]
+    loop: Optional[int]
+    format: Optional[str]
+
+    @property
+    def width(self) -> int:
+        return self.frames[0].width
+
+    @property
+    def height(self) -> int:
+        return self.frames[0].height
+
+    @classmethod
+    def from_image(cls, img: Image.Image) -> "Animation":
+        """逐帧读取；Pillow 读出的每一帧都已按处置方式与前面的帧合成为完整画面"""
+        frames, durations, disposals = [], [], []
+        for frame in ImageSequence.Iterator(img):
+            durations.append(frame.info.get('duration'))
+            disposals.append(getattr(frame, 'disposal_method', 0))
+            frames.append(frame.copy())
+        return cls(frames, durations, disposals, img.info.get('loop'), img.format)
+
+    def with_frames(self, frames: List[Image.Image]) -> "Animation":
+        return Animation(frames, self.durations, self.disposals, self.loop, self.format)
+
+def is_multiframe(img: Image.Image) -> bool:
+    return getattr(img, 'n_frames', 1) > 1
+
+# ========== 编码 ==========
+@dataclass
+class EncodeOptions:
+    format: Optional[str] = None  # None 表示按输出路径扩展名（没有路径时为 PNG）
+    quality: Optional[int] = None
+    optimize: bool = False
+    compress_level: Optional[int] = None
+    lossless: bool = False
+
+# 判断是否为图形（截图、图标、图表等）的颜色数上限，在缩小后的采样图上统计
+GRAPHIC_MAX_COLORS = 256
+DEFAULT_QUALITY = {'JPEG': 85, 'WEBP': 80}
+
+def has_alpha(img: Image.Image) -> bool:
+    """图像是否带有实际使用的透明通道"""
+    if img.mode in ('RGBA', 'LA', 'PA'):
+        return img.getchannel('A').getextrema()[0] < 255
+    return 'transparency' in img.info
+
+def choose_format(img: Image.Image) -> ImageFormatType:
+    """
+    按内容选择输出格式：
+    颜色少的图形类图像用 PNG（无损且压缩率高）；照片类无透明通道用 JPEG，有透明通道用 WEBP（不支持时用 PNG）
+    """
+    sample = img
+    if max(img.size) > 512:
+        sample = img.copy()
+        sample.thumbnail((512, 512), Image.Resampling.NEAREST)
+    if sample.mode not in ('RGB', 'RGBA', 'L', 'LA'):
+        sample = sample.convert('RGBA')
+    if sample.getcolors(GRAPHIC_MAX_COLORS) is not None:
+        return 'PNG'
+    if has_alpha(img):
+        return 'WEBP' if features.check('webp') else 'PNG'
+    return 'JPEG'
+
+def resolve_format(options: EncodeOptions, img: Union[Image.Image, Animation], output_path: Optional[str] = None) -> ImageFormatType:
+    if isinstance(img, Animation) and (options.format == 'auto' or (not options.format and not output_path)):
+        # 多帧图像默认保持原格式，原格式不支持多帧时用 GIF
+        return img.format if img.format in ANIMATED_FORMATS else 'GIF'
+    if options.format == 'auto':
+        return choose_format(img)
+    if options.format:
+        return options.format
+    return infer_image_format(output_path) if output_path else 'PNG'
+
+def prepare_for_format(img: Image.Image, format: str) -> Image.Image:
+    """转换为目标格式支持的色彩模式，不支持透明的格式把透明部分合成到白色背景上"""
+    if format in ('JPEG', 'BMP'):
+        if img.mode in ('RGB', 'L') or (format == 'JPEG' and img.mode == 'CMYK'):
+            return img
+        if has_alpha(img):
+            rgba = img.convert('RGBA')
+            background = Image.new('RGB', img.size, 'white')
+            background.paste(rgba, mask=rgba.getchannel('A'))
+            return background
+        return img.convert('RGB')
+    if format == 'WEBP' and img.mode not in ('RGB', 'RGBA'):
+        return img.convert('RGBA' if has_alpha(img) else 'RGB')
+    return img
+
+def encoder_kwargs(format: str, options: EncodeOptions) -> dict:
+    """各格式对应的编码参数"""
+    kwargs = {}
+    if format in ('JPEG', 'WEBP'):
+        kwargs['quality'] = options.quality if options.quality is not None else DEFAULT_QUALITY[format]
+    if format == 'JPEG':
+        kwargs['optimize'] = options.optimize
+        # 高质量时不做色度子采样，避免彩色边缘发虚
+        if kwargs['quality'] >= 90:
+            kwargs['subsampling'] = 0
+    elif format == 'WEBP':
+        kwargs['lossless'] = options.lossless
+        # method 0-6：越大越慢、压缩率越高，optimize 时使用最慢的方式
+        kwargs['method'] = 6 if options.optimize else 4
+    elif format == 'PNG':
+        kwargs['optimize'] = options.optimize
+        if options.compress_level is not None:
+            kwargs['compress_level'] = options.compress_level
+    elif format == 'GIF':
+        kwargs['optimize'] = options.optimize
+    return kwargs
+
+def encode_frames(animation: Animation, fp, format: str, options: EncodeOptions) -> None:
+    """编码多帧图像；不支持多帧的格式（JPEG/BMP）只保存第一帧"""
+    frames = [prepare_for_format(frame, format) for frame in animation.frames]
+    kwargs = encoder_kwargs(format, options)
+    if format not in ANIMATED_FORMATS:
+        frames[0].save(fp, format=format, **kwargs)
+        return
+    if format != 'TIFF':
+        kwargs['duration'] = [d if d is not None else 100 for d in animation.durations]
+        kwargs['loop'] = animation.loop if animation.loop is not None else 0
+    if format == 'GIF':
+        kwargs['disposal'] = animation.disposals
+    frames[0].save(fp, format=format, save_all=True, append_images=frames[1:], **kwargs)
+
+def encode_image(img: Union[Image.Image, Animation], fp, format: str, options: EncodeOptions) -> None:
+    """按选项把图像编码写入文件路径或文件对象"""
+    if isinstance(img, Animation):
+        encode_frames(img, fp, format, options)
+        return
+    prepare_for_format(img, format).save(fp, format=format, **encoder_kwargs(format, options))
+
+def ensure_dir_exists(file_path: str) -> None:
+    """确保文件所在的目录存在"""
+    directory = os.path.dirname(file_path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+
+def image_to_base64(img: Union[Image.Image, Animation], format: ImageFormatType = "PNG", options: Optional[EncodeOptions] = None) -> str:
+    """将 PIL 图像转换为 base64 字符串"""
+    buffer = io.BytesIO()
+    encode_image(img, buffer, format, options or EncodeOptions())
+    return base64.b64encode(buffer.getbuffer()).decode('ascii')
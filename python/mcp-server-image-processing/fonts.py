@@ -0,0 +1,153 @@
+"""
+字体
+
+首次使用时扫描一次系统字体目录，按字体族名和文件名建立索引；FreeTypeFont 按 (字体文件, 字号) 缓存，
+同一段文字渲染出的蒙版也按 (字体文件, 字号, 文字) 缓存，批量加水印时只解析和排版一次
+"""
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+import os
+import sys
+import threading
+from PIL import Image, ImageDraw, ImageFont
+
+# 额外的字体目录（用 os.pathsep 分隔），以及缓存的字体对象数、文字蒙版数
+FONT_DIRS = [d for d in os.getenv('IMAGE_FONT_DIRS', '').split(os.pathsep) if d]
+FONT_CACHE_SIZE = int(os.getenv('IMAGE_FONT_CACHE_SIZE', '64'))
+TEXT_MASK_CACHE_SIZE = int(os.getenv('IMAGE_TEXT_MASK_CACHE_SIZE', '256'))
+
+FONT_EXTENSIONS = ('.ttf', '.otf', '.ttc', '.otc')
+# 文字含中日韩字符时优先使用的字体族（按顺序），都没有时再逐个检查字体是否包含这些字形
+CJK_FAMILIES = ('noto sans cjk sc', 'noto sans sc', 'source han sans sc', 'source han sans cn', 'microsoft yahei',
+                'pingfang sc', 'hiragino sans gb', 'wenquanyi micro hei', 'wenquanyi zen hei', 'simhei',
+                'noto sans cjk', 'source han sans', 'droid sans fallback', 'simsun', 'ar pl uming cn')
+LATIN_FAMILIES = ('arial', 'dejavu sans', 'liberation sans', 'helvetica', 'noto sans', 'segoe ui')
+
+def system_font_dirs() -> List[str]:
+    home = os.path.expanduser('~')
+    if sys.platform == 'win32':
+        dirs = [os.path.join(os.environ.get('WINDIR', r'C:\Windows'), 'Fonts'),
+                os.path.join(os.environ.get('LOCALAPPDATA', ''), 'Microsoft', 'Windows', 'Fonts')]
+    elif sys.platform == 'darwin':
+        dirs = ['/System/Library/Fonts', '/Library/Fonts', os.path.join(home, 'Library', 'Fonts')]
+    else:
+        dirs = ['/usr/share/fonts', '/usr/local/share/fonts', os.path.join(home, '.fonts'),
+                os.path.join(home, '.local', 'share', 'fonts')]
+    return FONT_DIRS + dirs
+
+def is_cjk(text: str) -> bool:
+    return any('\u2e80' <= ch <= '\u9fff' or '\uac00' <= ch <= '\ud7af' or '\uf900' <= ch <= '\ufaff' for ch in text)
+
+class FontRegistry:
+    """系统字体索引与 FreeTypeFont 的 LRU 缓存，线程安全"""
+
+    def __init__(self, max_fonts: int, max_masks: int):
+        self.max_fonts = max_fonts
+        self.max_masks = max_masks
+        self._lock = threading.Lock()
+        self._index: Optional[dict] = None
+        self._fonts: "OrderedDict[Tuple[str, int], ImageFont.FreeTypeFont]" = OrderedDict()
+        self._masks: "OrderedDict[Tuple[str, int, str], Tuple[Image.Image, Tuple[int, int]]]" = OrderedDict()
+        self._default: dict = {}
+
+    def index(self) -> dict:
+        """{小写的字体族名或文件名: 字体文件路径}，首次调用时扫描字体目录"""
+        with self._lock:
+            if self._index is None:
+                self._index = self._discover()
+            return self._index
+
+    @staticmethod
+    def _discover() -> dict:
+        index = {}
+        for root_dir in system_font_dirs():
+            for dirpath, _, filenames in os.walk(root_dir):
+                for filename in sorted(filenames):
+                    if not filename.lower().endswith(FONT_EXTENSIONS):
+                        continue
+                    path = os.path.join(dirpath, filename)
+                    index.setdefault(os.path.splitext(filename)[0].lower(), path)
+                    try:
+                        family, style = ImageFont.truetype(path, 10).getname()
+                    except OSError:
+                        continue
+                    # 同一族名优先记录常规字重
+                    key = (family or '').lower()
+                    if key and (key not in index or (style or '').lower() in ('regular', 'book', 'medium')):
+                        index[key] = path
+        return index
+
+    def resolve(self, font: Optional[str], text: str) -> Optional[str]:
+        """字体族名、文件名或字体文件路径 -> 字体文件路径；未指定时按文字内容选择默认字体"""
+        if font:
+            if os.path.isfile(font):
+                return font
+            path = self.index().get(font.lower())
+            if path is None:
+                raise ValueError(f"找不到字体 '{font}'")
+            return path
+        kind = 'cjk' if is_cjk(text) else 'latin'
+        if kind not in self._default:
+            self._default[kind] = self._find_default(kind)
+        return self._default[kind]
+
+    def _find_default(self, kind: str) -> Optional[str]:
+        index = self.index()
+        for family in (CJK_FAMILIES if kind == 'cjk' else LATIN_FAMILIES):
+            if family in index:
+                return index[family]
+        for path in dict.fromkeys(index.values()):
+            if kind == 'latin' or self._covers(path, '中文'):
+                return path
+        # 没有中文字体时中文会显示为方框，仍使用常规字体以保证字形风格一致
+        return self._find_default('latin') if kind == 'cjk' else None
+
+    @staticmethod
+    def _covers(path: str, text: str) -> bool:
+        """字体是否包含这些字形：缺字时渲染出的是同一个 .notdef 方框"""
+        try:
+            font = ImageFont.truetype(path, 16)
+        except OSError:
+            return False
+        missing = bytes(font.getmask('\U0010fffd'))
+        return all(bytes(font.getmask(ch)) != missing for ch in text)
+
+    def get(self, path: Optional[str], size: int) -> ImageFont.FreeTypeFont:
+        """按 (字体文件, 字号) 取缓存的字体对象；没有可用的系统字体时使用 Pillow 自带字体"""
+        key = (path or '', size)
+        with self._lock:
+            font = self._fonts.get(key)
+            if font is not None:
+                self._fonts.move_to_end(key)
+                return font
+        font = ImageFont.truetype(path, size) if path else ImageFont.load_default(size)
+        with self._lock:
+            self._fonts[key] = font
+            while len(self._fonts) > self.max_fonts:
+                self._fonts.popitem(last=False)
+        return font
+
+    def text_mask(self, text: str, size: int, font: Optional[str] = None) -> Tuple[Image.Image, Tuple[int, int]]:
+        """
+        文字的灰度蒙版及其相对绘制坐标的偏移。蒙版与 ImageDraw.text 绘制的覆盖率相同，
+        用 paste(颜色, 位置, 蒙版) 贴到图像上，结果与直接 draw.text 一致
+        """
+        path = self.resolve(font, text)
+        key = (path or '', size, text)
+        with self._lock:
+            cached = self._masks.get(key)
+            if cached is not None:
+                self._masks.move_to_end(key)
+                return cached
+        freetype = self.get(path, size)
+        left, top, right, bottom = ImageDraw.Draw(Image.new('L', (1, 1))).textbbox((0, 0), text, font=freetype)
+        mask = Image.new('L', (max(right - left, 1), max(bottom - top, 1)))
+        ImageDraw.Draw(mask).text((-left, -top), text, fill=255, font=freetype)
+        cached = (mask, (left, top))
+        with self._lock:
+            self._masks[key] = cached
+            while len(self._masks) > self.max_masks:
+                self._masks.popitem(last=False)
+        return cached
+
+font_registry = FontRegistry(FONT_CACHE_SIZE, TEXT_MASK_CACHE_SIZE)
@@ -0,0 +1,220 @@
+"""
+图像操作
+
+单步工具、process_pipeline、批量处理与分块处理共用同一组操作函数，输入输出都是内存中的 Image；
+流水线的每一步是带操作名 op 的参数模型，由 apply_step 分派
+"""
+from typing import Annotated, List, Literal, Optional, Union
+import numpy as np
+from PIL import Image, ImageColor, ImageFilter
+from pydantic import BaseModel, Field
+from encoding import has_alpha
+from fonts import font_registry
+
+FILTERS = {
+    'blur': ImageFilter.BLUR,
+    'sharpen': ImageFilter.SHARPEN,
+    'edge_enhance': ImageFilter.EDGE_ENHANCE,
+    'emboss': ImageFilter.EMBOSS,
+    'contour': ImageFilter.CONTOUR
+}
+
+def crop(img: Image.Image, left: int, top: int, right: int, bottom: int) -> Image.Image:
+    return img.crop((left, top, right, bottom))
+
+# 缩放模式对应的 reducing_gap：先按整数倍缩小（JPEG 用 draft 直接以 1/2、1/4、1/8 的 DCT 尺度解码，
+# 其他格式用 reduce），使剩余缩放比例不小于该值，再用 LANCZOS 精细重采样。None 表示按原始分辨率完整解码
+RESIZE_MODES = {
+    'quality': None,
+    'balanced': 2.0,
+    'fast': 1.0,
+}
+
+def resize(img: Image.Image, width: int, height: int, keep_aspect_ratio: bool = True, mode: str = 'balanced') -> Image.Image:
+    reducing_gap = RESIZE_MODES[mode]
+    if keep_aspect_ratio:
+        img.thumbnail((width, height), Image.Resampling.LANCZOS, reducing_gap=reducing_gap)
+        return img
+    if reducing_gap is not None:
+        # draft 只对尚未解码的 JPEG 生效，已加载的图像会直接忽略
+        img.draft(None, (int(width * reducing_gap), int(height * reducing_gap)))
+    return img.resize((width, height), Image.Resampling.LANCZOS, reducing_gap=reducing_gap)
+
+# 亮度、对比度、伽马都是逐像素的映射，预先用 numpy 算出 256 项查找表，再由 Image.point 一次完成，
+# 不必像 ImageEnhance 那样先生成一张退化图再混合。查找表按 Image.blend 的 float32 运算和截断取整生成，结果与 ImageEnhance 一致
+LUT_MODES = ('L', 'LA', 'RGB', 'RGBA')
+
+def blend_lut(base: float, factor: float) -> np.ndarray:
+    """与常数 base 混合：base + factor * (x - base)"""
+    x = np.arange(256, dtype=np.float32)
+    base = np.float32(base)
+    return np.clip(np.trunc(base + np.float32(factor) * (x - base)), 0, 255).astype(np.uint8)
+
+def gamma_lut(gamma: float) -> np.ndarray:
+    """gamma 大于 1 提亮暗部，小于 1 压暗"""
+    if gamma <= 0:
+        raise ValueError("伽马值必须大于 0")
+    x = np.arange(256, dtype=np.float64) / 255
+    return np.round(255 * x ** (1 / gamma)).astype(np.uint8)
+
+def gray_mean(img: Image.Image) -> int:
+    """与 ImageEnhance.Contrast 相同的灰度均值"""
+    histogram = np.asarray(img.convert('L').histogram(), dtype=np.float64)
+    return int((histogram * np.arange(256)).sum() / histogram.sum() + 0.5)
+
+def apply_lut(img: Image.Image, lut: np.ndarray) -> Image.Image:
+    """对颜色通道应用查找表，透明通道保持不变"""
+    table = lut.tolist()
+    tables = [table if band != 'A' else list(range(256)) for band in img.getbands()]
+    return img.point([v for t in tables for v in t])
+
+def adjust(img: Image.Image, kind: str, factor: float, mean: Optional[int] = None) -> Image.Image:
+    """kind 为 'brightness'、'contrast' 或 'gamma'；对比度的灰度均值默认取自图像本身"""
+    if img.mode not in LUT_MODES:
+        # 调色板等模式无法逐通道映射（ImageEnhance 对这些模式也会报错），先转为 RGB/RGBA
+        img = img.convert('RGBA' if has_alpha(img) else 'RGB')
+    if kind == 'gamma':
+        return apply_lut(img, gamma_lut(factor))
+    elif kind == 'brightness':
+        return apply_lut(img, blend_lut(0, factor))
+    return apply_lut(img, blend_lut(gray_mean(img) if mean is None else mean, factor))
+
+def apply_filter(img: Image.Image, filter_type: str) -> Image.Image:
+    if filter_type not in FILTERS:
+        raise ValueError(f"不支持的滤镜类型 '{filter_type}'")
+    return img.filter(FILTERS[filter_type])
+
+def add_text(img: Image.Image, text: str, x: int, y: int, font_size: int = 20, color: str = "black",
+             font: Optional[str] = None) -> Image.Image:
+    if img.mode != "RGBA":
+        img = img.convert("RGBA")
+    mask, (left, top) = font_registry.text_mask(text, font_size, font)
+    img.paste(ImageColor.getcolor(color, "RGBA"), (x + left, y + top), mask)
+    return img
+
+def add_text_layers(img: Image.Image, layers: List[BaseModel]) -> Image.Image:
+    """一次添加多段文字，只转换一次色彩模式"""
+    for layer in layers:
+        img = add_text(img, **layer.model_dump())
+    return img
+
+def flip(img: Image.Image, direction: str) -> Image.Image:
+    if direction == 'horizontal':
+        return img.transpose(Image.FLIP_LEFT_RIGHT)
+    elif direction == 'vertical':
+        return img.transpose(Image.FLIP_TOP_BOTTOM)
+    raise ValueError(f"不支持的翻转方向 '{direction}'")
+
+def add_border(img: Image.Image, border_width: int, color: str = "black") -> Image.Image:
+    width, height = img.size
+    new_width, new_height = width + 2 * border_width, height + 2 * border_width
+    # 常见模式直接按原模式建画布，避免转换为 RGBA；其他模式（如调色板）仍转为 RGBA
+    mode = img.mode if img.mode in LUT_MODES else "RGBA"
+    bordered_img = Image.new(mode, (new_width, new_height), color)
+    bordered_img.paste(img if img.mode == mode else img.convert(mode), (border_width, border_width))
+    return bordered_img
+
+def repair(img: Image.Image, radius: int = 2) -> Image.Image:
+    return img.filter(ImageFilter.MedianFilter(size=radius * 2 + 1))
+
+# ========== 参数模型 ==========
+# 各操作的参数，单步工具在此基础上加上图片来源，流水线步骤加上操作名 op
+class CropParams(BaseModel):
+    left: Annotated[int, Field(description="左边界坐标")]
+    top: Annotated[int, Field(description="上边界坐标")]
+    right: Annotated[int, Field(description="右边界坐标")]
+    bottom: Annotated[int, Field(description="下边界坐标")]
+
+class ResizeParams(BaseModel):
+    width: Annotated[int, Field(description="目标宽度")]
+    height: Annotated[int, Field(description="目标高度")]
+    keep_aspect_ratio: Annotated[bool, Field(default=True, description="是否保持原始宽高比")]
+    mode: Annotated[Literal['quality', 'balanced', 'fast'], Field(default='balanced', description="缩放模式：quality 按原始分辨率解码后缩放；balanced 先按整数倍快速缩小到目标尺寸的2倍以上再精细缩放，效果几乎相同；fast 直接缩小到接近目标尺寸，大图最快、内存最省")]
+
+class AdjustParams(BaseModel):
+    factor: Annotated[float, Field(description="调整因子 (0.0-2.0, 1.0为原始值)；伽马调整时为伽马值，大于 1 提亮暗部")]
+
+class FilterParams(BaseModel):
+    filter_type: Annotated[str, Field(description="滤镜类型，可选值: 'blur', 'sharpen', 'edge_enhance', 'emboss', 'contour'")]
+
+class TextParams(BaseModel):
+    text: Annotated[str, Field(description="要添加的文字")]
+    x: Annotated[int, Field(description="文字的 x 坐标")]
+    y: Annotated[int, Field(description="文字的 y 坐标")]
+    font_size: Annotated[int, Field(default=20, description="字体大小")]
+    color: Annotated[str, Field(default="black", description="文字颜色 (如 'black', 'white', 'red', '#FF0000')")]
+    font: Annotated[Optional[str], Field(default=None, description="可选，字体族名（如 'Noto Sans CJK SC'）、字体文件名或字体文件路径；默认按文字内容自动选择系统字体，含中文时使用中文字体")]
+
+class FlipParams(BaseModel):
+    direction: Annotated[str, Field(description="翻转方向，可选值: 'horizontal', 'vertical'")]
+
+class BorderParams(BaseModel):
+    border_width: Annotated[int, Field(description="边框宽度（像素）")]
+    color: Annotated[str, Field(default="black", description="边框颜色 (如 'black', 'white', 'red', '#FF0000')")]
+
+class RepairParams(BaseModel):
+    radius: Annotated[int, Field(default=2, description="滤波器半径，值越大修复效果越强但可能会模糊图像")]
+
+class TextLayersParams(BaseModel):
+    layers: Annotated[List[TextParams], Field(min_length=1, description="要添加的文字列表，按顺序绘制")]
+
+class CropStep(CropParams):
+    op: Literal['crop']
+
+class ResizeStep(ResizeParams):
+    op: Literal['resize']
+
+class AdjustStep(AdjustParams):
+    op: Literal['brightness', 'contrast', 'gamma']
+
+class FilterStep(FilterParams):
+    op: Literal['filter']
+
+class TextStep(TextParams):
+    op: Literal['text']
+
+class TextLayersStep(TextLayersParams):
+    op: Literal['text_layers']
+
+class FlipStep(FlipParams):
+    op: Literal['flip']
+
+class BorderStep(BorderParams):
+    op: Literal['border']
+
+class RepairStep(RepairParams):
+    op: Literal['repair']
+
+PipelineStep = Annotated[
+    Union[CropStep, ResizeStep, AdjustStep, FilterStep, TextStep, TextLayersStep, FlipStep, BorderStep, RepairStep],
+    Field(discriminator='op'),
+]
+
+def apply_step(img: Image.Image, step: BaseModel) -> Image.Image:
+    """执行流水线中的一步"""
+    params = step.model_dump(exclude={'op'})
+    if step.op == 'crop':
+        return crop(img, **params)
+    elif step.op == 'resize':
+        return resize(img, **params)
+    elif step.op in ('brightness', 'contrast', 'gamma'):
+        return adjust(img, step.op, **params)
+    elif step.op == 'filter':
+        return apply_filter(img, **params)
+    elif step.op == 'text':
+        return add_text(img, **params)
+    elif step.op == 'text_layers':
+        return add_text_layers(img, step.layers)
+    elif step.op == 'flip':
+        return flip(img, **params)
+    elif step.op == 'border':
+        return add_border(img, **params)
+    elif step.op == 'repair':
+        return repair(img, **params)
+    raise ValueError(f"不支持的操作 '{step.op}'")
+
+def run_pipeline(img: Image.Image, steps: List[BaseModel]) -> Image.Image:
+    """在同一个内存图像上依次执行全部操作，中间不做编码"""
+    for step in steps:
+        img = apply_step(img, step)
+    return img
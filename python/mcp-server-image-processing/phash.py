@@ -0,0 +1,287 @@
+"""
+感知哈希
+
+aHash / dHash / pHash 均为 64 位：先把图像缩成很小的灰度图（JPEG 用 draft 按 1/8 尺度解码，几乎不花时间），
+一批图像叠成一个数组后用 numpy 一次算完，pHash 的二维 DCT 用预先算好的 DCT 矩阵做两次矩阵乘法。
+哈希保存在本地 SQLite 索引中，查询时把全部哈希放在内存的 uint64 数组里，
+距离不超过 3 时按 4 个 16 位分段做多重索引（两个哈希距离 ≤3 则至少有一段完全相同），更大的距离做向量化的异或计数全表扫描
+"""
+from contextlib import closing
+from typing import Annotated, List, Literal, Optional, Tuple
+import asyncio
+import hashlib
+import io
+import os
+import sqlite3
+import threading
+import time
+import numpy as np
+from PIL import Image
+from pydantic import BaseModel, Field
+from store import RESULT_URI_SCHEME
+from workers import BATCH_WORKERS, get_batch_pool, collect_sources, read_source
+
+# 感知哈希索引（SQLite）的位置
+HASH_INDEX_PATH = os.getenv('IMAGE_HASH_INDEX') or os.path.join(os.path.expanduser('~'), '.mcp_image_processing', 'hash_index.sqlite3')
+
+HASH_TYPES = ('ahash', 'dhash', 'phash')
+HASH_BANDS = 4
+
+def dct_matrix(n: int) -> np.ndarray:
+    """正交 DCT-II 矩阵，X 的二维 DCT 为 D @ X @ D.T"""
+    k = np.arange(n)
+    matrix = np.cos(np.pi * (2 * k[None, :] + 1) * k[:, None] / (2 * n)) * np.sqrt(2 / n)
+    matrix[0] /= np.sqrt(2)
+    return matrix.astype(np.float32)
+
+DCT32 = dct_matrix(32)
+
+def pack_bits(bits: np.ndarray) -> np.ndarray:
+    """(N, 64) 的布尔数组 -> (N,) 的 uint64"""
+    return np.packbits(bits.reshape(len(bits), 64), axis=1).view('>u8').ravel().astype(np.uint64)
+
+def hash_thumbnails(img: Image.Image) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """三种哈希所需的灰度缩略图：8x8、9x8、32x32"""
+    img.draft('L', (64, 64))
+    gray = img.convert('L')
+    return (np.asarray(gray.resize((8, 8), Image.Resampling.BOX), dtype=np.float32),
+            np.asarray(gray.resize((9, 8), Image.Resampling.BOX), dtype=np.float32),
+            np.asarray(gray.resize((32, 32), Image.Resampling.LANCZOS), dtype=np.float32))
+
+def compute_hashes(thumbnails: List[Tuple[np.ndarray, np.ndarray, np.ndarray]]) -> dict:
+    """一批缩略图的三种哈希，{类型: (N,) uint64}"""
+    small = np.stack([t[0] for t in thumbnails])
+    wide = np.stack([t[1] for t in thumbnails])
+    large = np.stack([t[2] for t in thumbnails])
+    # aHash：各像素是否高于均值；dHash：每行相邻像素是否变亮
+    ahash = pack_bits(small > small.mean(axis=(1, 2), keepdims=True))
+    dhash = pack_bits(wide[:, :, 1:] > wide[:, :, :-1])
+    # pHash：32x32 的 DCT 取左上角 8x8 的低频系数，与中位数（不含直流分量）比较
+    low = (DCT32 @ large @ DCT32.T)[:, :8, :8].reshape(len(large), 64)
+    median = np.median(low[:, 1:], axis=1, keepdims=True)
+    phash = pack_bits(low > median)
+    return {'ahash': ahash, 'dhash': dhash, 'phash': phash}
+
+def hash_item(path: Optional[str], data: Optional[bytes]) -> dict:
+    """在工作进程中读取一张图片，返回内容 SHA-256、尺寸和缩略图（哈希在主进程中成批计算）"""
+    if data is None:
+        with open(path, 'rb') as f:
+            data = f.read()
+    with Image.open(io.BytesIO(data)) as img:
+        size = img.size
+        thumbnails = hash_thumbnails(img)
+    return {"sha256": hashlib.sha256(data).hexdigest(), "width": size[0], "height": size[1], "thumbnails": thumbnails}
+
+async def hash_sources(sources: List[str]) -> List[dict]:
+    """并行读取全部来源并计算哈希，每项为 {sha256, width, height, ahash, dhash, phash} 或 {error}"""
+    pool = get_batch_pool()
+    loop = asyncio.get_running_loop()
+    in_flight = asyncio.Semaphore(BATCH_WORKERS * 2)
+
+    async def one(source: str) -> dict:
+        async with in_flight:
+            try:
+                path, data = await read_source(source)
+                return await loop.run_in_executor(pool, hash_item, path, data)
+            except Exception as e:
+                return {"error": str(e)}
+
+    items = await asyncio.gather(*(one(source) for source in sources))
+    ok = [item for item in items if "error" not in item]
+    if ok:
+        hashes = compute_hashes([item.pop("thumbnails") for item in ok])
+        for i, item in enumerate(ok):
+            for kind in HASH_TYPES:
+                item[kind] = int(hashes[kind][i])
+    return items
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+def hash_key(source: str, item: dict) -> str:
+    """索引中的键：URL 和文件路径用来源本身，Base64 用内容哈希"""
+    if source.startswith(('http://', 'https://', 'file://', f'{RESULT_URI_SCHEME}://')) or os.path.exists(source):
+        return source
+    return 'sha256:' + item["sha256"]
+
+class HashIndex:
+    """感知哈希索引，SQLite 持久化，首次查询时整体载入内存"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._rows: List[dict] = []
+        self._positions: dict = {}
+        self._arrays: dict = {}
+        self._bands: dict = {}
+
+    def _connect(self) -> sqlite3.Connection:
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        conn = sqlite3.connect(self.path)
+        conn.execute("""CREATE TABLE IF NOT EXISTS hashes (
+            key TEXT PRIMARY KEY, sha256 TEXT, ahash TEXT, dhash TEXT, phash TEXT,
+            width INTEGER, height INTEGER, output TEXT, added_at REAL)""")
+        return conn
+
+    def _load(self) -> None:
+        if self._loaded:
+            return
+        with closing(self._connect()) as conn:
+            rows = conn.execute("SELECT key, sha256, ahash, dhash, phash, width, height, output FROM hashes").fetchall()
+        self._rows = [{"key": r[0], "sha256": r[1], "ahash": int(r[2], 16), "dhash": int(r[3], 16), "phash": int(r[4], 16),
+                       "width": r[5], "height": r[6], "output": r[7]} for r in rows]
+        self._rebuild()
+        self._loaded = True
+
+    def _rebuild(self) -> None:
+        self._positions = {row["key"]: i for i, row in enumerate(self._rows)}
+        self._arrays, self._bands = {}, {}
+        for kind in HASH_TYPES:
+            values = np.array([row[kind] for row in self._rows], dtype=np.uint64)
+            self._arrays[kind] = values
+            bands = []
+            for b in range(HASH_BANDS):
+                band: dict = {}
+                for i, v in enumerate(((values >> np.uint64(16 * b)) & np.uint64(0xFFFF)).tolist()):
+                    band.setdefault(v, []).append(i)
+                bands.append(band)
+            self._bands[kind] = bands
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._load()
+            return len(self._rows)
+
+    def add(self, items: List[dict]) -> None:
+        """写入或更新记录，每项需有 key、sha256、width、height、三种哈希，可选 output（未给出时保留原有的输出）"""
+        if not items:
+            return
+        now = time.time()
+        with self._lock:
+            self._load()
+            with closing(self._connect()) as conn, conn:
+                conn.executemany(
+                    "INSERT INTO hashes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT(key) DO UPDATE SET "
+                    "sha256=excluded.sha256, ahash=excluded.ahash, dhash=excluded.dhash, phash=excluded.phash, "
+                    "width=excluded.width, height=excluded.height, output=COALESCE(excluded.output, hashes.output), "
+                    "added_at=excluded.added_at",
+                    [(item["key"], item["sha256"], f'{item["ahash"]:016x}', f'{item["dhash"]:016x}', f'{item["phash"]:016x}',
+                      item["width"], item["height"], item.get("output"), now) for item in items])
+            for item in items:
+                row = {k: item.get(k) for k in ("key", "sha256", "ahash", "dhash", "phash", "width", "height", "output")}
+                if item["key"] in self._positions:
+                    old = self._rows[self._positions[item["key"]]]
+                    row["output"] = row["output"] or old["output"]
+                    self._rows[self._positions[item["key"]]] = row
+                else:
+                    self._rows.append(row)
+            self._rebuild()
+
+    def _candidates(self, kind: str, value: int, max_distance: int) -> np.ndarray:
+        if max_distance < HASH_BANDS:
+            rows = set()
+            for b, band in enumerate(self._bands[kind]):
+                rows.update(band.get((value >> (16 * b)) & 0xFFFF, ()))
+            return np.fromiter(rows, dtype=np.int64, count=len(rows))
+        return np.arange(len(self._rows))
+
+    def search(self, kind: str, value: int, max_distance: int, limit: int = 10, exclude: Optional[str] = None) -> List[dict]:
+        """距离不超过 max_distance 的记录，按距离从小到大"""
+        with self._lock:
+            self._load()
+            if not self._rows:
+                return []
+            rows = self._candidates(kind, value, max_distance)
+            distances = np.bitwise_count(self._arrays[kind][rows] ^ np.uint64(value))
+            hits = rows[distances <= max_distance]
+            order = np.argsort(distances[distances <= max_distance], kind='stable')
+            result = []
+            for i in hits[order]:
+                row = self._rows[i]
+                if row["key"] == exclude:
+                    continue
+                result.append({"key": row["key"], "distance": hamming(row[kind], value), "output": row["output"]})
+                if len(result) >= limit:
+                    break
+            return result
+
+    def match_processed(self, phashes: dict, max_distance: int) -> dict:
+        """{序号: pHash} 中在索引里有已处理输出（且输出文件仍存在）的近似记录 -> {序号: 最近的记录}"""
+        matches = {}
+        for index, value in phashes.items():
+            for hit in self.search('phash', value, max_distance, limit=5):
+                if hit["output"] and os.path.exists(hit["output"]):
+                    matches[index] = hit
+                    break
+        return matches
+
+hash_index = HashIndex(HASH_INDEX_PATH)
+
+def group_near_duplicates(values: np.ndarray, max_distance: int) -> List[List[int]]:
+    """批内两两比较（向量化），距离不超过 max_distance 的图片并为一组，只返回多于一张的组"""
+    n = len(values)
+    parent = list(range(n))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for i in range(n - 1):
+        close = np.flatnonzero(np.bitwise_count(values[i + 1:] ^ values[i]) <= max_distance) + i + 1
+        for j in close.tolist():
+            parent[find(j)] = find(i)
+    groups: dict = {}
+    for i in range(n):
+        groups.setdefault(find(i), []).append(i)
+    return [g for g in groups.values() if len(g) > 1]
+
+class FindSimilarImages(BaseModel):
+    sources: Annotated[Optional[List[str]], Field(default=None, description="图片来源列表 (URL、本地文件路径或 Base64 编码的图片)")]
+    pattern: Annotated[Optional[str], Field(default=None, description="本地文件的 glob 匹配模式，可与 sources 同时使用")]
+    hash_type: Annotated[Literal['ahash', 'dhash', 'phash'], Field(default='phash', description="用于比较的哈希：phash 对缩放、压缩、轻微调色最稳健；dhash 对渐变敏感；ahash 最快但最粗糙")]
+    max_distance: Annotated[int, Field(default=6, ge=0, le=32, description="视为近似重复的最大汉明距离（64 位），越小越严格")]
+    limit: Annotated[int, Field(default=5, ge=1, le=100, description="每张图片最多返回的索引匹配数")]
+    add_to_index: Annotated[bool, Field(default=True, description="是否把这批图片的哈希写入本地索引")]
+
+async def find_similar(args: FindSimilarImages) -> dict:
+    sources = collect_sources(args.sources, args.pattern)
+    started = time.monotonic()
+    items = await hash_sources(sources)
+    ok = [i for i, item in enumerate(items) if "error" not in item]
+    for i in ok:
+        items[i]["key"] = hash_key(sources[i], items[i])
+
+    def search_all() -> List[List[dict]]:
+        return [hash_index.search(args.hash_type, items[i][args.hash_type], args.max_distance, args.limit, exclude=items[i]["key"])
+                for i in ok]
+
+    matches = await asyncio.to_thread(search_all)
+    values = np.array([items[i][args.hash_type] for i in ok], dtype=np.uint64)
+    groups = [[sources[ok[j]][:200] for j in group] for group in group_near_duplicates(values, args.max_distance)]
+    if args.add_to_index:
+        await asyncio.to_thread(hash_index.add, [items[i] for i in ok])
+
+    results = []
+    for i, item in enumerate(items):
+        if "error" in item:
+            results.append({"source": sources[i][:200], "error": item["error"]})
+            continue
+        results.append({
+            "source": sources[i][:200],
+            "size": [item["width"], item["height"]],
+            "sha256": item["sha256"],
+            **{kind: f'{item[kind]:016x}' for kind in HASH_TYPES},
+            "matches": matches[ok.index(i)],
+        })
+    return {
+        "total": len(sources),
+        "hash_type": args.hash_type,
+        "max_distance": args.max_distance,
+        "duplicate_groups": groups,
+        "index_size": await asyncio.to_thread(len, hash_index),
+        "elapsed_seconds": round(time.monotonic() - started, 2),
+        "results": results,
+    }
@@ -1,65 +1,62 @@
-from typing import Annotated, Tuple, Optional, Literal
+from typing import Annotated, Tuple, Optional, Literal, List, Union, Callable
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
 import base64
 import io
 import os
-from PIL import Image, ImageFilter, ImageEnhance, ImageDraw, ImageFont
+from PIL import Image, ExifTags, UnidentifiedImageError
 from mcp.server import Server
+from mcp.server.lowlevel.helper_types import ReadResourceContents
 from mcp.server.stdio import stdio_server
+from mcp.shared.exceptions import McpError
 from mcp.types import (
     ErrorData,
     GetPromptResult,
     Prompt,
     PromptArgument,
     PromptMessage,
+    Resource,
     TextContent,
     Tool,
     INVALID_PARAMS,
     INTERNAL_ERROR,
 )
 from pydantic import BaseModel, Field
-import httpx
+# 各模块按依赖顺序：encoding/download/store/fonts 不依赖其他模块，operations 在 fonts 之上，
+# workers 提供批量处理与感知哈希共用的进程池，batch、tiled、phash 各自实现一个较大的工具
+from encoding import (
+    OutputFormatType, Animation, EncodeOptions, infer_image_format, is_multiframe, resolve_format, encode_image,
+    image_to_base64, ensure_dir_exists,
+)
+from download import close_http_client, download_bytes, fetch_head
+from store import RESULT_URI_SCHEME, StoredResult, result_store, result_uri
+from operations import (
+    CropParams, ResizeParams, AdjustParams, FilterParams, TextParams, TextLayersParams, FlipParams, BorderParams,
+    RepairParams, PipelineStep, crop, resize, adjust, apply_filter, add_text, add_text_layers, flip, add_border, repair,
+    run_pipeline,
+)
+from workers import shutdown_batch_pool
+from batch import BatchProcess, run_batch
+from tiled import TiledProcess, run_tiled
+from phash import FindSimilarImages, find_similar
+
+# get_image_info 读取远程图片时只请求开头的这部分字节（KB），解析不出文件头时再完整下载
+PROBE_KB = int(os.getenv('IMAGE_PROBE_KB', '64'))
 
-# 定义图片格式类型
-ImageFormatType = Literal['PNG', 'JPEG', 'GIF', 'BMP', 'TIFF']
+# 未指定 output_path 时，编码后不超过该大小（KB）的结果直接以 Base64 返回，更大的写入结果库只返回引用
+INLINE_MAX_KB = int(os.getenv('IMAGE_INLINE_MAX_KB', '512'))
+
+ResultModeType = Literal['auto', 'base64', 'file', 'resource']
 
 async def download_image(url: str) -> Image.Image:
     """从 URL 下载图片并返回 PIL Image 对象"""
-    async with httpx.AsyncClient() as client:
-        response = await client.get(url)
-        response.raise_for_status()
-        return Image.open(io.BytesIO(response.content))
-
-def image_to_base64(img: Image.Image, format: ImageFormatType = "PNG") -> str:
-    """将 PIL 图像转换为 base64 字符串"""
-    buffer = io.BytesIO()
-    img.save(buffer, format=format)
-    return base64.b64encode(buffer.getvalue()).decode('utf-8')
+    return Image.open(io.BytesIO(await download_bytes(url)))
 
 def base64_to_image(base64_str: str) -> Image.Image:
     """将 base64 字符串转换为 PIL 图像"""
     img_data = base64.b64decode(base64_str)
     return Image.open(io.BytesIO(img_data))
 
-def infer_image_format(file_path: str) -> ImageFormatType:
-    """从文件路径推断图像格式"""
-    ext = os.path.splitext(file_path)[1].lower()
-    if ext in ['.jpg', '.jpeg']:
-        return 'JPEG'
-    elif ext == '.gif':
-        return 'GIF'
-    elif ext == '.bmp':
-        return 'BMP'
-    elif ext == '.tiff':
-        return 'TIFF'
-    else:
-        return 'PNG'  # 默认使用 PNG
-
-def ensure_dir_exists(file_path: str) -> None:
-    """确保文件所在的目录存在"""
-    directory = os.path.dirname(file_path)
-    if directory and not os.path.exists(directory):
-        os.makedirs(directory)
-
 async def get_image(image_source: str) -> Image.Image:
     """从 URL、本地文件路径或 base64 字符串获取图像"""
     if image_source.startswith('http://') or image_source.startswith('https://'):
@@ -67,6 +64,8 @@ async def get_image(image_source: str) -> Image.Image:
     elif image_source.startswith('file://'):
         file_path = image_source[7:]
         return Image.open(file_path)
+    elif image_source.startswith(f'{RESULT_URI_SCHEME}://'):
+        return Image.open(result_store.path_for(image_source[len(RESULT_URI_SCHEME) + 3:]))
     elif os.path.exists(image_source):
         return Image.open(image_source)
     else:
@@ -75,48 +74,172 @@ async def get_image(image_source: str) -> Image.Image:
         except Exception as e:
             raise ValueError(f"无法从提供的源加载图片: {str(e)}")
 
-
-
-def save_result_image(img: Image.Image, output_path: Optional[str]) -> str:
-    """保存处理后的图像或返回base64编码"""
-    if output_path:
-        ensure_dir_exists(output_path)
-        format = infer_image_format(output_path)
-        img.save(output_path, format=format)
-        return f"图片已成功保存到 {output_path}"
+# ========== 图片信息 ==========
+# 只解析文件头，不解码像素：PIL 的 open 是惰性的，尺寸、模式、EXIF 等都来自文件头
+
+# 描述文件结构而非图像内容的标签（条带/块的偏移与字节数、编码参数、子 IFD 指针等），大 TIFF 中是很长的整数数组
+EXIF_STRUCTURAL_TAGS = frozenset((
+    'ImageWidth', 'ImageLength', 'BitsPerSample', 'Compression', 'PhotometricInterpretation', 'FillOrder',
+    'StripOffsets', 'SamplesPerPixel', 'RowsPerStrip', 'StripByteCounts', 'PlanarConfiguration', 'FreeOffsets',
+    'FreeByteCounts', 'Predictor', 'ColorMap', 'TileWidth', 'TileLength', 'TileOffsets', 'TileByteCounts',
+    'SubIFDs', 'ExtraSamples', 'SampleFormat', 'JPEGTables', 'JPEGInterchangeFormat', 'JPEGInterchangeFormatLength',
+    'YCbCrSubSampling', 'ExifOffset', 'GPSInfo',
+))
+
+def exif_summary(img: Image.Image, max_length: int = 100) -> dict:
+    """主 IFD 与 Exif IFD 中描述图像的标签，跳过文件结构标签和二进制数据，过长的值截断"""
+    exif = img.getexif()
+    tags = dict(exif)
+    try:
+        tags.update(exif.get_ifd(ExifTags.IFD.Exif))
+    except Exception:
+        pass
+    summary = {}
+    for tag, value in tags.items():
+        name = ExifTags.TAGS.get(tag)
+        if name is None or name in EXIF_STRUCTURAL_TAGS or isinstance(value, bytes):
+            continue
+        text = str(value)
+        summary[name] = text if len(text) <= max_length else text[:max_length] + '...'
+    return summary
+
+def read_image_info(img: Image.Image, file_size: Optional[int], complete: bool = True) -> dict:
+    """
+    从已打开（未解码）的图像读取信息。complete 为 False 表示只有文件开头的部分数据，
+    此时 GIF/TIFF 的帧数需要扫描整个文件，记为未知
+    """
+    frames = None
+    if complete or img.format not in ('GIF', 'TIFF'):
+        try:
+            frames = getattr(img, 'n_frames', 1)
+        except Exception:
+            frames = None
+    dpi = img.info.get('dpi')
+    try:
+        exif = exif_summary(img)
+    except Exception:
+        exif = {}
+    return {
+        "尺寸": f"{img.width} x {img.height} 像素",
+        "格式": img.format if img.format else "未知",
+        "模式": img.mode,
+        "色彩空间": "RGB" if img.mode == "RGB" else "RGBA" if img.mode == "RGBA" else img.mode,
+        "文件大小": f"{file_size} 字节" if file_size is not None else "未知",
+        "DPI": [round(float(v), 2) for v in dpi] if dpi else None,
+        "帧数": frames if frames is not None else "未知",
+        "动画": bool(getattr(img, 'is_animated', False)) if frames is not None else "未知",
+        "EXIF": exif,
+    }
+
+def probe_file(path: str) -> dict:
+    with Image.open(path) as img:
+        return read_image_info(img, os.path.getsize(path))
+
+def probe_bytes(data: bytes, file_size: Optional[int], complete: bool) -> dict:
+    with Image.open(io.BytesIO(data)) as img:
+        return read_image_info(img, file_size, complete)
+
+async def probe_image(image_source: str) -> dict:
+    """读取图片信息，远程图片只下载文件头，本地文件和 Base64 不解码像素"""
+    if image_source.startswith('http://') or image_source.startswith('https://'):
+        data, total = await fetch_head(image_source, PROBE_KB * 1024)
+        complete = total is not None and len(data) >= total
+        try:
+            return await asyncio.to_thread(probe_bytes, data, total, complete)
+        except (UnidentifiedImageError, OSError, SyntaxError):
+            if complete:
+                raise
+            # 文件头超出了预读范围（如元数据在文件末尾的 TIFF），退回完整下载
+            data = await download_bytes(image_source)
+            return await asyncio.to_thread(probe_bytes, data, len(data), True)
+    elif image_source.startswith('file://'):
+        return await asyncio.to_thread(probe_file, image_source[7:])
+    elif image_source.startswith(f'{RESULT_URI_SCHEME}://'):
+        return await asyncio.to_thread(probe_file, result_store.path_for(image_source[len(RESULT_URI_SCHEME) + 3:]))
+    elif os.path.exists(image_source):
+        return await asyncio.to_thread(probe_file, image_source)
+    else:
+        try:
+            data = base64.b64decode(image_source)
+        except Exception as e:
+            raise ValueError(f"无法从提供的源加载图片: {str(e)}")
+        return await asyncio.to_thread(probe_bytes, data, len(data), True)
+
+# ========== 返回结果 ==========
+def describe_stored(img: Union[Image.Image, Animation], stored: StoredResult, result_mode: str) -> str:
+    """结果库中结果的引用与元数据"""
+    info = {
+        "uri": result_uri(os.path.basename(stored.path)) if result_mode == 'resource' else 'file://' + stored.path,
+        "path": stored.path,
+        "format": stored.format,
+        "width": img.width,
+        "height": img.height,
+        "frames": len(img.frames) if isinstance(img, Animation) else 1,
+        "bytes": stored.size,
+        "sha256": stored.sha256,
+    }
+    return str(info)
+
+def save_result_image(img: Union[Image.Image, Animation], args: "ImageProcessingBase") -> str:
+    """
+    保存处理后的图像，或按 result_mode 返回结果：
+    base64 直接返回编码；file / resource 写入结果库并返回 file:// 路径或 image-result:// 资源 URI；
+    auto 在编码结果不超过 IMAGE_INLINE_MAX_KB 时返回 Base64，否则写入结果库返回 file:// 路径
+    """
+    options = args.encode_options()
+    format = resolve_format(options, img, args.output_path)
+    if args.output_path:
+        ensure_dir_exists(args.output_path)
+        encode_image(img, args.output_path, format, options)
+        return f"图片已成功保存到 {args.output_path}（{format}，{os.path.getsize(args.output_path)} 字节）"
+    elif args.result_mode == 'base64':
+        return image_to_base64(img, format, options)
+    elif args.result_mode in ('file', 'resource'):
+        return describe_stored(img, result_store.put_image(img, format, options), args.result_mode)
     else:
-        return image_to_base64(img)
+        buffer = io.BytesIO()
+        encode_image(img, buffer, format, options)
+        if buffer.tell() <= INLINE_MAX_KB * 1024:
+            return base64.b64encode(buffer.getbuffer()).decode('ascii')
+        return describe_stored(img, result_store.put_bytes(buffer.getbuffer(), format), 'file')
 
+# ========== 参数模型 ==========
 class ImageProcessingBase(BaseModel):
     image_source: Annotated[str, Field(description="图片来源 (URL、本地文件路径或 Base64 编码的图片)")]
-    output_path: Annotated[Optional[str], Field(default=None, description="可选，保存结果的本地文件路径。如果不提供，则返回 Base64 编码的图片。")]
+    output_path: Annotated[Optional[str], Field(default=None, description="可选，保存结果的本地文件路径。如果不提供，则按 result_mode 返回结果。")]
+    result_mode: Annotated[ResultModeType, Field(default='auto', description="未提供 output_path 时的返回方式：auto 小图返回 Base64、大图写入结果库返回 file:// 路径；base64 总是返回 Base64；file 返回结果库中的 file:// 路径；resource 返回可通过 MCP 资源读取的 image-result:// URI")]
+    output_format: Annotated[Optional[OutputFormatType], Field(default=None, description="可选，输出格式。默认按 output_path 的扩展名（未提供路径时为 PNG）；auto 按内容选择：图形类用 PNG，照片用 JPEG，带透明的照片用 WEBP")]
+    quality: Annotated[Optional[int], Field(default=None, ge=1, le=100, description="可选，JPEG/WEBP 的压缩质量 (1-100)，默认 JPEG 85、WEBP 80")]
+    optimize: Annotated[bool, Field(default=False, description="是否进行额外的压缩优化（编码更慢，文件更小）")]
+    compress_level: Annotated[Optional[int], Field(default=None, ge=0, le=9, description="可选，PNG 的 zlib 压缩级别 (0-9)，越小编码越快、文件越大")]
+    lossless: Annotated[bool, Field(default=False, description="WEBP 是否使用无损压缩")]
+
+    def encode_options(self) -> EncodeOptions:
+        return EncodeOptions(self.output_format, self.quality, self.optimize, self.compress_level, self.lossless)
+
+class CropImage(CropParams, ImageProcessingBase):
+    pass
 
-class CropImage(ImageProcessingBase):
-    left: Annotated[int, Field(description="左边界坐标")]
-    top: Annotated[int, Field(description="上边界坐标")]
-    right: Annotated[int, Field(description="右边界坐标")]
-    bottom: Annotated[int, Field(description="下边界坐标")]
+class ResizeImage(ResizeParams, ImageProcessingBase):
+    pass
 
-class ResizeImage(ImageProcessingBase):
-    width: Annotated[int, Field(description="目标宽度")]
-    height: Annotated[int, Field(description="目标高度")]
-    keep_aspect_ratio: Annotated[bool, Field(default=True, description="是否保持原始宽高比")]
+class AdjustImage(AdjustParams, ImageProcessingBase):
+    pass
 
-class AdjustImage(ImageProcessingBase):
-    factor: Annotated[float, Field(description="调整因子 (0.0-2.0, 1.0为原始值)")]
+class ApplyFilter(FilterParams, ImageProcessingBase):
+    pass
 
-class ApplyFilter(ImageProcessingBase):
-    filter_type: Annotated[str, Field(description="滤镜类型，可选值: 'blur', 'sharpen', 'edge_enhance', 'emboss', 'contour'")]
+class AddText(TextParams, ImageProcessingBase):
+    pass
 
-class AddText(ImageProcessingBase):
-    text: Annotated[str, Field(description="要添加的文字")]
-    x: Annotated[int, Field(description="文字的 x 坐标")]
-    y: Annotated[int, Field(description="文字的 y 坐标")]
-    font_size: Annotated[int, Field(default=20, description="字体大小")]
-    color: Annotated[str, Field(default="black", description="文字颜色 (如 'black', 'white', 'red', '#FF0000')")]
+class AddTextLayers(TextLayersParams, ImageProcessingBase):
+    pass
 
-class FlipImage(ImageProcessingBase):
-    direction: Annotated[str, Field(description="翻转方向，可选值: 'horizontal', 'vertical'")]
+class FlipImage(FlipParams, ImageProcessingBase):
+    pass
+
+class GetImageInfo(BaseModel):
+    image_source: Annotated[str, Field(description="图片来源 (URL、本地文件路径或 Base64 编码的图片)")]
 
 class MergeImages(BaseModel):
     image1_source: Annotated[str, Field(description="第一张图片的来源 (URL、本地文件路径或 Base64 编码的图片)（背景图）")]
@@ -124,13 +247,30 @@ class MergeImages(BaseModel):
     position: Annotated[Tuple[int, int], Field(description="放置第二张图片的位置坐标 (x, y)")]
     output_path: Annotated[Optional[str], Field(default=None, description="可选，保存结果的本地文件路径。如果不提供，则返回 Base64 编码的图片。")]
 
-class AddBorder(ImageProcessingBase):
-    border_width: Annotated[int, Field(description="边框宽度（像素）")]
-    color: Annotated[str, Field(default="black", description="边框颜色 (如 'black', 'white', 'red', '#FF0000')")]
+class AddBorder(BorderParams, ImageProcessingBase):
+    pass
+
+class RepairImage(RepairParams, ImageProcessingBase):
+    pass
+
+class ProcessPipeline(ImageProcessingBase):
+    operations: Annotated[List[PipelineStep], Field(min_length=1, description="按顺序执行的操作列表，每项用 op 指定操作（crop/resize/brightness/contrast/gamma/filter/text/text_layers/flip/border/repair）并给出该操作的参数")]
 
-class RepairImage(ImageProcessingBase):
-    radius: Annotated[int, Field(default=2, description="滤波器半径，值越大修复效果越强但可能会模糊图像")]
+# 逐帧处理用线程池：Pillow 的缩放、滤镜、查找表等运算在 C 代码中释放 GIL，线程可以并行，且不必在进程间复制帧数据
+FRAME_WORKERS = int(os.getenv('IMAGE_FRAME_WORKERS', '0')) or os.cpu_count() or 1
+frame_pool = ThreadPoolExecutor(max_workers=FRAME_WORKERS, thread_name_prefix='frame')
 
+async def apply_frames(img: Image.Image, func: Callable[[Image.Image], Image.Image]) -> Union[Image.Image, Animation]:
+    """
+    在线程池中对图像执行 func，不阻塞事件循环。多帧图像的每一帧并行处理，返回 Animation；
+    单帧图像直接传入原对象（保留惰性加载，如 JPEG 的 draft 缩放）
+    """
+    loop = asyncio.get_running_loop()
+    if not is_multiframe(img):
+        return await loop.run_in_executor(frame_pool, func, img)
+    animation = await loop.run_in_executor(frame_pool, Animation.from_image, img)
+    frames = await asyncio.gather(*(loop.run_in_executor(frame_pool, func, frame) for frame in animation.frames))
+    return animation.with_frames(list(frames))
 
 async def serve() -> None:
     server = Server("mcp-image-processing")
@@ -142,12 +282,18 @@ async def serve() -> None:
             Tool(name="resize_image", description="调整图片的尺寸", inputSchema=ResizeImage.model_json_schema()),
             Tool(name="adjust_brightness", description="调整图片亮度", inputSchema=AdjustImage.model_json_schema()),
             Tool(name="adjust_contrast", description="调整图片对比度", inputSchema=AdjustImage.model_json_schema()),
+            Tool(name="adjust_gamma", description="调整图片伽马值", inputSchema=AdjustImage.model_json_schema()),
             Tool(name="apply_filter", description="应用滤镜效果到图片", inputSchema=ApplyFilter.model_json_schema()),
             Tool(name="add_text", description="在图片上添加文字", inputSchema=AddText.model_json_schema()),
+            Tool(name="add_text_layers", description="在图片上一次添加多段文字（如水印、标题、说明）", inputSchema=AddTextLayers.model_json_schema()),
             Tool(name="flip_image", description="水平或垂直翻转图片", inputSchema=FlipImage.model_json_schema()),
             Tool(name="add_border", description="给图片添加边框", inputSchema=AddBorder.model_json_schema()),
             Tool(name="repair_image", description="修复图片中的小缺陷", inputSchema=RepairImage.model_json_schema()),
-            Tool(name="get_image_info", description="获取图片的基本信息", inputSchema=ImageProcessingBase.model_json_schema()),
+            Tool(name="process_pipeline", description="对一张图片依次执行多个操作（裁切、缩放、亮度、对比度、滤镜、文字、翻转、边框、修复），只解码和编码一次", inputSchema=ProcessPipeline.model_json_schema()),
+            Tool(name="batch_process", description="对多张图片（列表或 glob 匹配）并行执行同一组操作并保存到目录，支持进度通知", inputSchema=BatchProcess.model_json_schema()),
+            Tool(name="process_tiled", description="分块处理超大图像（亮度/对比度/伽马/滤镜/修复），结果逐块写入 TIFF 文件；TIFF 输入只解码与当前块相交的条带/块，其他格式需整幅解码（受 IMAGE_TILED_DECODE_MAX_MP 限制），支持进度通知", inputSchema=TiledProcess.model_json_schema()),
+            Tool(name="find_similar_images", description="计算一批图片的感知哈希（aHash/dHash/pHash），在本地索引中查找相同或近似的图片并找出批内重复", inputSchema=FindSimilarImages.model_json_schema()),
+            Tool(name="get_image_info", description="获取图片的基本信息（尺寸、格式、模式、文件大小、DPI、帧数、EXIF），只读取文件头", inputSchema=GetImageInfo.model_json_schema()),
         ]
 
     @server.call_tool()
@@ -156,80 +302,71 @@ async def serve() -> None:
             if name == "crop_image":
                 args = CropImage(**arguments)
                 img = await get_image(args.image_source)
-                cropped_img = img.crop((args.left, args.top, args.right, args.bottom))
-                result = save_result_image(cropped_img, args.output_path)
+                result = save_result_image(await apply_frames(img, lambda im: crop(im, args.left, args.top, args.right, args.bottom)), args)
             elif name == "resize_image":
                 args = ResizeImage(**arguments)
                 img = await get_image(args.image_source)
-                if args.keep_aspect_ratio:
-                    img.thumbnail((args.width, args.height), Image.Resampling.LANCZOS)
-                else:
-                    img = img.resize((args.width, args.height), Image.Resampling.LANCZOS)
-                result = save_result_image(img, args.output_path)
-            elif name in ["adjust_brightness", "adjust_contrast"]:
+                result = save_result_image(await apply_frames(img, lambda im: resize(im, args.width, args.height, args.keep_aspect_ratio, args.mode)), args)
+            elif name in ["adjust_brightness", "adjust_contrast", "adjust_gamma"]:
                 args = AdjustImage(**arguments)
                 img = await get_image(args.image_source)
-                enhancer = getattr(ImageEnhance, name.split('_')[1].capitalize())(img)
-                adjusted_img = enhancer.enhance(args.factor)
-                result = save_result_image(adjusted_img, args.output_path)
+                result = save_result_image(await apply_frames(img, lambda im: adjust(im, name.split('_')[1], args.factor)), args)
             elif name == "apply_filter":
                 args = ApplyFilter(**arguments)
                 img = await get_image(args.image_source)
-                filters = {
-                    'blur': ImageFilter.BLUR,
-                    'sharpen': ImageFilter.SHARPEN,
-                    'edge_enhance': ImageFilter.EDGE_ENHANCE,
-                    'emboss': ImageFilter.EMBOSS,
-                    'contour': ImageFilter.CONTOUR
-                }
-                if args.filter_type not in filters:
-                    raise ValueError(f"不支持的滤镜类型 '{args.filter_type}'")
-                filtered_img = img.filter(filters[args.filter_type])
-                result = save_result_image(filtered_img, args.output_path)
+                result = save_result_image(await apply_frames(img, lambda im: apply_filter(im, args.filter_type)), args)
             elif name == "add_text":
                 args = AddText(**arguments)
                 img = await get_image(args.image_source)
-                img = img.convert("RGBA")
-                draw = ImageDraw.Draw(img)
-                try:
-                    font = ImageFont.truetype("arial.ttf", args.font_size)
-                except IOError:
-                    font = ImageFont.load_default()
-                draw.text((args.x, args.y), args.text, fill=args.color, font=font)
-                result = save_result_image(img, args.output_path)
+                result = save_result_image(await apply_frames(img, lambda im: add_text(im, args.text, args.x, args.y, args.font_size, args.color, args.font)), args)
+            elif name == "add_text_layers":
+                args = AddTextLayers(**arguments)
+                img = await get_image(args.image_source)
+                result = save_result_image(await apply_frames(img, lambda im: add_text_layers(im, args.layers)), args)
             elif name == "flip_image":
                 args = FlipImage(**arguments)
                 img = await get_image(args.image_source)
-                if args.direction == 'horizontal':
-                    flipped_img = img.transpose(Image.FLIP_LEFT_RIGHT)
-                elif args.direction == 'vertical':
-                    flipped_img = img.transpose(Image.FLIP_TOP_BOTTOM)
-                else:
-                    raise ValueError(f"不支持的翻转方向 '{args.direction}'")
-                result = save_result_image(flipped_img, args.output_path)
+                result = save_result_image(await apply_frames(img, lambda im: flip(im, args.direction)), args)
             elif name == "add_border":
                 args = AddBorder(**arguments)
                 img = await get_image(args.image_source)
-                width, height = img.size
-                new_width, new_height = width + 2 * args.border_width, height + 2 * args.border_width
-                bordered_img = Image.new("RGBA", (new_width, new_height), args.color)
-                bordered_img.paste(img, (args.border_width, args.border_width))
-                result = save_result_image(bordered_img, args.output_path)
+                result = save_result_image(await apply_frames(img, lambda im: add_border(im, args.border_width, args.color)), args)
             elif name == "repair_image":
                 args = RepairImage(**arguments)
                 img = await get_image(args.image_source)
-                repaired_img = img.filter(ImageFilter.MedianFilter(size=args.radius * 2 + 1))
-                result = save_result_image(repaired_img, args.output_path)
-            elif name == "get_image_info":
-                args = ImageProcessingBase(**arguments)
+                result = save_result_image(await apply_frames(img, lambda im: repair(im, args.radius)), args)
+            elif name == "process_pipeline":
+                args = ProcessPipeline(**arguments)
                 img = await get_image(args.image_source)
-                info = {
-                    "尺寸": f"{img.width} x {img.height} 像素",
-                    "格式": img.format if img.format else "未知",
-                    "模式": img.mode,
-                    "色彩空间": "RGB" if img.mode == "RGB" else "RGBA" if img.mode == "RGBA" else img.mode
-                }
-                result = str(info)
+                # 多步处理在线程中执行，不阻塞其他请求；只在最后编码一次
+                img = await apply_frames(img, lambda im: run_pipeline(im, args.operations))
+                result = await asyncio.to_thread(save_result_image, img, args)
+            elif name == "batch_process":
+                args = BatchProcess(**arguments)
+                ctx = server.request_context
+                progress_token = ctx.meta.progressToken if ctx.meta else None
+
+                async def report(done: int, total: int) -> None:
+                    if progress_token is not None:
+                        await ctx.session.send_progress_notification(progress_token, done, total)
+
+                result = str(await run_batch(args, report))
+            elif name == "process_tiled":
+                args = TiledProcess(**arguments)
+                ctx = server.request_context
+                progress_token = ctx.meta.progressToken if ctx.meta else None
+
+                async def report(done: int, total: int) -> None:
+                    if progress_token is not None:
+                        await ctx.session.send_progress_notification(progress_token, done, total)
+
+                result = str(await run_tiled(args, report))
+            elif name == "find_similar_images":
+                args = FindSimilarImages(**arguments)
+                result = str(await find_similar(args))
+            elif name == "get_image_info":
+                args = GetImageInfo(**arguments)
+                result = str(await probe_image(args.image_source))
             else:
                 raise ValueError(f"未知的工具名称: {name}")
 
@@ -237,6 +374,26 @@ async def serve() -> None:
         except Exception as e:
             raise McpError(ErrorData(code=INTERNAL_ERROR, message=str(e)))
 
+    @server.list_resources()
+    async def list_resources() -> list[Resource]:
+        entries = await asyncio.to_thread(result_store.list)
+        return [
+            Resource(uri=result_uri(e.name), name=e.name, mimeType=Image.MIME.get(infer_image_format(e.name)))
+            for e, _ in entries[:100]
+        ]
+
+    @server.read_resource()
+    async def read_resource(uri) -> list[ReadResourceContents]:
+        uri = str(uri)
+        if not uri.startswith(f'{RESULT_URI_SCHEME}://'):
+            raise McpError(ErrorData(code=INVALID_PARAMS, message=f"未知的资源: {uri}"))
+        try:
+            name = uri[len(RESULT_URI_SCHEME) + 3:]
+            data = await asyncio.to_thread(result_store.read, name)
+        except (ValueError, FileNotFoundError) as e:
+            raise McpError(ErrorData(code=INVALID_PARAMS, message=f"结果不存在或已被清理: {uri} ({e})"))
+        return [ReadResourceContents(content=data, mime_type=Image.MIME.get(infer_image_format(name)))]
+
     @server.list_prompts()
     async def list_prompts() -> list[Prompt]:
         return []
@@ -246,13 +403,17 @@ async def serve() -> None:
         raise McpError(ErrorData(code=INVALID_PARAMS, message="不支持的操作"))
 
     options = server.create_initialization_options()
-    async with stdio_server() as (read_stream, write_stream):
-        await server.run(read_stream, write_stream, options, raise_exceptions=True)
+    try:
+        async with stdio_server() as (read_stream, write_stream):
+            await server.run(read_stream, write_stream, options, raise_exceptions=True)
+    finally:
+        await close_http_client()
+        shutdown_batch_pool()
+        frame_pool.shutdown(wait=False, cancel_futures=True)
 
 
 def main():
     print("ImagePro is starting...")
-    import asyncio
     asyncio.run(serve())
 
 
@@ -0,0 +1,124 @@
+"""
+结果库
+
+以内容的 SHA-256 命名保存处理结果，相同结果只保存一份；通过 file:// 路径或 image-result:// 资源 URI 引用
+"""
+from dataclasses import dataclass
+from typing import List, Optional, Tuple, Union
+import hashlib
+import os
+import tempfile
+import threading
+from PIL import Image
+from encoding import Animation, EncodeOptions, encode_image
+
+# 结果库目录与总大小上限（MB）
+RESULT_DIR = os.getenv('IMAGE_RESULT_DIR') or os.path.join(tempfile.gettempdir(), 'mcp-image-results')
+RESULT_STORE_MB = int(os.getenv('IMAGE_RESULT_STORE_MB', '2048'))
+RESULT_URI_SCHEME = 'image-result'
+
+@dataclass
+class StoredResult:
+    sha256: str
+    path: str
+    format: str
+    size: int
+
+class ResultStore:
+    """
+    内容寻址的本地结果库，总大小超过上限时删除最早写入的文件
+
+    写入与清理在同一把锁内进行（工具调用在多个线程中并发写入），刚写入的文件不会被清理；
+    其他进程共用同一目录时文件可能随时被删除，找不到文件的项直接跳过。
+    """
+
+    EXTENSIONS = {'PNG': '.png', 'JPEG': '.jpg', 'WEBP': '.webp', 'GIF': '.gif', 'BMP': '.bmp', 'TIFF': '.tiff'}
+
+    def __init__(self, root: str, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def path_for(self, name: str) -> str:
+        """资源名（<sha256>.<扩展名>）对应的文件路径，名称不合法时抛出 ValueError"""
+        sha, ext = os.path.splitext(name)
+        if len(sha) != 64 or any(c not in '0123456789abcdef' for c in sha) or ext not in self.EXTENSIONS.values():
+            raise ValueError(f"无效的结果名称: {name}")
+        return os.path.join(self.root, name)
+
+    def read(self, name: str) -> bytes:
+        with open(self.path_for(name), 'rb') as f:
+            return f.read()
+
+    def _commit(self, tmp_path: str, sha: str, format: str) -> StoredResult:
+        path = os.path.join(self.root, sha + self.EXTENSIONS[format])
+        with self._lock:
+            if os.path.exists(path):
+                os.remove(tmp_path)
+                os.utime(path)
+            else:
+                os.replace(tmp_path, path)
+            size = os.path.getsize(path)
+            self._prune(keep=path)
+        return StoredResult(sha, path, format, size)
+
+    def put_bytes(self, data: memoryview, format: str) -> StoredResult:
+        """保存已编码好的图片数据"""
+        os.makedirs(self.root, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        return self._commit(tmp_path, hashlib.sha256(data).hexdigest(), format)
+
+    def put_image(self, img: Union[Image.Image, Animation], format: str, options: EncodeOptions) -> StoredResult:
+        """直接编码写入磁盘，不在内存中保留完整的编码结果"""
+        os.makedirs(self.root, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                encode_image(img, f, format, options)
+            digest = hashlib.sha256()
+            with open(tmp_path, 'rb') as f:
+                while chunk := f.read(1 << 20):
+                    digest.update(chunk)
+        except Exception:
+            os.remove(tmp_path)
+            raise
+        return self._commit(tmp_path, digest.hexdigest(), format)
+
+    def list(self) -> List[Tuple[os.DirEntry, os.stat_result]]:
+        """结果库中的全部文件及其 stat，最近写入的在前"""
+        if not os.path.isdir(self.root):
+            return []
+        entries = []
+        for entry in os.scandir(self.root):
+            if entry.name.endswith('.tmp'):
+                continue
+            try:
+                if entry.is_file():
+                    entries.append((entry, entry.stat()))
+            except FileNotFoundError:
+                continue
+        return sorted(entries, key=lambda item: item[1].st_mtime, reverse=True)
+
+    def _prune(self, keep: Optional[str] = None) -> None:
+        """删除最早写入的文件直到总大小不超过上限，keep 指定的文件（刚写入的结果）始终保留"""
+        entries = [item for item in self.list() if item[0].path != keep]
+        total = sum(stat.st_size for _, stat in entries)
+        if keep:
+            try:
+                total += os.path.getsize(keep)
+            except FileNotFoundError:
+                pass
+        while entries and total > self.max_bytes:
+            oldest, stat = entries.pop()
+            total -= stat.st_size
+            try:
+                os.remove(oldest.path)
+            except FileNotFoundError:
+                pass
+
+result_store = ResultStore(RESULT_DIR, RESULT_STORE_MB * 1024 * 1024)
+
+def result_uri(name: str) -> str:
+    return f"{RESULT_URI_SCHEME}://{name}"
@@ -0,0 +1,47 @@
+import os
+import sys
+
+from PIL import Image
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from batch import batch_output_path, process_batch_item  # noqa: E402
+from operations import FlipStep  # noqa: E402
+
+
+def test_output_path_keeps_source_extension(tmp_path):
+    used = set()
+    sources = []
+    for name in ('p0.jpg', 'anim.gif', 'scan.tiff', 'odd.xyz'):
+        path = tmp_path / name
+        path.write_bytes(b'')
+        sources.append(str(path))
+    outputs = [os.path.basename(batch_output_path(src, i, 'out', None, used)) for i, src in enumerate(sources)]
+    assert outputs == ['p0.jpg', 'anim.gif', 'scan.tiff', 'odd.png']
+
+
+def test_output_path_for_urls_and_base64():
+    used = set()
+    assert batch_output_path('https://example.com/a/photo.jpg?x=1', 0, 'out', None, used) == os.path.join('out', 'photo.jpg')
+    assert batch_output_path('iVBORw0KGgo=', 1, 'out', None, used) == os.path.join('out', 'image_00001.png')
+    assert batch_output_path('https://example.com/b/photo.jpg', 2, 'out', 'WEBP', used) == os.path.join('out', 'photo.webp')
+
+
+def test_batch_item_encodes_in_source_format(tmp_path):
+    src_jpg = tmp_path / 'p0.jpg'
+    Image.new('RGB', (16, 8), 'red').save(src_jpg)
+    src_gif = tmp_path / 'anim.gif'
+    frames = [Image.new('RGB', (16, 8), color) for color in ('red', 'green', 'blue')]
+    frames[0].save(src_gif, save_all=True, append_images=frames[1:], duration=50)
+
+    used = set()
+    steps = [FlipStep(op='flip', direction='horizontal')]
+    for src, format in ((src_jpg, 'JPEG'), (src_gif, 'GIF')):
+        output = batch_output_path(str(src), 0, str(tmp_path / 'out'), None, used)
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+        process_batch_item(str(src), None, output, steps, None)
+        assert os.path.splitext(output)[1] == src.suffix
+        with Image.open(output) as img:
+            assert img.format == format
+            if format == 'GIF':
+                assert img.n_frames == 3
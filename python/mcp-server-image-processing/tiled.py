@@ -0,0 +1,345 @@
+"""
+分块处理
+
+超大图像（如上亿像素的扫描件）按带重叠边（halo）的方块逐块处理，结果直接写入磁盘上的未压缩 TIFF，
+内存占用只与块大小和并行数有关。邻域滤镜在块的四周多读取 halo 宽度的像素，内部块的结果与整图处理完全一致。
+对比度调整所用的灰度均值按它之前的各步操作的输出逐块统计，结果也与整图处理一致。
+TIFF 输入（未压缩或 LZW/Deflate/JPEG 等压缩的条带、分块布局）只解码与当前区域相交的部分；
+其他格式只能整幅解码，像素数超过 IMAGE_TILED_DECODE_MAX_MP 时拒绝处理
+"""
+from collections import OrderedDict
+from typing import Annotated, Awaitable, Callable, List, Optional, Tuple, Union
+import asyncio
+import io
+import os
+import struct
+import threading
+import time
+import numpy as np
+from PIL import Image, ImageStat, TiffImagePlugin
+from pydantic import BaseModel, Field
+from download import download_to_file
+from encoding import infer_image_format, has_alpha, ensure_dir_exists
+from operations import FILTERS, AdjustStep, FilterStep, RepairStep, adjust, apply_step
+from store import RESULT_URI_SCHEME, result_store
+
+TILED_MODES = ('L', 'RGB', 'RGBA')
+# 需要整幅解码的输入（JPEG、PNG 等）允许的最大像素数（百万）
+TILED_DECODE_MAX_MP = int(os.getenv('IMAGE_TILED_DECODE_MAX_MP', '64'))
+# 压缩 TIFF 已解码条带/块的缓存上限；不足以容纳一带方块所需的条带/块时自动放大，避免反复解码
+TILED_CHUNK_CACHE_MB = int(os.getenv('IMAGE_TILED_CHUNK_CACHE_MB', '64'))
+# 把压缩 TIFF 的单个条带/块包装成独立 TIFF 时需要复制的标签：
+# 位深、压缩、光度解释、填充顺序、通道数、平面配置、预测器、调色板、附加通道、采样格式、JPEG 表与 YCbCr 参数
+TIFF_CHUNK_TAGS = (258, 259, 262, 266, 277, 284, 317, 320, 338, 339, 347, 529, 530, 531, 532)
+
+class TiledProcess(BaseModel):
+    image_source: Annotated[str, Field(description="图片来源 (URL 或本地文件路径)，URL 会先流式下载到临时文件")]
+    operations: Annotated[List[Annotated[Union[AdjustStep, FilterStep, RepairStep], Field(discriminator='op')]], Field(min_length=1, description="按顺序执行的操作列表，分块模式只支持逐像素或邻域操作：brightness/contrast/gamma/filter/repair")]
+    output_path: Annotated[str, Field(description="结果保存路径，必须为 .tif/.tiff 文件")]
+    tile_size: Annotated[int, Field(default=1024, ge=64, le=8192, description="分块边长（像素）")]
+
+def step_halo(step: BaseModel) -> int:
+    """操作需要的邻域半径"""
+    if step.op == 'filter':
+        if step.filter_type not in FILTERS:
+            raise ValueError(f"不支持的滤镜类型 '{step.filter_type}'")
+        return max(FILTERS[step.filter_type].filterargs[0]) // 2
+    elif step.op == 'repair':
+        return step.radius
+    return 0
+
+class RegionReader:
+    """
+    按区域读取源图像像素，返回 (高, 宽[, 通道]) 的 uint8 数组
+
+    - 未压缩、整行宽度条带的 TIFF：内存映射后直接切片
+    - 其他 TIFF（压缩或分块布局）：每个与区域相交的条带/块单独包装成一个只有一块的 TIFF 交给 Pillow 解码，
+      解码结果按 IMAGE_TILED_CHUNK_CACHE_MB 缓存，同一行的相邻方块不必重复解码
+    - 其他格式：整幅解码一次，之后按区域裁剪；像素数超过 IMAGE_TILED_DECODE_MAX_MP 时抛出 ValueError
+    """
+
+    def __init__(self, path: str):
+        # 直接构造 TiffImageFile 只解析文件头，不触发 Image.open 针对整图解码的像素数检查
+        img = None
+        try:
+            img = TiffImagePlugin.TiffImageFile(path)
+        except (SyntaxError, OSError):
+            pass
+        self._file = self._strips = self._chunks = self._image = None
+        if img is not None and self._raw_strips(img):
+            self.size, self.mode = img.size, img.mode
+            self._file = np.memmap(path, dtype=np.uint8, mode='r')
+            self._strips = self._raw_strips(img)
+        elif img is not None and self._chunk_layout(img):
+            self.size = img.size
+            self.mode = img.mode if img.mode in TILED_MODES else 'RGBA' if has_alpha(img) else 'RGB'
+            self._file = np.memmap(path, dtype=np.uint8, mode='r')
+            self._chunks = self._chunk_layout(img)
+            self._extents = np.array([(x, y, min(x + w, img.width), min(y + h, img.height))
+                                      for x, y, w, h, _, _ in self._chunks], dtype=np.int64)
+            self._tags = img.tag_v2
+            self._cache: "OrderedDict[int, np.ndarray]" = OrderedDict()
+            self._cache_bytes = 0
+            self._cache_limit = TILED_CHUNK_CACHE_MB * 1024 * 1024
+            self._cache_lock = threading.Lock()
+        else:
+            img = Image.open(path)
+            if img.width * img.height > TILED_DECODE_MAX_MP * 1_000_000:
+                raise ValueError(f"{img.format} 图像有 {img.width * img.height / 1e6:.0f} 百万像素，该格式只能整幅解码，"
+                                 f"超过了分块模式的上限 {TILED_DECODE_MAX_MP} 百万像素（IMAGE_TILED_DECODE_MAX_MP），"
+                                 f"请先转换为 TIFF（条带或分块布局，可压缩）")
+            if img.mode not in TILED_MODES:
+                img = img.convert('RGBA' if has_alpha(img) else 'RGB')
+            img.load()
+            self.size, self.mode = img.size, img.mode
+            self._image = img
+        self.channels = Image.getmodebands(self.mode)
+
+    @staticmethod
+    def _raw_strips(img: Image.Image) -> Optional[List[Tuple[int, int, int, int]]]:
+        """未压缩、整行宽度的条带：[(起始行, 结束行, 文件偏移, 每行字节数)]，其他布局返回 None"""
+        if img.mode not in TILED_MODES:
+            return None
+        width, channels = img.size[0], len(img.getbands())
+        strips = []
+        for tile in img.tile:
+            codec, (x0, y0, x1, y1), offset, args = tile
+            rawmode, stride = args[0], args[1] if len(args) > 1 else 0
+            orientation = args[2] if len(args) > 2 else 1
+            if codec != 'raw' or rawmode != img.mode or orientation != 1 or x0 != 0 or x1 != width:
+                return None
+            strips.append((y0, y1, offset, stride or width * channels))
+        return strips or None
+
+    @staticmethod
+    def _chunk_layout(img: Image.Image) -> Optional[List[Tuple[int, int, int, int, int, int]]]:
+        """各条带/块的 [(x, y, 编码宽度, 编码高度, 文件偏移, 字节数)]，各通道分开存放的 TIFF 返回 None"""
+        tags = img.tag_v2
+        if tags.get(284, 1) != 1:
+            return None
+
+        def values(tag: int) -> Tuple[int, ...]:
+            value = tags.get(tag)
+            return (value,) if isinstance(value, int) else tuple(value or ())
+
+        width, height = img.size
+        if 324 in tags:
+            tile_width, tile_height = tags[322], tags[323]
+            across = (width + tile_width - 1) // tile_width
+            return [((i % across) * tile_width, (i // across) * tile_height, tile_width, tile_height, offset, count)
+                    for i, (offset, count) in enumerate(zip(values(324), values(325)))] or None
+        rows = min(tags.get(278, height), height)
+        return [(0, i * rows, width, min(rows, height - i * rows), offset, count)
+                for i, (offset, count) in enumerate(zip(values(273), values(279)))] or None
+
+    def _decode_chunk(self, index: int) -> np.ndarray:
+        """把一个条带/块的压缩数据连同必要的标签包装成单块 TIFF 并解码"""
+        with self._cache_lock:
+            if index in self._cache:
+                self._cache.move_to_end(index)
+                return self._cache[index]
+        _, _, width, height, offset, count = self._chunks[index]
+        endian = self._tags._endian
+        header = (b'II*\x00' if endian == '<' else b'MM\x00*') + struct.pack(endian + 'I', 8)
+        ifd = TiffImagePlugin.ImageFileDirectory_v2(ifh=header)
+        for tag in TIFF_CHUNK_TAGS:
+            if tag in self._tags:
+                ifd[tag] = self._tags[tag]
+                ifd.tagtype[tag] = self._tags.tagtype[tag]
+        for tag, value in ((256, width), (257, height), (278, height), (273, 0), (279, count)):
+            ifd[tag] = value
+            ifd.tagtype[tag] = 4
+        # StripOffsets 为 0：tobytes 会加上 IFD 结束处的偏移，正好指向紧随其后的压缩数据
+        data = header + ifd.tobytes(8) + self._file[offset:offset + count].tobytes()
+        with Image.open(io.BytesIO(data)) as chunk:
+            if chunk.mode != self.mode:
+                chunk = chunk.convert(self.mode)
+            array = np.asarray(chunk)
+        with self._cache_lock:
+            if index not in self._cache:
+                self._cache[index] = array
+                self._cache_bytes += array.nbytes
+                while self._cache_bytes > self._cache_limit and len(self._cache) > 1:
+                    _, evicted = self._cache.popitem(last=False)
+                    self._cache_bytes -= evicted.nbytes
+        return array
+
+    def reserve_rows(self, rows: int) -> None:
+        """保证解码缓存至少能容纳 rows 行（再加上下两侧各一个条带/块）的整行像素"""
+        if self._chunks is not None:
+            rows += 2 * max(h for _, _, _, h, _, _ in self._chunks)
+            self._cache_limit = max(self._cache_limit, rows * self.size[0] * self.channels)
+
+    def read(self, x0: int, y0: int, x1: int, y1: int) -> np.ndarray:
+        if self._image is not None:
+            return np.asarray(self._image.crop((x0, y0, x1, y1)))
+        out = np.empty((y1 - y0, x1 - x0, self.channels), dtype=np.uint8)
+        if self._chunks is not None:
+            e = self._extents
+            for index in np.flatnonzero((e[:, 0] < x1) & (e[:, 2] > x0) & (e[:, 1] < y1) & (e[:, 3] > y0)).tolist():
+                cx0, cy0, cx1, cy1 = e[index].tolist()
+                chunk = self._decode_chunk(index).reshape(-1, self._chunks[index][2], self.channels)
+                left, top, right, bottom = max(cx0, x0), max(cy0, y0), min(cx1, x1), min(cy1, y1)
+                out[top - y0:bottom - y0, left - x0:right - x0] = chunk[top - cy0:bottom - cy0, left - cx0:right - cx0]
+            return out if self.channels > 1 else out[..., 0]
+        width = self.size[0]
+        for s0, s1, offset, stride in self._strips:
+            top, bottom = max(s0, y0), min(s1, y1)
+            if top >= bottom:
+                continue
+            rows = self._file[offset:offset + (s1 - s0) * stride].reshape(s1 - s0, stride)
+            rows = rows[top - s0:bottom - s0, :width * self.channels].reshape(bottom - top, width, self.channels)
+            out[top - y0:bottom - y0] = rows[:, x0:x1]
+        return out if self.channels > 1 else out[..., 0]
+
+def create_tiff(path: str, size: Tuple[int, int], mode: str, rows_per_strip: int) -> np.memmap:
+    """
+    写入未压缩条带 TIFF 的文件头并返回像素区域的内存映射，写入映射即写入文件。
+    像素数据连续存放在文件头之后，标准 TIFF 读取器（包括 Pillow）都能直接打开
+    """
+    width, height = size
+    channels = Image.getmodebands(mode)
+    strip_bytes = rows_per_strip * width * channels
+    strips = (height + rows_per_strip - 1) // rows_per_strip
+    data_size = width * height * channels
+
+    entries = 10 + (mode == 'RGBA')
+    ifd_size = 2 + entries * 12 + 4
+    bits_offset = 8 + ifd_size
+    offsets_offset = bits_offset + 2 * channels
+    counts_offset = offsets_offset + 4 * strips
+    data_offset = (counts_offset + 4 * strips + 15) // 16 * 16
+    if data_offset + data_size >= 2 ** 32:
+        raise ValueError("结果超过 4GB，超出标准 TIFF 的大小限制，请先缩小或裁剪图像")
+
+    def entry(tag: int, type_: int, count: int, value: int) -> bytes:
+        # type 3 = SHORT，4 = LONG；单个 SHORT 值存放在值字段的低位
+        return struct.pack('<HHI', tag, type_, count) + (struct.pack('<HH', value, 0) if type_ == 3 and count == 1 else struct.pack('<I', value))
+
+    ifd = [
+        entry(256, 4, 1, width),
+        entry(257, 4, 1, height),
+        entry(258, 3, channels, bits_offset) if channels > 2 else entry(258, 3, 1, 8),
+        entry(259, 3, 1, 1),
+        entry(262, 3, 1, 1 if mode == 'L' else 2),
+        entry(273, 4, strips, offsets_offset) if strips > 1 else entry(273, 4, 1, data_offset),
+        entry(277, 3, 1, channels),
+        entry(278, 4, 1, rows_per_strip),
+        entry(279, 4, strips, counts_offset) if strips > 1 else entry(279, 4, 1, data_size),
+        entry(284, 3, 1, 1),
+    ]
+    if mode == 'RGBA':
+        ifd.append(entry(338, 3, 1, 2))  # ExtraSamples：非预乘的 alpha
+    counts = [min(strip_bytes, data_size - i * strip_bytes) for i in range(strips)]
+    header = b'II*\x00' + struct.pack('<I', 8) + struct.pack('<H', entries) + b''.join(ifd) + struct.pack('<I', 0)
+    header += struct.pack(f'<{channels}H', *([8] * channels))
+    header += struct.pack(f'<{strips}I', *(data_offset + i * strip_bytes for i in range(strips)))
+    header += struct.pack(f'<{strips}I', *counts)
+
+    ensure_dir_exists(path)
+    with open(path, 'wb') as f:
+        f.write(header.ljust(data_offset, b'\x00'))
+        f.truncate(data_offset + data_size)
+    shape = (height, width, channels) if channels > 1 else (height, width)
+    return np.memmap(path, dtype=np.uint8, mode='r+', offset=data_offset, shape=shape)
+
+def process_region(reader: RegionReader, box: Tuple[int, int, int, int], steps: List[BaseModel],
+                   contrast_means: dict) -> Image.Image:
+    """
+    读取 box 四周加上 steps 所需 halo 的区域，依次执行操作，返回 box 范围内的结果。
+    contrast_means 为各对比度步骤（按在 steps 中的序号）所用的整图灰度均值，而不是当前块的
+    """
+    x0, y0, x1, y1 = box
+    width, height = reader.size
+    halo = sum(step_halo(step) for step in steps)
+    rx0, ry0, rx1, ry1 = max(x0 - halo, 0), max(y0 - halo, 0), min(x1 + halo, width), min(y1 + halo, height)
+    img = Image.fromarray(np.ascontiguousarray(reader.read(rx0, ry0, rx1, ry1)), reader.mode)
+    for index, step in enumerate(steps):
+        if step.op == 'contrast':
+            img = adjust(img, 'contrast', step.factor, contrast_means[index])
+        else:
+            img = apply_step(img, step)
+    return img.crop((x0 - rx0, y0 - ry0, x1 - rx0, y1 - ry0)) if halo else img
+
+def tile_histogram(reader: RegionReader, box: Tuple[int, int, int, int], steps: List[BaseModel],
+                   contrast_means: dict) -> np.ndarray:
+    """box 范围内执行 steps 之后的灰度直方图"""
+    return np.asarray(process_region(reader, box, steps, contrast_means).convert('L').histogram(), dtype=np.int64)
+
+def process_tile(reader: RegionReader, output: np.memmap, box: Tuple[int, int, int, int],
+                 steps: List[BaseModel], contrast_means: dict) -> None:
+    """处理一个方块并写入输出"""
+    x0, y0, x1, y1 = box
+    output[y0:y1, x0:x1] = np.asarray(process_region(reader, box, steps, contrast_means))
+
+async def run_tiled(args: TiledProcess, report: Callable[[int, int], Awaitable[None]]) -> dict:
+    """分块处理整幅图像，每完成一块调用一次 report(已完成块数, 总块数)"""
+    if infer_image_format(args.output_path) != 'TIFF':
+        raise ValueError("分块模式的结果只能保存为 TIFF（.tif/.tiff）")
+    started = time.monotonic()
+    temp_path = None
+    source = args.image_source
+    if source.startswith(('http://', 'https://')):
+        source = temp_path = await download_to_file(source)
+    elif source.startswith('file://'):
+        source = source[7:]
+    elif source.startswith(f'{RESULT_URI_SCHEME}://'):
+        source = result_store.path_for(source[len(RESULT_URI_SCHEME) + 3:])
+    elif not os.path.exists(source):
+        raise ValueError(f"找不到图片文件: {source}")
+    if os.path.abspath(source) == os.path.abspath(args.output_path):
+        raise ValueError("output_path 不能与输入文件相同")
+
+    try:
+        reader = await asyncio.to_thread(RegionReader, source)
+        halo = sum(step_halo(step) for step in args.operations)
+        width, height = reader.size
+        boxes = [(x, y, min(x + args.tile_size, width), min(y + args.tile_size, height))
+                 for y in range(0, height, args.tile_size) for x in range(0, width, args.tile_size)]
+        # 同时处理的块数等于 CPU 核数，Pillow 的滤镜运算会释放 GIL
+        workers = os.cpu_count() or 1
+        in_flight = asyncio.Semaphore(workers)
+        # 并行时相邻两带的方块可能同时在处理
+        reader.reserve_rows((args.tile_size + 2 * halo) * (2 if workers > 1 else 1))
+
+        async def histogram(box, steps, means):
+            async with in_flight:
+                return await asyncio.to_thread(tile_histogram, reader, box, steps, means)
+
+        # 每个对比度步骤的均值取它之前各步操作输出的整图灰度均值（与 ImageEnhance.Contrast 对其输入取均值一致），
+        # 每个对比度步骤需要多一遍逐块统计
+        contrast_means = {}
+        for index, step in enumerate(args.operations):
+            if step.op == 'contrast':
+                steps = args.operations[:index]
+                histograms = await asyncio.gather(*(histogram(box, steps, dict(contrast_means)) for box in boxes))
+                contrast_means[index] = int(ImageStat.Stat(np.sum(histograms, axis=0).tolist()).mean[0] + 0.5)
+        output = create_tiff(args.output_path, reader.size, reader.mode, args.tile_size)
+
+        async def process(box):
+            async with in_flight:
+                await asyncio.to_thread(process_tile, reader, output, box, args.operations, contrast_means)
+
+        # 按行优先顺序创建任务（as_completed 对协程的调度顺序不确定），同一带的方块相继处理，条带缓存才能命中
+        tasks = [asyncio.create_task(process(box)) for box in boxes]
+        done = 0
+        for future in asyncio.as_completed(tasks):
+            await future
+            done += 1
+            await report(done, len(boxes))
+        output.flush()
+        del output
+    finally:
+        if temp_path:
+            os.remove(temp_path)
+
+    return {
+        "output_path": args.output_path,
+        "size": [width, height],
+        "mode": reader.mode,
+        "tiles": len(boxes),
+        "tile_size": args.tile_size,
+        "halo": halo,
+        "bytes": os.path.getsize(args.output_path),
+        "elapsed_seconds": round(time.monotonic() - started, 2),
+    }
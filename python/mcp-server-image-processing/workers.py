@@ -0,0 +1,61 @@
+"""
+工作进程池
+
+批量处理与感知哈希共用一个 spawn 方式的进程池，解码与处理在独立的工作进程中进行，吞吐量随 CPU 核数增长；
+交给工作进程的函数和参数都必须能被 pickle，因此只传本地路径或已取得的字节
+"""
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
+import base64
+import glob
+import multiprocessing
+import os
+import sys
+from download import download_bytes
+from store import RESULT_URI_SCHEME, result_store
+
+# 工作进程数，默认等于 CPU 核数
+BATCH_WORKERS = int(os.getenv('IMAGE_BATCH_WORKERS', '0')) or os.cpu_count() or 1
+
+_batch_pool: Optional[ProcessPoolExecutor] = None
+
+def _init_batch_worker() -> None:
+    # stdout 是 MCP 的 stdio 通道，工作进程的任何输出都改到 stderr
+    os.dup2(2, 1)
+    sys.stdout = sys.stderr
+
+def get_batch_pool() -> ProcessPoolExecutor:
+    global _batch_pool
+    if _batch_pool is None:
+        _batch_pool = ProcessPoolExecutor(
+            max_workers=BATCH_WORKERS,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_batch_worker,
+        )
+    return _batch_pool
+
+def shutdown_batch_pool() -> None:
+    global _batch_pool
+    if _batch_pool is not None:
+        _batch_pool.shutdown(wait=False, cancel_futures=True)
+        _batch_pool = None
+
+def collect_sources(sources: Optional[List[str]], pattern: Optional[str]) -> List[str]:
+    sources = list(sources or [])
+    if pattern:
+        sources += sorted(glob.glob(pattern, recursive=True))
+    if not sources:
+        raise ValueError("没有需要处理的图片，请提供 sources 或 pattern")
+    return sources
+
+async def read_source(source: str) -> Tuple[Optional[str], Optional[bytes]]:
+    """交给工作进程的 (本地路径, 数据)：本地文件只传路径，远程图片和 Base64 在主进程中取得数据"""
+    if source.startswith(('http://', 'https://')):
+        return None, await download_bytes(source)
+    elif source.startswith('file://'):
+        return source[7:], None
+    elif source.startswith(f'{RESULT_URI_SCHEME}://'):
+        return result_store.path_for(source[len(RESULT_URI_SCHEME) + 3:]), None
+    elif os.path.exists(source):
+        return source, None
+    return None, base64.b64decode(source)
@@ -1,11 +1,12 @@
 # coding:utf-8
+import asyncio
 import base64
 import io
 import os
 import logging
-import tempfile
 import httpx
-from typing import Any, Dict, Union
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional, Union
 from PIL import Image
 from volcengine.visual.VisualService import VisualService
 from mcp.server.fastmcp import FastMCP
@@ -21,12 +22,24 @@ logger = logging.getLogger(__name__)
 # 初始化FastMCP服务器
 mcp = FastMCP("抠图工具")
 
+UPLOAD_URL = 'https://www.mcpcn.cc/api/fileUploadAndDownload/uploadMcpFile'
+# 同时进行的上传数
+UPLOAD_CONCURRENCY = int(os.getenv('VOLC_UPLOAD_CONCURRENCY', '4'))
+# 每次请求分割接口的最大图像数，以及同时进行的请求数
+SEGMENT_CHUNK_SIZE = int(os.getenv('VOLC_SEGMENT_CHUNK_SIZE', '4'))
+SEGMENT_CONCURRENCY = int(os.getenv('VOLC_SEGMENT_CONCURRENCY', '4'))
+
 class VolcImageCutter:
     """图像抠图处理器"""
     
     def __init__(self):
         self.visual_service = VisualService()
         self._setup_credentials()
+        # 上传共用一个带连接池的客户端，首次上传时创建
+        self._client: Optional[httpx.AsyncClient] = None
+        self._upload_slots: Optional[asyncio.Semaphore] = None
+        # cv_process 是同步调用，放到线程池中执行，避免阻塞事件循环
+        self._segment_pool = ThreadPoolExecutor(max_workers=SEGMENT_CONCURRENCY, thread_name_prefix='volc-seg')
     
     def _setup_credentials(self):
         """设置API凭证"""
@@ -58,39 +71,52 @@ class VolcImageCutter:
             logger.error(f"显著性分割处理异常: {str(e)}")
             return []
 
+    async def saliency_segmentation_chunked(self, image_urls: list[str]) -> list[dict[str, Any]]:
+        """
+        分块并发进行显著性分割，每块最多 SEGMENT_CHUNK_SIZE 张
+
+        返回每块的结果 {"start": 块内第一张的序号, "image_urls": [...], "images": [base64, ...]}，
+        失败的块 images 为空，不影响其他块
+        """
+        loop = asyncio.get_running_loop()
+        chunks = [image_urls[i:i + SEGMENT_CHUNK_SIZE] for i in range(0, len(image_urls), SEGMENT_CHUNK_SIZE)]
+        if len(chunks) > 1:
+            logger.info(f"图像数量 {len(image_urls)}，分 {len(chunks)} 块处理")
+        results = await asyncio.gather(
+            *(loop.run_in_executor(self._segment_pool, self.saliency_segmentation, chunk) for chunk in chunks)
+        )
+        return [
+            {"start": i * SEGMENT_CHUNK_SIZE, "image_urls": chunk, "images": images}
+            for i, (chunk, images) in enumerate(zip(chunks, results))
+        ]
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=30.0,
+                limits=httpx.Limits(max_connections=UPLOAD_CONCURRENCY, max_keepalive_connections=UPLOAD_CONCURRENCY)
+            )
+            self._upload_slots = asyncio.Semaphore(UPLOAD_CONCURRENCY)
+        return self._client
+
     async def upload_image_to_server(self, image_data: bytes, filename: str) -> dict[str, Any]:
-        """上传图片到服务器"""
+        """上传图片到服务器，图片数据直接从内存发送"""
         try:
-            # 创建临时文件
-            with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as temp_file:
-                temp_file.write(image_data)
-                temp_file_path = temp_file.name
-
-            try:
-                # 准备上传文件
-                async with httpx.AsyncClient(timeout=30.0) as client:
-                    with open(temp_file_path, 'rb') as f:
-                        files = {'file': (filename, f, 'image/png')}
-                        response = await client.post(
-                            'https://www.mcpcn.cc/api/fileUploadAndDownload/uploadMcpFile',
-                            files=files
-                        )
-                    if response.status_code == 200:
-                        result = response.json()
-                        if result.get('code') == 0:
-                            logger.info(f"图片上传成功: {result['data']['url']}")
-                            return {"success": True, "url": result['data']['url']}
-                        else:
-                            logger.error(f"上传失败: {result.get('msg', '未知错误')}")
-                            return {"success": False, "error": result.get('msg', '未知错误')}
-                    else:
-                        logger.error(f"上传请求失败: HTTP {response.status_code}")
-                        return {"success": False, "error": f"HTTP {response.status_code}"}
-
-            finally:
-                # 清理临时文件
-                if os.path.exists(temp_file_path):
-                    os.unlink(temp_file_path)
+            client = self._get_client()
+            async with self._upload_slots:
+                files = {'file': (filename, image_data, 'image/png')}
+                response = await client.post(UPLOAD_URL, files=files)
+            if response.status_code == 200:
+                result = response.json()
+                if result.get('code') == 0:
+                    logger.info(f"图片上传成功: {result['data']['url']}")
+                    return {"success": True, "url": result['data']['url']}
+                else:
+                    logger.error(f"上传失败: {result.get('msg', '未知错误')}")
+                    return {"success": False, "error": result.get('msg', '未知错误')}
+            else:
+                logger.error(f"上传请求失败: HTTP {response.status_code}")
+                return {"success": False, "error": f"HTTP {response.status_code}"}
 
         except Exception as e:
             logger.error(f"上传图片异常: {str(e)}")
@@ -99,6 +125,34 @@ class VolcImageCutter:
 # 创建全局处理器实例
 cutter = VolcImageCutter()
 
+async def process_cutout(index: int, base64_data: str) -> tuple[str, Optional[str]]:
+    """解码并上传一张抠图结果，返回 (处理说明, 上传后的URL)"""
+    text = f"第 {index+1} 张抠图处理:\n"
+    url = None
+    try:
+        # 解码base64数据
+        image_data = base64.b64decode(base64_data)
+
+        # 使用PIL验证图片（只读取文件头，不解码像素）
+        with Image.open(io.BytesIO(image_data)) as image:
+            text += f"- 图片尺寸: {image.size}\n"
+
+        # 上传到服务器
+        filename = f"saliency_cutout_{index+1}.png"
+        upload_result = await cutter.upload_image_to_server(image_data, filename)
+
+        if upload_result.get('success'):
+            url = upload_result['url']
+            text += f"- ✅ 上传成功: {url}\n"
+        else:
+            text += f"- ❌ 上传失败: {upload_result.get('error', '未知错误')}\n"
+
+    except Exception as e:
+        text += f"- ❌ 处理失败: {str(e)}\n"
+
+    text += "==========================================\n"
+    return text, url
+
 @mcp.tool()
 async def image_cutout(image_urls: list[str]) -> Union[str, list[str]]:
     """
@@ -110,40 +164,28 @@ async def image_cutout(image_urls: list[str]) -> Union[str, list[str]]:
     Returns:
         单张图片时返回URL字符串，多张图片时返回URL列表
     """
-    # 获取base64列表
-    base64_images = cutter.saliency_segmentation(image_urls)
+    # 分块获取base64列表
+    chunks = await cutter.saliency_segmentation_chunked(image_urls)
+    failed_chunks = [chunk for chunk in chunks if not chunk["images"]]
+    # 结果序号沿用各块在原列表中的位置
+    base64_images = [(chunk["start"] + i, data) for chunk in chunks for i, data in enumerate(chunk["images"])]
 
     if not base64_images:
         return "抠图失败：未获取到有效的抠图结果"
 
     response_text = f"显著性分割抠图处理完成！共生成 {len(base64_images)} 张抠图结果:\n\n"
-    uploaded_urls = []
-
-    for i, base64_data in enumerate(base64_images):
-        response_text += f"第 {i+1} 张抠图处理:\n"
-
-        try:
-            # 解码base64数据
-            image_data = base64.b64decode(base64_data)
-
-            # 使用PIL验证图片
-            image = Image.open(io.BytesIO(image_data))
-            response_text += f"- 图片尺寸: {image.size}\n"
-
-            # 上传到服务器
-            filename = f"saliency_cutout_{i+1}.png"
-            upload_result = await cutter.upload_image_to_server(image_data, filename)
-
-            if upload_result.get('success'):
-                uploaded_urls.append(upload_result['url'])
-                response_text += f"- ✅ 上传成功: {upload_result['url']}\n"
-            else:
-                response_text += f"- ❌ 上传失败: {upload_result.get('error', '未知错误')}\n"
-
-        except Exception as e:
-            response_text += f"- ❌ 处理失败: {str(e)}\n"
 
-        response_text += "==========================================\n"
+    # 各张结果并发上传，结果按原顺序汇总
+    results = await asyncio.gather(*(process_cutout(i, data) for i, data in base64_images))
+    response_text += "".join(text for text, _ in results)
+    for chunk in failed_chunks:
+        response_text += f"❌ 第 {chunk['start']+1}-{chunk['start']+len(chunk['image_urls'])} 张抠图失败: {', '.join(chunk['image_urls'])}\n"
+    uploaded_urls = [url for _, url in results if url]
+    logger.info(response_text)
+
+    # 部分图像分割失败时返回完整的处理说明，列出成功的URL和失败的图像
+    if failed_chunks and uploaded_urls:
+        return response_text
 
     # 最终结果汇总
     if uploaded_urls: